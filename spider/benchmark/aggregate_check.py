@@ -0,0 +1,160 @@
+"""
+聚合搜索检查（dudubird 服务的 /api/aggregate/search，同时查询 xuanyuan 服务）：
+1. 两个搜索源并发查询，聚合接口的耗时接近两者中较慢的一个，而不是两者之和
+2. 合并去重：同一镜像只保留一条，Docker Hub 仓库信息合并到 dudubird 的同仓库镜像上
+3. 截止时间：慢的搜索源超时后先返回已有结果（partial），其查询在后台完成，下次直接命中
+4. 流式输出：每个搜索源返回后立即输出增量，合并后与非流式结果一致
+
+用法:
+    python aggregate_check.py --rounds 5
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.aggregate import Aggregator, from_dudubird, from_xuanyuan  # noqa: E402
+
+ENV = {"SPIDER_PREFETCH": "0"}
+AGGREGATE = "/api/aggregate/search"
+
+
+def timed_get(client: httpx.Client, url: str, params: dict):
+    start = time.perf_counter()
+    response = client.get(url, params=params)
+    response.raise_for_status()
+    return time.perf_counter() - start, response
+
+
+def check_dedupe() -> bool:
+    dudubird = [from_dudubird(item) for item in [
+        {"icon_path": "", "image_name": "nginx:1.25", "platform": "linux/amd64", "source": "docker.io",
+         "size": "", "collection_date": ""},
+        {"icon_path": "", "image_name": "nginx:1.25", "platform": "linux/amd64", "source": "docker.io",
+         "size": "", "collection_date": ""},
+        {"icon_path": "", "image_name": "nginx:1.25", "platform": "linux/arm64", "source": "docker.io",
+         "size": "", "collection_date": ""},
+        {"icon_path": "", "image_name": "quay.io/nginx/nginx:1.25", "platform": "linux/amd64", "source": "quay.io",
+         "size": "", "collection_date": ""},
+    ]]
+    xuanyuan = [from_xuanyuan(item) for item in [
+        {"namespace": "library", "name": "nginx", "description": "official", "star_count": 1},
+        {"namespace": "bitnami", "name": "nginx", "description": "bitnami", "star_count": 2},
+    ]]
+    results = {}
+    for order in (("dudubird", "xuanyuan"), ("xuanyuan", "dudubird")):
+        aggregator = Aggregator()
+        deltas = [aggregator.add(source, [dict(item, sources=list(item["sources"])) for item in
+                                          (dudubird if source == "dudubird" else xuanyuan)]) for source in order]
+        results[order] = aggregator.results()
+        # 按增量重建的结果应与最终结果一致
+        replay = {}
+        for delta in deltas:
+            for item in delta["added"] + delta["updated"]:
+                replay[item["id"]] = item
+            for item_id in delta["removed"]:
+                replay.pop(item_id)
+        if set(replay) != {item["id"] for item in results[order]}:
+            return False
+    first, second = results.values()
+    ids = [item["id"] for item in first]
+    official = [item for item in first if item["repository"] == "docker.io/library/nginx"]
+    print(f"dedupe: {len(dudubird) + len(xuanyuan)} items -> {ids}")
+    return (ids == [item["id"] for item in second] and len(ids) == 4
+            and all(item["sources"] == ["dudubird", "xuanyuan"] and item["description"] == "official"
+                    for item in official) and len(official) == 2)
+
+
+def read_stream(base_url: str, params: dict):
+    events = []
+    start = time.perf_counter()
+    with httpx.stream("GET", base_url + AGGREGATE, params={**params, "stream": "ndjson"}, timeout=30) as response:
+        for line in response.iter_lines():
+            if line:
+                events.append((time.perf_counter() - start, json.loads(line)))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聚合搜索检查")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    parser.add_argument("--xuanyuan-port", type=int, default=9188)
+    args = parser.parse_args()
+    checks = {"dedupe": check_dedupe()}
+
+    with run_stub(args.stub_port, args.latency, 0.0) as stub_url:
+        env = {**upstream_env(stub_url), **ENV}
+        with run_spider("xuanyuan-spider", args.xuanyuan_port, env, quiet=True) as xuanyuan_url, \
+                run_spider("dudubird-spider", args.port,
+                           {**env, "XUANYUAN_SPIDER_URL": xuanyuan_url}, quiet=True) as base_url, \
+                httpx.Client(base_url=base_url, timeout=30) as client:
+            # 每轮用不同的关键词，避免命中缓存
+            separate, aggregated = [], []
+            for index in range(args.rounds):
+                dudubird, _ = timed_get(client, "/api/dudubird/search_images", {"search": f"separate-{index}"})
+                xuanyuan, _ = timed_get(client, f"{xuanyuan_url}/api/xuanyuan/v2/search",
+                                        {"image_name": f"separate-{index}"})
+                separate.append((dudubird, xuanyuan))
+                elapsed, response = timed_get(client, AGGREGATE, {"search": f"aggregate-{index}"})
+                aggregated.append(elapsed)
+            data = response.json()
+            slowest = statistics.median(max(pair) for pair in separate)
+            total = statistics.median(sum(pair) for pair in separate)
+            median = statistics.median(aggregated)
+            print(f"latency: separate max={slowest * 1000:.0f}ms sum={total * 1000:.0f}ms "
+                  f"aggregate={median * 1000:.0f}ms count={data['count']} sources={data['sources']}")
+            ids = [item["id"] for item in data["results"]]
+            checks["concurrent"] = median < (slowest + total) / 2
+            checks["merged"] = (not data["partial"] and len(ids) == len(set(ids))
+                                and {"dudubird", "xuanyuan"} <= {s for item in data["results"] for s in item["sources"]})
+
+            # dudubird 已缓存、xuanyuan 很慢：截止时间到时返回 dudubird 的结果
+            slow = {"search": "stub-slow-partial"}
+            client.get("/api/dudubird/search_images", params=slow)
+            elapsed, response = timed_get(client, AGGREGATE, {**slow, "deadline": 1})
+            partial = response.json()
+            print(f"deadline=1s: elapsed={elapsed * 1000:.0f}ms partial={partial['partial']} "
+                  f"count={partial['count']} sources={partial['sources']} "
+                  f"cache-control={response.headers.get('cache-control')!r}")
+            checks["deadline"] = (partial["partial"] and elapsed < 2 and partial["count"] > 0
+                                  and partial["sources"]["xuanyuan"]["status"] == 504
+                                  and response.headers.get("cache-control") == "no-cache")
+            # 超时的查询在后台完成并写入缓存
+            time.sleep(6)
+            elapsed, response = timed_get(client, AGGREGATE, {**slow, "deadline": 1})
+            complete = response.json()
+            print(f"after background load: elapsed={elapsed * 1000:.0f}ms partial={complete['partial']} "
+                  f"count={complete['count']}")
+            checks["background"] = not complete["partial"] and elapsed < 1
+
+            events = read_stream(base_url, {"search": "stream"})
+            expected = client.get(AGGREGATE, params={"search": "stream"}).json()
+            streamed = {}
+            for _, event in events:
+                if event["type"] == "source":
+                    for item in event["data"]["added"] + event["data"]["updated"]:
+                        streamed[item["id"]] = item
+                    for item_id in event["data"]["removed"]:
+                        streamed.pop(item_id)
+            types = [event["type"] for _, event in events]
+            print(f"stream: events={[(event['type'], round(at * 1000)) for at, event in events]}")
+            checks["stream"] = (types == ["source", "source", "done"]
+                                and set(streamed) == {item["id"] for item in expected["results"]}
+                                and events[-1][1]["data"]["count"] == expected["count"])
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
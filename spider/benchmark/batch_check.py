@@ -0,0 +1,66 @@
+"""
+批量接口检查：对比逐个请求详情和一次批量请求的耗时，并确认单项失败/超时只影响该项
+
+用法:
+    python batch_check.py --size 20
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+from stub_server import NOT_FOUND_MARKER, SLOW_MARKER
+
+
+def check(name: str, response: httpx.Response, image_names_or_items: list, expect_failed: dict) -> bool:
+    body = response.json()
+    failed = {index: result["status"] for index, result in enumerate(body["results"]) if not result["ok"]}
+    ok = (response.status_code == 200 and body["count"] == len(image_names_or_items)
+          and failed == expect_failed)
+    print(f"{name}: status={response.status_code} count={body['count']} "
+          f"succeeded={body['succeeded']} failed={failed} {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量接口检查")
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="桩服务延迟（秒）")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    args = parser.parse_args()
+
+    image_names = [f"elasticsearch:7.17.{i}" for i in range(args.size)]
+    # 最后两项分别模拟上游 404 和超时
+    image_names[-2] = f"{NOT_FOUND_MARKER}:1"
+    image_names[-1] = f"{SLOW_MARKER}:1"
+    expect_failed = {args.size - 2: 404, args.size - 1: 504}
+
+    all_ok = True
+    with run_stub(args.stub_port, args.latency, 0.0) as stub_url:
+        with run_spider("dudubird-spider", 9166, upstream_env(stub_url), quiet=True) as base_url:
+            start = time.perf_counter()
+            for image_name in image_names[:-2]:
+                httpx.get(f"{base_url}/api/dudubird/image_info", params={"image_name": f"seq-{image_name}"},
+                          timeout=60)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            response = httpx.post(f"{base_url}/api/dudubird/image_info/batch",
+                                  json={"image_names": image_names, "timeout": 1}, timeout=60)
+            batched = time.perf_counter() - start
+            all_ok &= check("dudubird image_info/batch", response, image_names, expect_failed)
+            print(f"  sequential({len(image_names) - 2})={sequential:.2f}s batch({len(image_names)})={batched:.2f}s")
+
+        items = [{"namespace": "library", "name": "nginx", "tag": name} for name in image_names]
+        with run_spider("xuanyuan-spider", 9188, upstream_env(stub_url), quiet=True) as base_url:
+            response = httpx.post(f"{base_url}/api/xuanyuan/v2/image_tags/batch",
+                                  json={"items": items, "timeout": 1}, timeout=60)
+            all_ok &= check("xuanyuan v2/image_tags/batch", response, items, expect_failed)
+
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+渡渡鸟详情页解析基准：对比逐字段 find 的旧实现与单次遍历索引实现，
+先校验两者在录制页面上的输出一致，再分别统计总耗时和（已建树后的）字段提取耗时
+
+用法:
+    python bench_detail_parser.py --iterations 200
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+SPIDER_ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).parent / "fixtures" / "dudubird"
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from model.image_info import ImageInfo  # noqa: E402
+from util.detail_extractor import extract_from_soup  # noqa: E402
+from util.image_info_util import safe_find  # noqa: E402
+
+
+def legacy_extract_from_soup(soup):
+    """改造前 image_info 路由中的解析逻辑，作为基线"""
+
+    def get_table_value(label):
+        try:
+            for td in soup.find_all('td'):
+                if td.text.strip() and label in td.text.strip():
+                    next_td = td.find_next_sibling('td')
+                    if next_td:
+                        badge = next_td.find('span', class_='badge')
+                        if badge:
+                            return badge.get_text(strip=True)
+                        link = next_td.find('a')
+                        if link:
+                            return link.get_text(strip=True)
+                        return next_td.get_text(strip=True)
+            return "N/A"
+        except Exception:
+            return "N/A"
+
+    image_details = {"error": "Details not found"}
+    details_code = safe_find(soup, 'find', 'code', id='codeBlock4')
+    if details_code:
+        try:
+            image_details = json.loads(details_code.get_text(strip=True))
+        except json.JSONDecodeError as e:
+            image_details = {"error": f"Invalid JSON: {str(e)}"}
+
+    def get_card_content(title):
+        card_header = safe_find(
+            soup, 'find', 'div', class_='card-header', string=title)
+        if card_header:
+            card_body = card_header.find_next('div', class_='card-body')
+            if card_body:
+                return [badge.get_text(strip=True) for badge in card_body.find_all('span', class_='badge')]
+        return []
+
+    def get_code(code_id):
+        return safe_find(soup, 'find', 'code', id=code_id).get_text(
+            strip=True) if safe_find(soup, 'find', 'code', id=code_id) else "N/A"
+
+    return ImageInfo(
+        source_image=get_table_value("源镜像"),
+        domestic_image=get_table_value("国内镜像"),
+        image_id=get_table_value("镜像ID"),
+        image_tag=get_table_value("镜像TAG"),
+        size=get_table_value("大小"),
+        image_source=get_table_value("镜像源"),
+        project_info=get_table_value("项目信息"),
+        cmd=get_table_value("CMD"),
+        entrypoint=get_table_value("启动入口"),
+        working_dir=get_table_value("工作目录"),
+        os_platform=get_table_value("OS/平台"),
+        views=get_table_value("浏览量"),
+        created_at=get_table_value("镜像创建"),
+        sync_time=get_table_value("同步时间"),
+        updated_at=get_table_value("更新时间"),
+        open_ports=get_card_content("开放端口"),
+        env_vars=get_card_content("环境变量"),
+        image_labels=get_card_content("镜像标签"),
+        docker_pull_cmd=get_code('codeBlock1'),
+        containerd_pull_cmd=get_code('codeBlock2'),
+        shell_replace_cmd=get_code('codeBlock3'),
+        ansible_docker_cmd=get_code('codeBlockAnsibleDocker'),
+        ansible_containerd_cmd=get_code('codeBlockAnsibleContainerd'),
+        build_history=get_code('codeBlock6'),
+        image_details=image_details
+    ).model_dump()
+
+
+def timeit(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渡渡鸟详情页解析基准")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    # 残缺页面会反复记录 JSON 解析失败，基准运行时不输出
+    logging.disable(logging.ERROR)
+
+    print(f"{'fixture':<28} {'stage':<8} {'legacy(ms)':>11} {'indexed(ms)':>12} {'speedup':>8}")
+    for path in sorted(FIXTURES.glob("image_detail*.html")):
+        html = path.read_text(encoding="utf-8")
+        soup = BeautifulSoup(html, 'html.parser')
+        if legacy_extract_from_soup(soup) != extract_from_soup(soup):
+            print(f"{path.name}: output mismatch")
+            sys.exit(1)
+
+        stages = {
+            "extract": (lambda: legacy_extract_from_soup(soup), lambda: extract_from_soup(soup)),
+            "total": (lambda: legacy_extract_from_soup(BeautifulSoup(html, 'html.parser')),
+                      lambda: extract_from_soup(BeautifulSoup(html, 'html.parser'))),
+        }
+        for stage, (legacy, indexed) in stages.items():
+            legacy_ms = timeit(legacy, args.iterations)
+            indexed_ms = timeit(indexed, args.iterations)
+            print(f"{path.name:<28} {stage:<8} {legacy_ms:>11.3f} {indexed_ms:>12.3f} "
+                  f"{legacy_ms / indexed_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
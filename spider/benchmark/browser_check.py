@@ -0,0 +1,140 @@
+"""
+浏览器池检查（使用 fake_browser.FakeDriver，不需要 Chrome）：
+1. 对比每次渲染都启动新浏览器与使用 BrowserPool 的总耗时，确认并发渲染数不超过池大小、会话按页面数重建
+2. JS 堆超过上限时会话被重建；排队超时返回 BrowserUnavailable
+3. 启动 xuanyuan 服务（XUANYUAN_BROWSER_DRIVER 指向假驱动），确认 image_info?documentation=true 返回文档
+
+用法:
+    python browser_check.py --renders 40 --pool-size 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+import fake_browser
+from fake_browser import FakeDriver
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+sys.path.insert(0, str(SPIDER_ROOT / "xuanyuan-spider"))
+from util.browser_pool import BrowserPool, BrowserUnavailable  # noqa: E402
+from util.image_info_util import extract_with_selenium, parse_documentation  # noqa: E402
+
+URL = "fixture://image.html"
+
+
+def render_fresh(url: str) -> str:
+    # 改造前的做法：每次渲染启动一个新浏览器，用完退出
+    driver = FakeDriver()
+    try:
+        return extract_with_selenium(driver, url)
+    finally:
+        driver.quit()
+
+
+def reset_counters():
+    fake_browser.counters.update(started=0, quit=0, active_renders=0, max_active_renders=0)
+
+
+async def pooled(renders: int, size: int, max_pages: int):
+    pool = BrowserPool(size, FakeDriver, max_pages=max_pages, max_memory_bytes=0, idle_timeout=0)
+    try:
+        pages = await asyncio.gather(*(pool.render(URL, extract_with_selenium) for _ in range(renders)))
+    finally:
+        await pool.aclose()
+    return pages, pool.snapshot()
+
+
+async def memory_recycle(renders: int):
+    pool = BrowserPool(1, FakeDriver, max_pages=1000, max_memory_bytes=60 * 1024 * 1024, idle_timeout=0)
+    try:
+        for _ in range(renders):
+            await pool.render(URL, extract_with_selenium)
+    finally:
+        await pool.aclose()
+    return pool.snapshot()
+
+
+async def queue_timeout():
+    pool = BrowserPool(1, FakeDriver, queue_timeout=0.01, idle_timeout=0)
+    try:
+        results = await asyncio.gather(*(pool.render(URL, extract_with_selenium) for _ in range(3)),
+                                       return_exceptions=True)
+    finally:
+        await pool.aclose()
+    return sum(isinstance(result, BrowserUnavailable) for result in results)
+
+
+def service_check(stub_port: int, port: int) -> bool:
+    env = {
+        "XUANYUAN_BROWSER_DRIVER": "fake_browser:FakeDriver",
+        "PYTHONPATH": str(Path(__file__).parent),
+    }
+    with run_stub(stub_port, 0.02, 0.0) as stub_url, \
+            run_spider("xuanyuan-spider", port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+        route = "/api/xuanyuan/image_info?image_name=library/nginx&documentation=true"
+        start = time.perf_counter()
+        first = httpx.get(base_url + route, timeout=30)
+        first_latency = time.perf_counter() - start
+        start = time.perf_counter()
+        second = httpx.get(base_url + route.replace("nginx", "redis"), timeout=30)
+        second_latency = time.perf_counter() - start
+        pool = httpx.get(f"{base_url}/api/xuanyuan/cache/stats").json()["browser_pool"]
+    documentation = first.json().get("documentation") if first.status_code == 200 else None
+    print(f"service: status={first.status_code},{second.status_code} "
+          f"first={first_latency * 1000:.0f}ms (starts browser) second={second_latency * 1000:.0f}ms "
+          f"sessions_created={pool['sessions_created']} documentation={documentation!r}")
+    return (first.status_code == 200 and second.status_code == 200
+            and documentation is not None and "docker run" in documentation and pool["sessions_created"] == 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="浏览器池检查")
+    parser.add_argument("--renders", type=int, default=40)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=10)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9188)
+    args = parser.parse_args()
+    checks = {}
+
+    reset_counters()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.pool_size) as executor:
+        list(executor.map(render_fresh, [URL] * args.renders))
+    fresh = time.perf_counter() - start
+    print(f"fresh browser per render: {args.renders} renders in {fresh:.2f}s, browsers started={fake_browser.counters['started']}")
+
+    reset_counters()
+    start = time.perf_counter()
+    pages, snapshot = asyncio.run(pooled(args.renders, args.pool_size, args.max_pages))
+    elapsed = time.perf_counter() - start
+    documented = sum(parse_documentation(page) is not None for page in pages)
+    max_active = fake_browser.counters["max_active_renders"]
+    print(f"pool: {args.renders} renders in {elapsed:.2f}s, sessions_created={snapshot['sessions_created']} "
+          f"recycled_pages={snapshot['recycled_pages']} max_concurrent={max_active} "
+          f"with_documentation={documented} browsers_quit={fake_browser.counters['quit']}")
+    checks["pool"] = (documented == args.renders and max_active <= args.pool_size and elapsed < fresh
+                      and snapshot["sessions_created"] <= args.renders // args.max_pages + args.pool_size
+                      and fake_browser.counters["quit"] == fake_browser.counters["started"])
+
+    snapshot = asyncio.run(memory_recycle(20))
+    print(f"memory: recycled_memory={snapshot['recycled_memory']} sessions_created={snapshot['sessions_created']}")
+    checks["memory"] = snapshot["recycled_memory"] >= 1
+
+    rejected = asyncio.run(queue_timeout())
+    print(f"queue timeout: rejected={rejected}")
+    checks["queue"] = rejected >= 1
+
+    checks["service"] = service_check(args.stub_port, args.port)
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
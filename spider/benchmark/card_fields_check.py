@@ -0,0 +1,88 @@
+"""
+搜索结果卡片字段分类检查（dudubird）：
+1. 预编译的徽章分类与改造前逐个子串判断的结果一致（录制页面中的全部徽章和边界用例）
+2. 分别统计两种分类方式的耗时
+3. 对 N 条结果按大小 / 同步时间排序：逐条解析字符串与使用解析时得到的数值列的耗时对比，结果一致
+
+用法:
+    python card_fields_check.py --badges 200000 --items 50000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+SPIDER_ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).parent / "fixtures" / "dudubird"
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+
+from util.card_fields import ImageColumns, classify_badge, parse_date, parse_size  # noqa: E402
+
+EDGE_CASES = ["", "linux/amd64", "docker.io", "584.29MB", "1.2GB", "2025-09-07 01:05", "linux/arm64 1GB",
+              "quay.io 2025-01-01 00:00", "512KB", "12:30", "2025-09-07", "mcr.microsoft.com", "ghcr.io/linux/x"]
+
+
+def legacy_classify(badge_text):
+    """改造前 extract_image_info 中的徽章分类，作为基线"""
+    if 'linux/' in badge_text:
+        return 'platform'
+    elif any(x in badge_text for x in ['docker.io', 'docker.elastic.co', 'ghcr.io', 'quay.io', 'gcr.io', 'k8s.gcr.io', 'registry.k8s.io']):
+        return 'source'
+    elif 'MB' in badge_text or 'GB' in badge_text:
+        return 'size'
+    elif '-' in badge_text and ':' in badge_text:
+        return 'date'
+    return None
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索结果卡片字段分类检查")
+    parser.add_argument("--badges", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=50000)
+    args = parser.parse_args()
+    checks = {}
+
+    html = (FIXTURES / "search.html").read_text(encoding="utf-8")
+    badges = [text.strip() for text in re.findall(r'<span class="badge[^"]*">([^<]*)<', html)] + EDGE_CASES
+    mismatches = [text for text in badges if classify_badge(text) != legacy_classify(text)]
+    print(f"classification: {len(badges)} badges, mismatches={mismatches}")
+    checks["parity"] = not mismatches
+
+    random.seed(1)
+    workload = [random.choice(badges) for _ in range(args.badges)]
+    legacy, _ = timed(lambda: [legacy_classify(text) for text in workload])
+    compiled, _ = timed(lambda: [classify_badge(text) for text in workload])
+    print(f"classify x{args.badges}: legacy={legacy * 1000:.0f}ms compiled={compiled * 1000:.0f}ms")
+
+    rows = [{
+        "icon_path": "", "image_name": f"library/image-{index}:{index % 100}", "platform": "linux/amd64",
+        "source": "docker.io", "size": f"{random.uniform(1, 2000):.2f}{random.choice(['MB', 'GB'])}",
+        "collection_date": f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} "
+                           f"{random.randint(0, 23):02d}:{random.randint(0, 59):02d}",
+    } for index in range(args.items)]
+    columns = ImageColumns.from_rows(rows)
+    checks["rows"] = columns.rows() == rows
+    for name, column, parse, field in (("size", columns.size_bytes, parse_size, "size"),
+                                       ("date", columns.collected_at, parse_date, "collection_date")):
+        by_string, expected = timed(lambda: sorted(range(len(rows)), key=lambda i: parse(rows[i][field])))
+        by_column, order = timed(lambda: sorted(range(len(rows)), key=column.__getitem__))
+        print(f"sort {args.items} by {name}: parse strings={by_string * 1000:.0f}ms "
+              f"numeric column={by_column * 1000:.0f}ms")
+        checks[f"sort_{name}"] = order == expected
+    checks["epoch"] = parse_date("2025-09-07 01:05") == 1757178300
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
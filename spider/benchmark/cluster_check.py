@@ -0,0 +1,104 @@
+"""
+多进程模式检查（dudubird）：
+1. 直接用 uvicorn --workers 启动多个进程（没有 broker）时，同一镜像的并发请求在每个进程各请求一次上游
+2. 通过 util.cluster 启动（带本地 broker）时，并发请求和随后的重复请求在所有 worker 中只请求一次上游
+3. 对比 1 个和 N 个 worker 处理缓存未命中的搜索请求（每次都要解析页面）的吞吐，
+   CPU 核数少于 worker 数时只报告结果，不要求提升
+
+用法:
+    python cluster_check.py --workers 4 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT, run_cluster, run_process, run_stub, upstream_env, wait_ready
+from stub_server import DUDUBIRD_PREFIX
+
+ENV = {"SPIDER_STORE_PATH": "", "SPIDER_PREFETCH": "0"}
+
+
+async def burst(base_url: str, route: str, concurrency: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        responses = await asyncio.gather(*(client.get(route) for _ in range(concurrency)))
+    return [response.status_code for response in responses]
+
+
+async def throughput(base_url: str, requests: int, concurrency: int) -> float:
+    slots = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(index: int):
+            async with slots:
+                response = await client.get("/api/dudubird/search_images", params={"search": f"image-{index}"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def upstream_hits(stub_url: str, image: str) -> int:
+    return httpx.get(f"{stub_url}/__stats").json().get(f"{DUDUBIRD_PREFIX}/image/{image}", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程模式检查")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+    checks = {}
+
+    with run_stub(args.stub_port, 0.3, 0.0) as stub_url:
+        env = {**upstream_env(stub_url), **ENV}
+        # 没有 broker：每个进程各自缓存、各自请求上游
+        with run_process([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                          "--workers", str(args.workers), "--log-level", "warning"],
+                         cwd=SPIDER_ROOT / "dudubird-spider", env=env, quiet=True):
+            wait_ready(f"http://127.0.0.1:{args.port}/openapi.json", timeout=60)
+            time.sleep(2)
+            asyncio.run(burst(f"http://127.0.0.1:{args.port}", "/api/dudubird/image_info?image_name=nginx:1.25",
+                              args.concurrency))
+        independent = upstream_hits(stub_url, "nginx:1.25")
+
+        with run_cluster("dudubird-spider", args.port, args.workers, env, quiet=True) as base_url:
+            time.sleep(2)
+            statuses = asyncio.run(burst(base_url, "/api/dudubird/image_info?image_name=redis:7.2", args.concurrency))
+            for _ in range(20):
+                httpx.get(base_url + "/api/dudubird/image_info?image_name=redis:7.2", timeout=30)
+            shared = upstream_hits(stub_url, "redis:7.2")
+            broker = httpx.get(base_url + "/api/dudubird/cache/stats").json()["broker"]
+        print(f"no broker: {args.workers} workers, {args.concurrency} concurrent requests -> upstream_hits={independent}")
+        print(f"with broker: {args.concurrency} concurrent + 20 repeated requests -> upstream_hits={shared} "
+              f"ok={statuses.count(200)} broker={broker}")
+        checks["dedup"] = shared == 1 and statuses.count(200) == args.concurrency
+
+    # 吞吐：上游延迟很小，耗时主要在解析
+    rates = {}
+    with run_stub(args.stub_port, 0.005, 0.0) as stub_url:
+        env = {**upstream_env(stub_url), **ENV}
+        for workers in (1, args.workers):
+            with run_cluster("dudubird-spider", args.port, workers, env, quiet=True) as base_url:
+                time.sleep(2)
+                rates[workers] = asyncio.run(throughput(base_url, args.requests, args.concurrency))
+            print(f"workers={workers}: {rates[workers]:.0f} req/s (cache misses, parse bound)")
+    cores = os.cpu_count() or 1
+    if cores >= args.workers:
+        checks["scaling"] = rates[args.workers] > rates[1] * 1.5
+    else:
+        print(f"only {cores} CPU core(s), scaling not checked")
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+请求合并检查：向爬虫并发发送 N 个相同请求，确认桩服务只收到一次上游请求
+
+用法:
+    python coalescing_check.py --concurrency 50
+"""
+import argparse
+import asyncio
+import sys
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+from stub_server import DUDUBIRD_PREFIX
+
+
+async def fire(base_url: str, route: str, concurrency: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        responses = await asyncio.gather(*(client.get(route) for _ in range(concurrency)))
+    return [response.status_code for response in responses]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求合并检查")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--image-name", default="elasticsearch:7.17.10")
+    parser.add_argument("--latency", type=float, default=0.5, help="桩服务延迟（秒），需大于请求发出的时间窗口")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    route = f"/api/dudubird/image_info?image_name={args.image_name}"
+    with run_stub(args.stub_port, args.latency, 0.0) as stub_url, \
+            run_spider("dudubird-spider", args.port, upstream_env(stub_url)) as base_url:
+        httpx.post(f"{stub_url}/__reset")
+        statuses = asyncio.run(fire(base_url, route, args.concurrency))
+        hits = httpx.get(f"{stub_url}/__stats").json()
+        upstream_hits = hits.get(f"{DUDUBIRD_PREFIX}/image/{args.image_name}", 0)
+
+    ok = all(status == 200 for status in statuses) and upstream_hits == 1
+    print(f"requests={len(statuses)} ok={statuses.count(200)} upstream_hits={upstream_hits}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+搜索结果紧凑存储检查（dudubird 搜索缓存）：
+1. 用 tracemalloc 对比 N 条结果以 dict 列表（原来的缓存形式）和 CompactImages 保存时每条占用的内存
+2. 序列化结果（响应、持久化）与 dict 列表完全一致，从 JSON 读回后得到同样的数据
+3. SearchResults 在两种形式上的排序、筛选和翻页结果一致，并对比取一页的耗时
+
+用法:
+    python compact_check.py --rows 100000
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from harness import SPIDER_ROOT
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.card_fields import ImageColumns  # noqa: E402
+from util.compact_images import CompactImages, compact_search_result  # noqa: E402
+from util.json_response import dumps, loads  # noqa: E402
+from util.search_view import SearchResults  # noqa: E402
+
+PLATFORMS = ["linux/amd64", "linux/arm64", "linux/arm", "linux/386", "linux/ppc64le", "linux/s390x"]
+SOURCES = ["docker.io", "ghcr.io", "quay.io", "gcr.io", "registry.k8s.io", "docker.elastic.co"]
+NAMESPACES = ["library", "bitnami", "grafana", "elastic", "prom", "jetbrains", "apache", "rancher"]
+
+
+def synthetic_rows(count: int, seed: int = 7):
+    """
+    与上游页面解析结果相同形式的数据：每条的字符串都是新对象（与解析 HTML 得到的一样），
+    架构、镜像源、图标地址只有少量不同的值
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        namespace = rng.choice(NAMESPACES)
+        rows.append({
+            "icon_path": "https://docker.aityp.com/" + "".join(["static/icons/", namespace, ".svg"]),
+            "image_name": f"{namespace}/image-{i % 5000}:{rng.randint(1, 30)}.{rng.randint(0, 20)}.{i}",
+            "platform": "".join(["linux/", rng.choice(PLATFORMS)[6:]]),
+            "source": "".join([rng.choice(SOURCES), ""]),
+            "size": f"{rng.uniform(1, 2048):.2f}MB",
+            "collection_date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                               f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+        })
+    return rows
+
+
+def measure(build):
+    """构建过程中新分配且仍然存活的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索结果紧凑存储检查")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+    checks = {}
+
+    # 原来的缓存形式：dict 列表 + 数值列
+    def build_legacy():
+        rows = synthetic_rows(args.rows)
+        return {"count": args.rows, "results": rows, "columns": ImageColumns.from_rows(rows).numeric()}
+
+    legacy, legacy_bytes = measure(build_legacy)
+    serialized = len(dumps(legacy["results"]))
+    columns = ImageColumns.from_rows(synthetic_rows(args.rows))
+    compact, compact_bytes = measure(lambda: {"count": args.rows, "results": CompactImages(columns)})
+    print(f"rows={args.rows} serialized={serialized / args.rows:.0f}B/row")
+    print(f"dict rows + numeric columns: {legacy_bytes / 2 ** 20:.1f}MiB ({legacy_bytes / args.rows:.0f}B/row)")
+    print(f"CompactImages: {compact_bytes / 2 ** 20:.1f}MiB ({compact_bytes / args.rows:.0f}B/row), "
+          f"{legacy_bytes / compact_bytes:.1f}x smaller")
+    checks["memory"] = compact_bytes * 3 < legacy_bytes
+
+    # 序列化后与 dict 列表相同，读回后再转换为紧凑存储
+    payload = dumps(compact)
+    checks["serialize"] = payload == dumps({"count": args.rows, "results": legacy["results"]})
+    restored = compact_search_result(loads(payload))
+    checks["restore"] = (isinstance(restored["results"], CompactImages)
+                         and restored["results"].rows() == legacy["results"]
+                         and list(restored["results"].size_bytes) == legacy["columns"]["size_bytes"])
+
+    # 查询结果一致；紧凑存储只转换当前页
+    legacy_view, compact_view = SearchResults(legacy["results"]), SearchResults(compact["results"])
+    rng = random.Random(11)
+    queries = [dict(order=(column, descending), page=rng.randint(1, 50), page_size=50)
+               for column in ("name", "size", "date") for descending in (False, True)]
+    queries += [dict(order=("size", True), min_size=100 * 2 ** 20, max_size=500 * 2 ** 20, page=2, page_size=100),
+                dict(synced_after=1740000000, synced_before=1750000000, page=1, page_size=20),
+                dict(order=None, page=3, page_size=50)]
+    checks["query"] = all(legacy_view.query(**query) == compact_view.query(**query) for query in queries)
+
+    for name, view in (("dict rows", legacy_view), ("CompactImages", compact_view)):
+        start = time.perf_counter()
+        for page in range(1, args.pages + 1):
+            view.query(("size", True), page=page, page_size=50)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed / args.pages * 1e6:.0f}us per page of 50")
+    start = time.perf_counter()
+    dumps(compact)
+    print(f"CompactImages full serialization: {(time.perf_counter() - start) * 1e3:.0f}ms")
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
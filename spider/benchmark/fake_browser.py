@@ -0,0 +1,82 @@
+"""
+本地假浏览器驱动，实现 BrowserPool 和 extract_with_selenium 用到的 WebDriver 接口：
+启动有固定开销，get() 通过 httpx 读取页面（非 http 地址读取本地夹具），
+点击"详细说明"后页面中才出现 .prose 文档，JS 堆占用随打开的页面数增长。
+
+爬虫服务可通过 XUANYUAN_BROWSER_DRIVER=fake_browser:FakeDriver 使用（需把本目录加入 PYTHONPATH）
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+FIXTURE = Path(__file__).parent / "fixtures" / "xuanyuan" / "image.html"
+STARTUP_SECONDS = float(os.getenv("FAKE_BROWSER_STARTUP", 0.5))
+PAGE_SECONDS = float(os.getenv("FAKE_BROWSER_PAGE", 0.05))
+HEAP_BASE = 20 * 1024 * 1024
+HEAP_PER_PAGE = 5 * 1024 * 1024
+DOCUMENTATION = '<div class="prose"><h2>How to use this image</h2><p>docker run -d nginx</p></div>'
+
+# 所有实例共享的计数，检查脚本用来确认并发上限和会话数
+lock = threading.Lock()
+counters = {"started": 0, "quit": 0, "active_renders": 0, "max_active_renders": 0}
+
+
+class FakeElement:
+    def __init__(self, on_click=None):
+        self._on_click = on_click
+
+    def click(self):
+        if self._on_click is not None:
+            self._on_click()
+
+
+class FakeDriver:
+    def __init__(self):
+        time.sleep(STARTUP_SECONDS)
+        self._html = ""
+        self._documentation = False
+        self.pages = 0
+        with lock:
+            counters["started"] += 1
+
+    def get(self, url: str):
+        with lock:
+            counters["active_renders"] += 1
+            counters["max_active_renders"] = max(counters["max_active_renders"], counters["active_renders"])
+        try:
+            time.sleep(PAGE_SECONDS)
+            if url.startswith("http"):
+                self._html = httpx.get(url, timeout=10).text
+            else:
+                self._html = FIXTURE.read_text(encoding="utf-8")
+            self._documentation = False
+            self.pages += 1
+        finally:
+            with lock:
+                counters["active_renders"] -= 1
+
+    def _show_documentation(self):
+        self._documentation = True
+
+    def find_elements(self, by: str, value: str):
+        if by == "xpath" and "详细说明" in value and "详细说明" in self._html:
+            return [FakeElement(self._show_documentation)]
+        if by == "class name" and value == "prose" and self._documentation:
+            return [FakeElement()]
+        return []
+
+    @property
+    def page_source(self) -> str:
+        if self._documentation:
+            return self._html.replace("</body>", DOCUMENTATION + "</body>")
+        return self._html
+
+    def execute_script(self, script: str):
+        return HEAP_BASE + HEAP_PER_PAGE * self.pages
+
+    def quit(self):
+        with lock:
+            counters["quit"] += 1
@@ -0,0 +1,87 @@
+"""
+上游重试与对冲检查（dudubird 服务 + 桩服务）：
+1. 重试：桩服务下一个请求返回 502，爬虫自动重试后仍返回 200
+2. 对冲：桩服务按比例制造长尾请求，分别在开启 / 关闭对冲时顺序请求 N 个不同镜像，
+   比较 p50 / p99 耗时，并确认额外请求数不超过预算（长尾比例需低于 5%，否则 p95 本身就落在长尾中）
+
+用法:
+    python fetch_check.py --requests 200 --tail-ratio 0.02 --tail-latency 1.0
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+
+UPSTREAM = "docker.aityp.com"
+# 关闭限流，只观察重试和对冲的效果
+ENV = {"SPIDER_GOVERNOR": "0"}
+
+
+def image_route(image_name: str) -> str:
+    return f"/api/dudubird/image_info?image_name={image_name}"
+
+
+def fetch_stats(base_url: str):
+    return httpx.get(f"{base_url}/api/dudubird/upstream/stats").json()[UPSTREAM]["fetch_policy"]
+
+
+def retry_check(stub_url: str, base_url: str) -> bool:
+    httpx.post(f"{stub_url}/__fail", params={"status": 502, "count": 1})
+    response = httpx.get(base_url + image_route("retry:1"), timeout=30)
+    stats = fetch_stats(base_url)
+    print(f"retry: status={response.status_code} retries={stats['retries']}")
+    return response.status_code == 200 and stats["retries"] == 1
+
+
+def latency_run(base_url: str, requests: int, label: str):
+    timings = []
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            client.get(image_route(f"{label}:{i}")).raise_for_status()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    stats = fetch_stats(base_url)
+    p50 = statistics.median(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{label}: p50={p50 * 1000:.0f}ms p99={p99 * 1000:.0f}ms max={timings[-1] * 1000:.0f}ms "
+          f"requests={stats['requests']} hedges={stats['hedges']} hedge_wins={stats['hedge_wins']} "
+          f"primary_wins={stats['primary_wins']} budget_exhausted={stats['budget_exhausted']}")
+    return p99, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上游重试与对冲检查")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tail-ratio", type=float, default=0.02)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    checks = {}
+    with run_stub(args.stub_port, args.latency, 0.005, args.tail_ratio, args.tail_latency) as stub_url:
+        env = {**upstream_env(stub_url), **ENV}
+        with run_spider("dudubird-spider", args.port, {**env, "SPIDER_FETCH_HEDGE": "0"}, quiet=True) as base_url:
+            checks["retry"] = retry_check(stub_url, base_url)
+            baseline_p99, _ = latency_run(base_url, args.requests, "no-hedge")
+        with run_spider("dudubird-spider", args.port, env, quiet=True) as base_url:
+            hedged_p99, stats = latency_run(base_url, args.requests, "hedge")
+
+    extra = stats["hedges"] + stats["retries"]
+    budget = stats["policy"]["budget_max"] + stats["requests"] * stats["policy"]["budget_ratio"]
+    print(f"p99 {baseline_p99 * 1000:.0f}ms -> {hedged_p99 * 1000:.0f}ms, extra requests={extra} (budget {budget:.0f})")
+    checks["hedge"] = hedged_p99 < baseline_p99 and stats["hedge_wins"] > 0 and extra <= budget
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
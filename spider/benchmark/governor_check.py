@@ -0,0 +1,108 @@
+"""
+上游限流与熔断检查（dudubird 服务 + 桩服务）：
+1. 令牌桶：并发请求 N 个不同镜像，上游请求按配置的速率放行
+2. 自适应并发：上游耗时超过目标值时并发上限收缩
+3. 熔断：上游持续返回 503 后熔断，新请求直接返回 503（带 Retry-After）且不再请求上游，
+   已缓存的数据继续返回旧值
+4. 恢复：上游恢复、熔断期满后探测成功，熔断关闭
+
+用法:
+    python governor_check.py
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+
+RATE = 5
+OPEN_SECONDS = 2
+FAILURE_THRESHOLD = 3
+INITIAL_LIMIT = 16
+
+
+async def fire(base_url: str, routes):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        return await asyncio.gather(*(client.get(route) for route in routes))
+
+
+def image_route(image_name: str) -> str:
+    return f"/api/dudubird/image_info?image_name={image_name}"
+
+
+def upstream_hits(stub_url: str) -> int:
+    return sum(httpx.get(f"{stub_url}/__stats").json().values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上游限流与熔断检查")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    env = {
+        "SPIDER_GOVERNOR_RATE": str(RATE),
+        "SPIDER_GOVERNOR_BURST": "1",
+        "SPIDER_GOVERNOR_INITIAL_LIMIT": str(INITIAL_LIMIT),
+        # 桩服务延迟 50ms，高于目标值，每次成功都会尝试收缩并发上限
+        "SPIDER_GOVERNOR_LATENCY_TARGET": "0.02",
+        "SPIDER_GOVERNOR_FAILURE_THRESHOLD": str(FAILURE_THRESHOLD),
+        "SPIDER_GOVERNOR_OPEN_SECONDS": str(OPEN_SECONDS),
+        # 缓存很快过期且没有 stale 期，之后只能靠上游失败时的兜底返回
+        "SPIDER_CACHE_IMAGE_INFO_TTL": "0.2",
+        "SPIDER_CACHE_IMAGE_INFO_STALE_TTL": "0",
+    }
+    checks = {}
+    with run_stub(args.stub_port, 0.05, 0.0) as stub_url, \
+            run_spider("dudubird-spider", args.port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+        stats_url = f"{base_url}/api/dudubird/upstream/stats"
+
+        start = time.perf_counter()
+        responses = asyncio.run(fire(base_url, [image_route(f"nginx:{i}") for i in range(args.requests)]))
+        elapsed = time.perf_counter() - start
+        governor = httpx.get(stats_url).json()["docker.aityp.com"]["governor"]
+        expected = (args.requests - 1) / RATE
+        print(f"rate: {args.requests} requests in {elapsed:.2f}s (>= {expected:.2f}s expected) "
+              f"throttled={governor['throttled']} wait={governor['throttle_wait_seconds']}s")
+        checks["rate"] = all(r.status_code == 200 for r in responses) and elapsed >= expected * 0.9
+        print(f"aimd: limit {INITIAL_LIMIT} -> {governor['limit']}, "
+              f"decreases={sum(d['event'] == 'limit_decrease' for d in governor['decisions'])}")
+        checks["aimd"] = governor["limit"] < INITIAL_LIMIT
+
+        time.sleep(0.3)
+        httpx.post(f"{stub_url}/__fail", params={"status": 503})
+        failed = [httpx.get(base_url + image_route(f"redis:{i}"), timeout=30).status_code
+                  for i in range(FAILURE_THRESHOLD)]
+        governor = httpx.get(stats_url).json()["docker.aityp.com"]["governor"]
+        hits_before = upstream_hits(stub_url)
+        start = time.perf_counter()
+        rejected = httpx.get(base_url + image_route("redis:new"), timeout=30)
+        rejected_latency = time.perf_counter() - start
+        stale = httpx.get(base_url + image_route("nginx:0"), timeout=30)
+        hits_after = upstream_hits(stub_url)
+        print(f"breaker: failures={failed} state={governor['state']} rejected={rejected.status_code} "
+              f"retry_after={rejected.headers.get('Retry-After')} latency={rejected_latency * 1000:.1f}ms "
+              f"stale={stale.status_code} upstream_hits_while_open={hits_after - hits_before}")
+        checks["breaker"] = (governor["state"] == "open" and rejected.status_code == 503
+                             and rejected.headers.get("Retry-After") is not None
+                             and stale.status_code == 200 and hits_after == hits_before)
+
+        httpx.post(f"{stub_url}/__reset")
+        time.sleep(OPEN_SECONDS + 0.2)
+        recovered = httpx.get(base_url + image_route("redis:new"), timeout=30)
+        governor = httpx.get(stats_url).json()["docker.aityp.com"]["governor"]
+        events = [d["event"] for d in governor["decisions"] if d["event"] != "limit_decrease"]
+        print(f"recovery: status={recovered.status_code} state={governor['state']} events={events}")
+        checks["recovery"] = recovered.status_code == 200 and governor["state"] == "closed"
+
+    failed_checks = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed_checks else f"failed: {failed_checks}")
+    sys.exit(0 if not failed_checks else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+基准测试公共工具：在子进程中启动本地桩服务和爬虫服务
+"""
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+from stub_server import DUDUBIRD_PREFIX, XUANYUAN_CLOUD_PREFIX, XUANYUAN_DOCKERS_PREFIX
+
+SPIDER_ROOT = Path(__file__).resolve().parent.parent
+
+
+@contextmanager
+def run_process(args, cwd, env=None, quiet=False):
+    # quiet 时丢弃子进程的日志输出，避免淹没测试结果
+    output = subprocess.DEVNULL if quiet else None
+    process = subprocess.Popen(args, cwd=cwd, env={**os.environ, **(env or {})},
+                               stdout=output, stderr=output)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Service not ready: {url}")
+
+
+@contextmanager
+def run_stub(port: int, latency: float, jitter: float, tail_ratio: float = 0.0, tail_latency: float = 0.0):
+    with run_process([sys.executable, "stub_server.py", "--port", str(port),
+                      "--latency", str(latency), "--jitter", str(jitter),
+                      "--tail-ratio", str(tail_ratio), "--tail-latency", str(tail_latency)],
+                     cwd=Path(__file__).parent):
+        wait_ready(f"http://127.0.0.1:{port}/__stats")
+        yield f"http://127.0.0.1:{port}"
+
+
+def upstream_env(stub_url: str) -> dict:
+    """把各上游地址指向桩服务中对应的路径前缀"""
+    return {
+        "DUDUBIRD_URL": f"{stub_url}{DUDUBIRD_PREFIX}",
+        "XUANYUAN_DOCKERS_URL": f"{stub_url}{XUANYUAN_DOCKERS_PREFIX}",
+        "XUANYUAN_CLOUD_URL": f"{stub_url}{XUANYUAN_CLOUD_PREFIX}",
+    }
+
+
+@contextmanager
+def run_spider(service: str, port: int, env: dict, quiet: bool = False):
+    # 默认不使用持久化存储，避免上一次运行留下的数据影响结果
+    env = {"SPIDER_STORE_PATH": "", **env}
+    with run_process([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                      "--log-level", "warning"],
+                     cwd=SPIDER_ROOT / service, env=env, quiet=quiet):
+        wait_ready(f"http://127.0.0.1:{port}/openapi.json")
+        yield f"http://127.0.0.1:{port}"
+
+
+@contextmanager
+def run_cluster(service: str, port: int, workers: int, env: dict, quiet: bool = False):
+    """以多进程模式（util.cluster，带本地缓存 broker）启动爬虫服务"""
+    env = {"SPIDER_STORE_PATH": "", **env}
+    code = f"from util import cluster; cluster.run('main:app', '127.0.0.1', {port}, workers={workers})"
+    with run_process([sys.executable, "-c", code], cwd=SPIDER_ROOT / service, env=env, quiet=quiet):
+        wait_ready(f"http://127.0.0.1:{port}/openapi.json", timeout=60)
+        yield f"http://127.0.0.1:{port}"
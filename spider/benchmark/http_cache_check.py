@@ -0,0 +1,90 @@
+"""
+条件请求和压缩检查：
+1. 启动 dudubird 服务，确认响应带 ETag 和按缓存有效期设置的 Cache-Control，If-None-Match 命中时返回 304，
+   大响应按 Accept-Encoding 使用 br / gzip 压缩
+2. 模拟前端轮询同一查询，对比改造前（每次完整的未压缩 JSON）与带 ETag + 压缩时传输的字节数
+3. 缓存过期后再次请求，确认服务向上游发送条件请求，上游返回 304 时复用上次的解析结果
+
+用法:
+    python http_cache_check.py --polls 50
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="条件请求和压缩检查")
+    parser.add_argument("--polls", type=int, default=50)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    ttl = 2
+    env = {
+        "SPIDER_CACHE_IMAGE_INFO_TTL": str(ttl),
+        "SPIDER_CACHE_IMAGE_INFO_STALE_TTL": "0",
+        "SPIDER_PREFETCH": "0",
+    }
+    search = "/api/dudubird/search_images?search=nginx"
+    detail = "/api/dudubird/image_info?image_name=nginx:1.25"
+    checks = {}
+    with run_stub(args.stub_port, 0.02, 0.0) as stub_url, \
+            run_spider("dudubird-spider", args.port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            plain = client.get(search, headers={"Accept-Encoding": "identity"})
+            gzipped = client.get(search, headers={"Accept-Encoding": "gzip"})
+            brotli = client.get(search, headers={"Accept-Encoding": "br, gzip"})
+            sizes = {name: int(response.headers["content-length"])
+                     for name, response in (("identity", plain), ("gzip", gzipped), ("br", brotli))}
+            print(f"search_images: sizes={sizes} etag={plain.headers['etag']} "
+                  f"cache-control={plain.headers['cache-control']!r} vary={plain.headers.get('vary')!r}")
+            checks["compression"] = (gzipped.headers.get("content-encoding") == "gzip"
+                                     and brotli.headers.get("content-encoding") in ("br", "gzip")
+                                     and sizes["gzip"] < sizes["identity"] // 3
+                                     and gzipped.json() == plain.json() == brotli.json())
+            checks["cache_control"] = plain.headers["cache-control"].startswith("public, max-age=")
+            checks["etag"] = plain.headers["etag"] == gzipped.headers["etag"] == brotli.headers["etag"]
+
+            # 前端轮询：改造前每次都是完整的未压缩响应；现在第一次压缩返回，之后带 If-None-Match 得到 304
+            before = sizes["identity"] * args.polls
+            transferred = 0
+            etag = None
+            statuses = []
+            for _ in range(args.polls):
+                headers = {"Accept-Encoding": "br, gzip"}
+                if etag:
+                    headers["If-None-Match"] = etag
+                response = client.get(search, headers=headers)
+                statuses.append(response.status_code)
+                etag = response.headers.get("etag", etag)
+                transferred += int(response.headers.get("content-length", 0))
+            not_modified = statuses.count(304)
+            print(f"polling x{args.polls}: before={before}B after={transferred}B not_modified={not_modified}")
+            checks["polling"] = not_modified == args.polls - 1 and transferred < before // 10
+
+            # 上游条件请求
+            first = client.get(detail)
+            time.sleep(ttl + 0.5)
+            second = client.get(detail, headers={"If-None-Match": first.headers["etag"]})
+            validators = client.get("/api/dudubird/cache/stats").json()["upstream_validators"]
+            upstream = httpx.get(f"{stub_url}/__stats").json()
+            print(f"upstream: second_status={second.status_code} validators={validators} "
+                  f"stub_not_modified={upstream.get('not_modified', 0)}")
+            checks["upstream"] = (second.status_code == 304 and validators["not_modified"] >= 1
+                                  and upstream.get("not_modified", 0) >= 1)
+
+            metrics = client.get("/metrics").text
+            checks["metrics"] = 'spider_http_cache_responses_total{outcome="not_modified"}' in metrics
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+本地搜索索引检查：
+1. 构造 N 条镜像记录，对比索引查询与逐条过滤排序的结果，并测量各排序方式的查询耗时
+2. 开启本地索引启动爬虫服务，先搜索一次，再用更具体的关键词、筛选和排序搜索，确认由本地索引返回；
+   之后的翻页和切换排序复用同一个视图
+3. 后台刷新时上游页面未变化（304），索引中该查询的抓取时间同样更新，不会每轮都被当作过期重新抓取
+
+用法:
+    python index_check.py --items 100000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.image_index import ALL, SORTS, ImageIndex, parse_size  # noqa: E402
+
+REPOS = ["library/nginx", "library/redis", "library/mysql", "bitnami/postgresql", "elastic/elasticsearch",
+         "library/busybox", "grafana/grafana", "prom/prometheus", "library/python", "library/node"]
+SITES = ["docker.io", "gcr.io", "ghcr.io", "quay.io", "registry.k8s.io", "docker.elastic.co"]
+PLATFORMS = ["linux/amd64", "linux/arm64", "linux/arm", "linux/386"]
+
+
+def synthetic_items(count: int):
+    random.seed(1)
+    items = []
+    for i in range(count):
+        site = random.choice(SITES)
+        items.append({
+            "icon_path": "https://docker.aityp.com/static/svg/docker.svg",
+            "image_name": f"{site}/{random.choice(REPOS)}:{i // 100}.{i % 100}",
+            "platform": random.choice(PLATFORMS),
+            "source": site,
+            "size": f"{random.uniform(1, 2000):.2f}MB",
+            "collection_date": f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} "
+                               f"{random.randint(0, 23):02d}:{random.randint(0, 59):02d}",
+        })
+    return items
+
+
+def brute_force(items, search, site, platform, sort):
+    column, descending = SORTS[sort]
+    matched = [item for item in items if search in item["image_name"].lower()
+               and site in (ALL, item["source"]) and platform in (ALL, item["platform"])]
+    key = {
+        "name": lambda item: (item["image_name"].lower(),) * 2,
+        "size": lambda item: (parse_size(item["size"]), item["image_name"].lower()),
+        "date": lambda item: (item["collection_date"], item["image_name"].lower()),
+    }[column]
+    return sorted(matched, key=key, reverse=descending)
+
+
+def check_in_process(count: int, lookups: int) -> bool:
+    items = synthetic_items(count)
+    index = ImageIndex()
+    start = time.perf_counter()
+    # 按仓库名分别收录，相当于上游对每个仓库名搜索过一次
+    for repo in REPOS:
+        keyword = repo.split("/")[-1]
+        index.ingest({"search": keyword}, [item for item in items if keyword in item["image_name"]])
+    print(f"indexed {len(index)} items in {time.perf_counter() - start:.2f}s")
+
+    queries = [("nginx:12.", ALL, ALL), ("redis:3", "docker.io", "linux/amd64"),
+               ("elasticsearch:99.9", ALL, "linux/arm64"), ("grafana", "quay.io", ALL)]
+    ok = True
+    for search, site, platform in queries:
+        for sort in SORTS:
+            expected = brute_force(items, search, site, platform, sort)
+            results = index.search(search, site, platform, sort)
+            if [item["image_name"] for item in results] != [item["image_name"] for item in expected]:
+                print(f"MISMATCH {search!r} {site} {platform} {sort}")
+                ok = False
+            timings = []
+            for _ in range(lookups):
+                # 测量实际的查询耗时，不计索引未变化时对同一查询结果的复用
+                index._results.clear()
+                start = time.perf_counter()
+                index.search(search, site, platform, sort)
+                timings.append(time.perf_counter() - start)
+            print(f"{search!r:>22} {site:>10} {platform:>12} {sort}: results={len(results):>5} "
+                  f"p50={statistics.median(timings) * 1e6:.0f}us")
+    return ok
+
+
+def check_service(latency: float) -> bool:
+    env_overrides = {"DUDUBIRD_LOCAL_INDEX": "1"}
+    with run_stub(9100, latency, 0.0) as stub_url, \
+            run_spider("dudubird-spider", 9166, {**upstream_env(stub_url), **env_overrides}, quiet=True) as base_url:
+        route = f"{base_url}/api/dudubird/search_images"
+        httpx.get(route, params={"search": "docker.elastic.co"}, timeout=30).raise_for_status()
+        httpx.post(f"{stub_url}/__reset")
+        start = time.perf_counter()
+        response = httpx.get(route, params={"search": "docker.elastic.co/mysql", "platform": "linux/amd64",
+                                            "sort": "镜像大小"}, timeout=30)
+        elapsed = time.perf_counter() - start
+        upstream_hits = sum(httpx.get(f"{stub_url}/__stats").json().values())
+        # 本地索引的结果翻页、切换排序复用同一个视图，不重新查询和建立视图
+        views = httpx.get(f"{base_url}/api/dudubird/cache/stats").json()["search_views"]
+        for params in ({"page": 1, "page_size": 1}, {"page": 2, "page_size": 1}, {"order_by": "-date"}):
+            httpx.get(route, params={"search": "docker.elastic.co", **params}, timeout=30).raise_for_status()
+        cache_stats = httpx.get(f"{base_url}/api/dudubird/cache/stats").json()
+        stats, paged_views = cache_stats["image_index"], cache_stats["search_views"]
+    results = response.json()["results"]
+    sizes = [parse_size(item["size"]) for item in results]
+    builds = paged_views["builds"] - views["builds"]
+    ok = (response.status_code == 200 and upstream_hits == 0 and stats["local_hits"] == 4
+          and sizes == sorted(sizes, reverse=True) and builds == 1
+          and all("mysql" in item["image_name"] and item["platform"] == "linux/amd64" for item in results))
+    print(f"service: results={len(results)} latency={elapsed * 1000:.1f}ms upstream_hits={upstream_hits} "
+          f"view builds for 3 pages={builds} index={stats} {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def check_not_modified_refresh(latency: float, interval: float = 1.0, wait: float = 4.0) -> bool:
+    env_overrides = {"DUDUBIRD_LOCAL_INDEX": "1", "DUDUBIRD_INDEX_REFRESH_INTERVAL": str(interval),
+                     "DUDUBIRD_INDEX_REFRESH_TICK": str(interval / 4)}
+    with run_stub(9100, latency, 0.0) as stub_url, \
+            run_spider("dudubird-spider", 9166, {**upstream_env(stub_url), **env_overrides}, quiet=True) as base_url:
+        httpx.get(f"{base_url}/api/dudubird/search_images", params={"search": "docker.elastic.co"},
+                  timeout=30).raise_for_status()
+        time.sleep(wait)
+        not_modified = httpx.get(f"{stub_url}/__stats").json().get("not_modified", 0)
+        stats = httpx.get(f"{base_url}/api/dudubird/cache/stats").json()["image_index"]
+    # 每次刷新都得到 304；抓取时间随之更新时，查询的年龄不会超过刷新间隔太多
+    age = stats["oldest_query_age"]
+    ok = not_modified > 0 and age is not None and age < interval * 2
+    print(f"refresh with 304: not_modified={not_modified} oldest_query_age={age}s after {wait}s "
+          f"(interval {interval}s) {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地搜索索引检查")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="桩服务延迟（秒）")
+    args = parser.parse_args()
+
+    in_process_ok = check_in_process(args.items, args.lookups)
+    service_ok = check_service(args.latency)
+    refresh_ok = check_not_modified_refresh(args.latency)
+    sys.exit(0 if in_process_ok and service_ok and refresh_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
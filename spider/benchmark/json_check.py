@@ -0,0 +1,175 @@
+"""
+JSON 序列化检查：
+1. xuanyuan 转发接口：对比改造前（解码上游 JSON 再用 JSONResponse 编码）与原样转发、按 fields 裁剪的
+   每次请求 CPU 时间和响应大小
+2. dudubird 抓取接口：对比 response_model 校验 + JSONResponse 与直接返回 FastJSONResponse 的 CPU 时间
+3. 启动 xuanyuan 服务，确认转发的字节与上游完全一致、fields 裁剪生效、重启后从磁盘读出的原始字节不变
+
+用法:
+    python json_check.py --tags 100 --requests 2000
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+from stub_server import XUANYUAN_DOCKERS_PREFIX
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def use_service(service: str):
+    # 两个服务的包名相同（util / model），切换前清掉已导入的模块
+    for name in list(sys.modules):
+        if name.split(".")[0] in ("util", "model", "apirouter"):
+            del sys.modules[name]
+    sys.path.insert(0, str(SPIDER_ROOT / service))
+
+
+def cpu_per_request(client: TestClient, route: str, requests: int) -> tuple:
+    size = len(client.get(route).content)
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(route)
+    return (time.process_time() - start) / requests, size
+
+
+def tag_page(tags: int) -> bytes:
+    template = json.loads((FIXTURES / "xuanyuan" / "tags.json").read_text(encoding="utf-8"))["results"][0]
+    results = [{**template, "id": index, "name": f"v{index}"} for index in range(tags)]
+    return json.dumps({"count": tags, "next": None, "previous": None, "results": results},
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def passthrough_check(tags: int, requests: int) -> bool:
+    use_service("xuanyuan-spider")
+    from util.json_response import passthrough_response
+
+    raw = tag_page(tags)
+    cached = json.loads(raw)
+    app = FastAPI()
+
+    # 改造前：缓存命中时重新编码缓存的 dict，未命中时还要先解码
+    @app.get("/decoded/hit")
+    async def decoded_hit():
+        return JSONResponse(content=cached)
+
+    @app.get("/decoded/miss")
+    async def decoded_miss():
+        return JSONResponse(content=json.loads(raw))
+
+    @app.get("/raw")
+    async def passthrough(fields: str = None):
+        return passthrough_response(raw, fields)
+
+    # 空路由，作为测试客户端本身的开销
+    @app.get("/empty")
+    async def empty():
+        return JSONResponse(content=None)
+
+    with TestClient(app) as client:
+        baseline, _ = cpu_per_request(client, "/empty", requests)
+        timings = {name: cpu_per_request(client, route, requests) for name, route in (
+            ("decoded hit", "/decoded/hit"),
+            ("decoded miss", "/decoded/miss"),
+            ("pass-through", "/raw"),
+            ("fields=name,last_updated", "/raw?fields=name,last_updated"),
+        )}
+        identical = client.get("/raw").content == raw
+    for name, (cpu, size) in timings.items():
+        print(f"tags x{tags} {name}: cpu={(cpu - baseline) * 1e6:.0f}us/request (+{baseline * 1e6:.0f}us client) "
+              f"size={size}B")
+    return (identical and timings["pass-through"][0] < timings["decoded hit"][0]
+            and timings["fields=name,last_updated"][1] < timings["pass-through"][1])
+
+
+def scraped_check(items: int, requests: int) -> bool:
+    use_service("dudubird-spider")
+    from model.image_search_response import ImageSearchResponse
+    from util.image_info_util import extract_image_info
+    from util.json_response import FastJSONResponse
+
+    parsed = extract_image_info((FIXTURES / "dudubird" / "search.html").read_text(encoding="utf-8"))
+    results = [{**parsed[index % len(parsed)], "image_name": f"image-{index}"} for index in range(items)]
+    data = {"count": len(results), "results": results}
+    app = FastAPI()
+
+    # 与 search_images 路由的声明一致：不分页时不输出为空的分页字段
+    @app.get("/model", response_model=ImageSearchResponse, response_model_exclude_none=True)
+    async def validated():
+        return data
+
+    @app.get("/fast", response_model=ImageSearchResponse, response_model_exclude_none=True)
+    async def fast():
+        return FastJSONResponse(data)
+
+    with TestClient(app) as client:
+        (validated_cpu, validated_size) = cpu_per_request(client, "/model", requests)
+        (fast_cpu, fast_size) = cpu_per_request(client, "/fast", requests)
+        same = client.get("/model").json() == client.get("/fast").json()
+    print(f"search x{items} response_model: cpu={validated_cpu * 1e6:.0f}us/request size={validated_size}B")
+    print(f"search x{items} FastJSONResponse: cpu={fast_cpu * 1e6:.0f}us/request size={fast_size}B")
+    return same and fast_cpu < validated_cpu
+
+
+def service_check(stub_port: int, port: int) -> bool:
+    use_service("xuanyuan-spider")
+    from apirouter.xuanyuan_router import tags_page_url
+
+    tags_route = "/api/xuanyuan/image_tags?image_name=library/nginx&page_size=100"
+    search_route = "/api/xuanyuan/v2/search?image_name=nginx"
+    checks = {}
+    with tempfile.TemporaryDirectory() as directory:
+        env = {"SPIDER_STORE_PATH": str(Path(directory) / "store.sqlite3")}
+        with run_stub(stub_port, 0.02, 0.0) as stub_url:
+            upstream = httpx.get(stub_url + XUANYUAN_DOCKERS_PREFIX
+                                 + tags_page_url("library/nginx", "", 1, 100)).content
+            with run_spider("xuanyuan-spider", port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+                first = httpx.get(base_url + tags_route, timeout=30)
+                cached = httpx.get(base_url + tags_route, timeout=30)
+                projected = httpx.get(base_url + tags_route + "&fields=name,last_updated", timeout=30).json()
+                search = httpx.get(base_url + search_route, timeout=30).content
+            hits_before = sum(httpx.get(f"{stub_url}/__stats").json().values())
+            # 重启后从磁盘读取原始字节
+            with run_spider("xuanyuan-spider", port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+                restored = httpx.get(base_url + tags_route, timeout=30).content
+            hits_after = sum(httpx.get(f"{stub_url}/__stats").json().values())
+    fixture = (FIXTURES / "xuanyuan" / "searchv4.json").read_bytes()
+    checks["identical"] = first.content == upstream and cached.content == upstream and search == fixture
+    checks["content_type"] = first.headers["content-type"] == "application/json"
+    checks["fields"] = (projected["count"] == json.loads(upstream)["count"]
+                        and all(set(item) == {"name", "last_updated"} for item in projected["results"]))
+    checks["restored"] = restored == upstream and hits_after == hits_before
+    print(f"service: {checks} size={len(upstream)}B projected={len(json.dumps(projected))}B")
+    return all(checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 序列化检查")
+    parser.add_argument("--tags", type=int, default=100)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9188)
+    args = parser.parse_args()
+
+    checks = {
+        "passthrough": passthrough_check(args.tags, args.requests),
+        "scraped": scraped_check(args.items, args.requests),
+        "service": service_check(args.stub_port, args.port),
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+渡渡鸟爬虫并发压测：启动本地桩服务和爬虫服务，逐级提高并发，
+观察吞吐量是否随并发增长（请求能否在事件循环中重叠执行）
+
+用法:
+    python load_test.py --route /api/dudubird/image_info?image_name=elasticsearch:7.17.10
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+
+
+async def run_level(base_url: str, route: str, concurrency: int, requests_per_worker: int):
+    latencies = []
+
+    async def worker(client):
+        for _ in range(requests_per_worker):
+            start = time.perf_counter()
+            response = await client.get(route)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渡渡鸟爬虫并发压测")
+    parser.add_argument("--route", default="/api/dudubird/image_info?image_name=elasticsearch:7.17.10")
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--requests-per-worker", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="桩服务延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    with run_stub(args.stub_port, args.latency, args.jitter) as stub_url, \
+            run_spider("dudubird-spider", args.port, upstream_env(stub_url)) as base_url:
+        print(f"{'concurrency':>12} {'requests':>9} {'req/s':>9} {'p50(ms)':>9}")
+        for level in (int(x) for x in args.levels.split(",")):
+            result = asyncio.run(run_level(base_url, args.route, level, args.requests_per_worker))
+            print(f"{result['concurrency']:>12} {result['requests']:>9} "
+                  f"{result['throughput']:>9.1f} {result['p50_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
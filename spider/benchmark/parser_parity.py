@@ -0,0 +1,88 @@
+"""
+HTML 解析后端一致性检查：在录制页面上分别用各个后端（整页 / 区域解析）运行提取函数，
+要求输出与改造前的整页 html.parser 结果逐字节一致，并给出各组合的耗时
+
+用法:
+    python parser_parity.py --iterations 20
+"""
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SPIDER_ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).parent / "fixtures"
+SERVICES = ("dudubird-spider", "xuanyuan-spider")
+
+
+def load_cases(service: str):
+    """返回 (用例名, 提取函数) 列表，需在对应服务目录加入 sys.path 后调用"""
+    if service == "dudubird-spider":
+        from util.image_info_util import extract_image_info
+        from util.detail_extractor import extract_image_detail
+        cases = [("search.html", extract_image_info)]
+        cases += [(path.name, extract_image_detail)
+                  for path in sorted((FIXTURES / "dudubird").glob("image_detail*.html"))]
+        return [(name, func, FIXTURES / "dudubird" / name) for name, func in cases]
+
+    from util.image_info_util import parse_html, parse_search_html
+    return [
+        ("search.html", lambda html: parse_search_html(html, 1), FIXTURES / "xuanyuan" / "search.html"),
+        ("image.html", parse_html, FIXTURES / "xuanyuan" / "image.html"),
+    ]
+
+
+def run_service(service: str, iterations: int) -> bool:
+    sys.path.insert(0, str(SPIDER_ROOT / service))
+    logging.disable(logging.ERROR)
+    from util import html_parser
+
+    def run(func, html, backend, partial):
+        html_parser.HTML_PARSER = backend
+        html_parser.PARTIAL_PARSE = partial
+        return json.dumps(func(html), ensure_ascii=False).encode("utf-8")
+
+    ok = True
+    for name, func, path in load_cases(service):
+        html = path.read_text(encoding="utf-8")
+        baseline = run(func, html, "html.parser", False)
+        for backend in html_parser.BACKENDS:
+            if not html_parser.backend_available(backend):
+                print(f"{service:<16} {name:<28} {backend:<12} skipped (not installed)")
+                continue
+            for partial in (False, True):
+                output = run(func, html, backend, partial)
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    run(func, html, backend, partial)
+                elapsed = (time.perf_counter() - start) / iterations * 1000
+                status = "ok" if output == baseline else "MISMATCH"
+                ok = ok and output == baseline
+                mode = "region" if partial else "full"
+                print(f"{service:<16} {name:<28} {backend:<12} {mode:<7} {elapsed:>8.2f}ms  {status}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML 解析后端一致性检查")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--service", choices=SERVICES, help="只检查指定服务（内部使用）")
+    args = parser.parse_args()
+
+    if args.service:
+        sys.exit(0 if run_service(args.service, args.iterations) else 1)
+
+    # 两个服务的顶层包同名，分别在子进程中检查
+    results = [
+        subprocess.run([sys.executable, __file__, "--service", service,
+                        "--iterations", str(args.iterations)]).returncode
+        for service in SERVICES
+    ]
+    sys.exit(1 if any(results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+热门条目预取检查：
+1. 按 Zipf 分布生成访问序列，比较 TopK（CountMinSketch）与精确计数得到的热门条目，报告召回率和单次记录耗时
+2. 启动 dudubird 服务，反复访问一个镜像、只访问一次另一个镜像，等到缓存过期后
+   确认热门镜像已在后台刷新（仍直接命中缓存），冷门镜像没有被预取
+
+用法:
+    python prefetch_check.py --keys 10000 --accesses 200000
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+from stub_server import DUDUBIRD_PREFIX
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.prefetcher import CountMinSketch, TopK  # noqa: E402
+
+
+def sketch_check(keys: int, accesses: int, k: int, seed: int = 1) -> bool:
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(keys)]
+    # 访问序列和哈希种子都固定，结果可复现，阈值不受采样波动影响
+    sequence = [f"image_info?{key}" for key in random.Random(seed).choices(range(keys), weights, k=accesses)]
+    top = TopK(k, CountMinSketch(seed=seed))
+    start = time.perf_counter()
+    for key in sequence:
+        top.add(key)
+    per_access = (time.perf_counter() - start) / accesses
+    counts = Counter(sequence)
+    exact = {key for key, _ in counts.most_common(k)}
+    found = {key for key, _ in top.items()}
+    recall = len(exact & found) / k
+    # 找到的热门条目覆盖的访问量占精确 TopK 访问量的比例
+    coverage = sum(counts[key] for key in found) / sum(counts[key] for key in exact)
+    sketch_bytes = top.sketch.width * top.sketch.depth * 4
+    print(f"sketch: keys={keys} accesses={accesses} top{k} recall={recall:.2f} coverage={coverage:.3f} "
+          f"record={per_access * 1e6:.1f}us sketch={sketch_bytes // 1024}KB")
+    return recall >= 0.85 and coverage >= 0.95
+
+
+def service_check(stub_port: int, port: int) -> bool:
+    ttl = 3
+    env = {
+        "SPIDER_CACHE_IMAGE_INFO_TTL": str(ttl),
+        "SPIDER_CACHE_IMAGE_INFO_STALE_TTL": "0",
+        "SPIDER_PREFETCH_INTERVAL": "0.5",
+        "SPIDER_PREFETCH_LEAD": "1.5",
+        "SPIDER_PREFETCH_SPACING": "0.05",
+        "SPIDER_PREFETCH_MIN_COUNT": "3",
+    }
+    hot, cold = "nginx:1.25", "redis:7.2"
+    route = "/api/dudubird/image_info?image_name={}"
+    with run_stub(stub_port, 0.05, 0.0) as stub_url, \
+            run_spider("dudubird-spider", port, {**upstream_env(stub_url), **env}, quiet=True) as base_url:
+        for _ in range(5):
+            httpx.get(base_url + route.format(hot), timeout=30).raise_for_status()
+        httpx.get(base_url + route.format(cold), timeout=30).raise_for_status()
+        time.sleep(ttl + 1)
+        before = httpx.get(f"{base_url}/api/dudubird/cache/stats").json()
+        httpx.get(base_url + route.format(hot), timeout=30).raise_for_status()
+        after = httpx.get(f"{base_url}/api/dudubird/cache/stats").json()
+        hits = httpx.get(f"{stub_url}/__stats").json()
+    hot_hits = hits.get(f"{DUDUBIRD_PREFIX}/image/{hot}", 0)
+    cold_hits = hits.get(f"{DUDUBIRD_PREFIX}/image/{cold}", 0)
+    prefetch = after["prefetch"]
+    served_from_cache = after["hits"] == before["hits"] + 1
+    print(f"service: prefetches={prefetch['prefetches']} hot_upstream_hits={hot_hits} "
+          f"cold_upstream_hits={cold_hits} hot_served_from_cache={served_from_cache} top={prefetch['top'][:2]}")
+    return prefetch["prefetches"] >= 1 and served_from_cache and cold_hits == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热门条目预取检查")
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--accesses", type=int, default=200000)
+    parser.add_argument("--top-k", type=int, default=64)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+
+    checks = {
+        "sketch": sketch_check(args.keys, args.accesses, args.top_k),
+        "service": service_check(args.stub_port, args.port),
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
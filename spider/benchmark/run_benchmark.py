@@ -0,0 +1,210 @@
+"""
+离线基准测试：用录制的上游页面启动本地桩服务，对两个爬虫服务的各条路由逐级加压，
+输出吞吐量、p50/p95/p99 延迟和各阶段（fetch / parse / extract / validate / serialize）平均耗时，
+结果写入 JSON 文件，可与之前的结果对比。
+
+每个请求使用不同的参数并关闭响应缓存，测量的是完整的抓取和解析路径，而不是缓存命中。
+
+用法:
+    python run_benchmark.py --output results/baseline.json
+    python run_benchmark.py --output results/new.json --compare results/baseline.json
+    python run_benchmark.py --services dudubird-spider --routes image_info --levels 1,8
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+
+@dataclass(frozen=True)
+class BenchRoute:
+    name: str
+    # 路径模板，{i} 替换为请求序号，保证每个请求的参数不同
+    path: str
+
+
+SERVICES: Dict[str, List[BenchRoute]] = {
+    "dudubird-spider": [
+        BenchRoute("search_images", "/api/dudubird/search_images?search=elasticsearch-{i}"),
+        BenchRoute("image_info", "/api/dudubird/image_info?image_name=elasticsearch:7.17.{i}"),
+    ],
+    "xuanyuan-spider": [
+        BenchRoute("search", "/api/xuanyuan/search?q=nginx-{i}"),
+        BenchRoute("image_info", "/api/xuanyuan/image_info?image_name=library/nginx-{i}"),
+        BenchRoute("image_tags", "/api/xuanyuan/image_tags?image_name=library/nginx&page={i}"),
+        BenchRoute("v2_search", "/api/xuanyuan/v2/search?image_name=nginx-{i}"),
+        BenchRoute("v2_image_tags", "/api/xuanyuan/v2/image_tags?namespace=library&name=nginx&tag={i}"),
+    ],
+}
+
+SERVICE_PORTS = {"dudubird-spider": 9166, "xuanyuan-spider": 9188}
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """解析 Server-Timing 响应头，返回 {阶段: 毫秒}"""
+    stages = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value)
+    return stages
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_level(base_url: str, route: BenchRoute, concurrency: int, requests_per_worker: int):
+    latencies = []
+    stage_totals = defaultdict(float)
+    errors = 0
+    counter = iter(range(concurrency * requests_per_worker))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in range(requests_per_worker):
+            path = route.path.format(i=next(counter))
+            start = time.perf_counter()
+            response = await client.get(path)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            for name, ms in parse_server_timing(response.headers.get("Server-Timing", "")).items():
+                stage_totals[name] += ms
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # 预热一次，排除首个请求的建连和导入开销
+        await client.get(route.path.format(i="warmup"))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": ok + errors,
+        "errors": errors,
+        "throughput": ok / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "stages_ms": {name: total / ok for name, total in sorted(stage_totals.items())} if ok else {},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SPIDER_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_level(route: str, result: dict):
+    stages = " ".join(f"{name}={ms:.2f}" for name, ms in result["stages_ms"].items())
+    print(f"{route:>16} {result['concurrency']:>5} {result['requests']:>6} {result['errors']:>5} "
+          f"{result['throughput']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+          f"{result['p99_ms']:>9.1f}  {stages}")
+
+
+def compare(current: dict, baseline: dict):
+    """按 服务/路由/并发 对比吞吐量和 p95"""
+    print(f"\n{'route':>32} {'conc':>5} {'req/s':>18} {'p95(ms)':>22}")
+    for service, routes in current["results"].items():
+        for route, levels in routes.items():
+            old_levels = {level["concurrency"]: level
+                          for level in baseline.get("results", {}).get(service, {}).get(route, [])}
+            for level in levels:
+                old = old_levels.get(level["concurrency"])
+                if old is None:
+                    continue
+                throughput_change = (level["throughput"] / old["throughput"] - 1) * 100 if old["throughput"] else 0.0
+                p95_change = (level["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+                print(f"{service + '/' + route:>32} {level['concurrency']:>5} "
+                      f"{old['throughput']:>7.1f}->{level['throughput']:>7.1f} ({throughput_change:+.0f}%) "
+                      f"{old['p95_ms']:>7.1f}->{level['p95_ms']:>7.1f} ({p95_change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫服务离线基准测试")
+    parser.add_argument("--services", default=",".join(SERVICES), help="逗号分隔的服务目录名")
+    parser.add_argument("--routes", default="", help="只测试这些路由（逗号分隔），默认全部")
+    parser.add_argument("--levels", default="1,8,32")
+    parser.add_argument("--requests-per-worker", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--verbose", action="store_true", help="显示爬虫服务的日志输出")
+    parser.add_argument("--compare", help="与之前的结果 JSON 文件对比")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    only_routes = set(filter(None, args.routes.split(",")))
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "levels": levels,
+            "requests_per_worker": args.requests_per_worker,
+            "latency": args.latency,
+            "jitter": args.jitter,
+        },
+        "results": {},
+    }
+
+    print(f"{'route':>16} {'conc':>5} {'reqs':>6} {'errs':>5} {'req/s':>9} "
+          f"{'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}  stages(ms)")
+    with run_stub(args.stub_port, args.latency, args.jitter) as stub_url:
+        for service in args.services.split(","):
+            # 关闭响应缓存，每个请求都走完整的抓取和解析路径
+            env = {**upstream_env(stub_url), "SPIDER_CACHE_MAX_BYTES": "0"}
+            with run_spider(service, SERVICE_PORTS[service], env, quiet=not args.verbose) as base_url:
+                print(f"[{service}]")
+                service_results = report["results"][service] = {}
+                for route in SERVICES[service]:
+                    if only_routes and route.name not in only_routes:
+                        continue
+                    service_results[route.name] = []
+                    for level in levels:
+                        result = asyncio.run(run_level(base_url, route, level, args.requests_per_worker))
+                        service_results[route.name].append(result)
+                        print_level(route.name, result)
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nResults written to {output}")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+    failed = any(level["errors"] for routes in report["results"].values()
+                 for levels_ in routes.values() for level in levels_)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
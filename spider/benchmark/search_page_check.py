@@ -0,0 +1,112 @@
+"""
+搜索结果服务端分页 / 排序 / 筛选检查（dudubird）：
+1. 不带新参数时与改造前一样返回全部结果
+2. 各种 order_by、sort、大小和同步时间范围下逐页取完，拼起来与在全部结果上本地筛选排序的结果一致，count 为符合条件的总数
+3. 首次搜索之后的翻页、切换排序和筛选都不再请求上游，并对比单页与全部结果的响应大小和耗时
+
+用法:
+    python search_page_check.py --page-size 25
+"""
+import argparse
+import math
+import statistics
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+from stub_server import DUDUBIRD_PREFIX
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.card_fields import parse_date, parse_size  # noqa: E402
+
+SEARCH = "/api/dudubird/search_images"
+ENV = {"SPIDER_PREFETCH": "0"}
+# (查询参数, 本地排序键, 是否降序, 筛选条件)
+CASES = [
+    ({}, None, False, None),
+    ({"order_by": "-size"}, "size", True, None),
+    ({"order_by": "date"}, "date", False, None),
+    ({"sort": "镜像大小"}, "size", True, None),
+    ({"sort": "最近同步"}, "date", True, None),
+    ({"order_by": "name", "min_size": "500MB", "max_size": "1.5GB"}, "name", False,
+     lambda item: 500 * 1024 ** 2 <= parse_size(item["size"]) <= int(1.5 * 1024 ** 3)),
+    ({"order_by": "-date", "synced_after": "2025-06-01", "synced_before": "2025-09-01 00:00"}, "date", True,
+     lambda item: parse_date("2025-06-01") <= parse_date(item["collection_date"]) <= parse_date("2025-09-01")),
+    # 只有日期的上限包含当天全天（2025-12-24 15:16 和 20:16 同步的镜像都在结果中）
+    ({"order_by": "date", "synced_after": "2025-12-01", "synced_before": "2025-12-24"}, "date", False,
+     lambda item: parse_date("2025-12-01") <= parse_date(item["collection_date"]) < parse_date("2025-12-25")),
+]
+
+
+def expected_results(full, key, descending, keep):
+    items = [item for item in full if keep is None or keep(item)]
+    if key is None:
+        return items
+    values = {
+        "name": lambda item: item["image_name"].lower(),
+        "size": lambda item: parse_size(item["size"]),
+        "date": lambda item: parse_date(item["collection_date"]),
+    }[key]
+    positions = {id(item): index for index, item in enumerate(full)}
+    return sorted(items, key=lambda item: (values(item), item["image_name"].lower(), positions[id(item)]),
+                  reverse=descending)
+
+
+def upstream_hits(stub_url: str) -> int:
+    return httpx.get(f"{stub_url}/__stats").json().get(f"{DUDUBIRD_PREFIX}/i/search", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索结果服务端分页检查")
+    parser.add_argument("--page-size", type=int, default=25)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+    checks = {}
+
+    with run_stub(args.stub_port, 0.2, 0.0) as stub_url, \
+            run_spider("dudubird-spider", args.port, {**upstream_env(stub_url), **ENV}, quiet=True) as base_url, \
+            httpx.Client(base_url=base_url, timeout=30) as client:
+        full_response = client.get(SEARCH, params={"search": "nginx"})
+        full = full_response.json()
+        checks["legacy"] = set(full) == {"count", "results"} and full["count"] == len(full["results"])
+        hits = upstream_hits(stub_url)
+
+        timings = []
+        for params, key, descending, keep in CASES:
+            expected = expected_results(full["results"], key, descending, keep)
+            pages, page, total_pages = [], 1, 1
+            while page <= total_pages:
+                start = time.perf_counter()
+                response = client.get(SEARCH, params={"search": "nginx", **params,
+                                                      "page": page, "page_size": args.page_size})
+                timings.append(time.perf_counter() - start)
+                data = response.json()
+                total_pages = data["total_pages"]
+                pages.extend(data["results"])
+                page += 1
+            ok = (pages == expected and data["count"] == len(expected)
+                  and total_pages == math.ceil(len(expected) / args.page_size))
+            print(f"{params}: count={data['count']} pages={total_pages} {'ok' if ok else 'MISMATCH'}")
+            checks[f"case {params}"] = ok
+
+        invalid = client.get(SEARCH, params={"search": "nginx", "min_size": "big"})
+        checks["invalid"] = invalid.status_code == 400
+        extra = upstream_hits(stub_url) - hits
+        page_size = len(client.get(SEARCH, params={"search": "nginx", "page": 1,
+                                                   "page_size": args.page_size}).content)
+        views = client.get("/api/dudubird/cache/stats").json()["search_views"]
+        print(f"upstream fetches after first search: {extra}, search_views={views}")
+        print(f"response: all={len(full_response.content)}B page={page_size}B, "
+              f"page p50={statistics.median(timings) * 1000:.1f}ms")
+        checks["no_refetch"] = extra == 0
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+服务启动时间检查（dudubird / xuanyuan）：
+1. 改造前的启动方式（python main.py 内部以 reload=True 运行 uvicorn：reloader 进程 + 再导入一遍 main 的子进程）
+   与现在的生产入口（python main.py，不启用 reload，直接运行已导入的 app）分别冷启动 N 次，
+   记录从启动进程到 /healthz 第一次返回 200 的时间
+2. 导入 main 之后 selenium / webdriver_manager 不在 sys.modules 中（只在渲染页面时才导入）
+3. 新入口的启动时间中位数不超过改造前的 --max-ratio 倍
+
+用法:
+    python startup_check.py --runs 5
+"""
+import argparse
+import importlib.util
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT
+
+SERVICES = ("dudubird-spider", "xuanyuan-spider")
+LAZY_MODULES = ("selenium", "webdriver_manager")
+# 改造前 main.py 的 __main__：uvicorn.run(app="main:app", ..., reload=True)
+LEGACY_CODE = "import main, uvicorn; uvicorn.run(app='main:app', host='127.0.0.1', port={port}, reload=True)"
+
+
+def time_to_ready(service: str, args, port: int, env: dict, timeout: float = 30.0) -> float:
+    """启动子进程直到 /healthz 返回 200 的秒数；结束时连同 reload 子进程一起终止"""
+    url = f"http://127.0.0.1:{port}/healthz"
+    start = time.perf_counter()
+    process = subprocess.Popen(args, cwd=SPIDER_ROOT / service, env={**os.environ, **env},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(url, timeout=1.0).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f"{service} exited with {process.returncode}")
+            time.sleep(0.01)
+        raise RuntimeError(f"{service} not ready: {url}")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def lazy_modules_loaded(service: str) -> list:
+    code = f"import sys, main; print(','.join(name for name in {LAZY_MODULES!r} if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=SPIDER_ROOT / service, capture_output=True,
+                            text=True, env={**os.environ, "SPIDER_STORE_PATH": ""}, check=True).stdout.strip()
+    return [name for name in output.split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务启动时间检查")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=9177)
+    parser.add_argument("--max-ratio", type=float, default=0.7)
+    args = parser.parse_args()
+    checks = {}
+    if importlib.util.find_spec("trio"):
+        # trio 是 selenium 的依赖，安装后 httpcore 创建客户端时会导入它（约 0.1s），只装 requirements.txt 时没有这部分
+        print("note: trio is installed (requirements-browser.txt), httpcore imports it when clients are created")
+
+    # 上游地址不可达也不影响启动（lifespan 中不访问上游）；关闭预取避免后台任务干扰计时
+    env = {"SPIDER_STORE_PATH": "", "SPIDER_PREFETCH": "0", "SPIDER_WORKERS": "1"}
+    for service in SERVICES:
+        loaded = lazy_modules_loaded(service)
+        print(f"{service}: heavy optional modules after import main: {loaded or 'none'}")
+        checks[f"{service} lazy"] = not loaded
+
+        legacy, current = [], []
+        for _ in range(args.runs):
+            legacy.append(time_to_ready(service, [sys.executable, "-c", LEGACY_CODE.format(port=args.port)],
+                                        args.port, env))
+            current.append(time_to_ready(service, [sys.executable, "main.py"], args.port,
+                                         {**env, "SPIDER_HOST": "127.0.0.1", "SPIDER_PORT": str(args.port)}))
+        legacy_p50, current_p50 = statistics.median(legacy), statistics.median(current)
+        print(f"{service}: ready p50 legacy(reload)={legacy_p50 * 1000:.0f}ms "
+              f"production={current_p50 * 1000:.0f}ms ({current_p50 / legacy_p50:.2f}x), "
+              f"min {min(legacy) * 1000:.0f}ms / {min(current) * 1000:.0f}ms")
+        checks[f"{service} faster"] = current_p50 <= legacy_p50 * args.max_ratio
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+持久化存储检查：
+1. 写入 N 条镜像详情后重新打开存储（模拟冷启动进程），测量按键读取的耗时
+2. 启动爬虫服务请求一次详情，重启服务后再次请求，确认直接从磁盘命中、没有请求上游
+3. 后台清理只删除超过上游失败兜底期限（error_ttl）的数据；旧版本的数据库打开时补上该列
+
+用法:
+    python store_check.py --records 10000
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.detail_extractor import extract_image_detail  # noqa: E402
+from util.persistent_store import PersistentStore  # noqa: E402
+from util.response_cache import serialize  # noqa: E402
+
+FIXTURE = Path(__file__).parent / "fixtures" / "dudubird" / "image_detail.html"
+
+
+async def measure_reads(path: Path, records: int, lookups: int):
+    value = extract_image_detail(FIXTURE.read_text(encoding="utf-8"))
+    store = PersistentStore(str(path), flush_interval=0)
+    for i in range(records):
+        store.put(f"image_info?{i}", serialize({**value, "image_tag": str(i)}), ttl=3600, stale_ttl=3600)
+    await store.flush()
+    await store.aclose()
+
+    # 新实例相当于重启后的进程，数据库在第一次读取时才打开
+    store = PersistentStore(str(path), flush_interval=3600)
+    start = time.perf_counter()
+    store.get("image_info?0")
+    first = time.perf_counter() - start
+    timings = []
+    for key in random.sample(range(records), min(lookups, records)):
+        start = time.perf_counter()
+        record = store.get(f"image_info?{key}")
+        timings.append(time.perf_counter() - start)
+        assert record is not None and record.value["image_tag"] == str(key)
+    await store.aclose()
+    timings.sort()
+    size_mb = path.stat().st_size / 1024 / 1024
+    print(f"records={records} file={size_mb:.1f}MB first_read(open)={first * 1000:.2f}ms "
+          f"p50={statistics.median(timings) * 1e6:.0f}us p99={timings[int(len(timings) * 0.99)] * 1e6:.0f}us")
+    return timings[int(len(timings) * 0.99)] < 0.001
+
+
+async def compact_check(path: Path) -> bool:
+    # stale 期限都已经过去：一条仍在上游失败兜底期限内，一条没有兜底期限
+    store = PersistentStore(str(path), flush_interval=0)
+    store.put("fallback", serialize({"ok": True}), ttl=0, stale_ttl=0, error_ttl=3600)
+    store.put("expired", serialize({"ok": True}), ttl=0, stale_ttl=0)
+    await store.flush()
+    await asyncio.sleep(0.01)
+    await store.compact()
+    kept = {key: store.get(key) is not None for key in ("fallback", "expired")}
+    await store.aclose()
+
+    # 旧版本的表没有 error_until 列，打开时补上并按 stale_until 填充，之后照常清理
+    legacy = path.with_name("legacy.sqlite3")
+    connection = sqlite3.connect(legacy)
+    connection.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, value BLOB NOT NULL, content_hash TEXT NOT NULL, "
+                       "size INTEGER NOT NULL, fetched_at REAL NOT NULL, changed_at REAL NOT NULL, "
+                       "expires_at REAL NOT NULL, stale_until REAL NOT NULL, accessed_at REAL NOT NULL)")
+    now = time.time()
+    connection.executemany("INSERT INTO responses VALUES (?, ?, '', 2, ?, ?, ?, ?, ?)",
+                           [("old", b"{}", now, now, now, now - 1, now), ("live", b"{}", now, now, now, now + 3600, now)])
+    connection.commit()
+    connection.close()
+    store = PersistentStore(str(legacy), flush_interval=0)
+    await store.compact()
+    migrated = {key: store.get(key) is not None for key in ("old", "live")}
+    await store.aclose()
+
+    ok = kept == {"fallback": True, "expired": False} and migrated == {"old": False, "live": True}
+    print(f"compaction: kept={kept} legacy={migrated} {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def restart_check(path: Path, latency: float) -> bool:
+    route = "/api/dudubird/image_info?image_name=elasticsearch:7.17.10"
+    env_overrides = {"SPIDER_STORE_PATH": str(path), "SPIDER_STORE_FLUSH_INTERVAL": "0.1"}
+    with run_stub(9100, latency, 0.0) as stub_url:
+        env = {**upstream_env(stub_url), **env_overrides}
+        with run_spider("dudubird-spider", 9166, env, quiet=True) as base_url:
+            httpx.get(base_url + route, timeout=30).raise_for_status()
+        httpx.post(f"{stub_url}/__reset")
+        with run_spider("dudubird-spider", 9166, env, quiet=True) as base_url:
+            start = time.perf_counter()
+            response = httpx.get(base_url + route, timeout=30)
+            elapsed = time.perf_counter() - start
+            disk_hits = httpx.get(base_url + "/api/dudubird/cache/stats").json()["disk_hits"]
+        upstream_hits = sum(httpx.get(f"{stub_url}/__stats").json().values())
+    ok = response.status_code == 200 and upstream_hits == 0 and disk_hits == 1
+    print(f"after restart: status={response.status_code} latency={elapsed * 1000:.1f}ms "
+          f"disk_hits={disk_hits} upstream_hits={upstream_hits}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持久化存储检查")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2, help="桩服务延迟（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reads_ok = asyncio.run(measure_reads(Path(tmp) / "reads.sqlite3", args.records, args.lookups))
+        compact_ok = asyncio.run(compact_check(Path(tmp) / "compact.sqlite3"))
+        restart_ok = restart_check(Path(tmp) / "restart.sqlite3", args.latency)
+    sys.exit(0 if reads_ok and compact_ok and restart_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
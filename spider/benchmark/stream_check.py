@@ -0,0 +1,80 @@
+"""
+标签流式接口检查：确认标签按顺序完整输出、预取窗口能缩短总耗时，
+以及指定 match 时提前结束、不再请求后续分页
+
+用法:
+    python stream_check.py --page-size 25
+"""
+import argparse
+import json
+import sys
+import time
+
+import httpx
+
+from harness import run_spider, run_stub, upstream_env
+from stub_server import TAGS_COUNT
+
+ROUTE = "/api/xuanyuan/image_tags/stream"
+
+
+def read_stream(client: httpx.Client, params: dict):
+    start = time.perf_counter()
+    first_tag_at = None
+    events = []
+    with client.stream("GET", ROUTE, params=params) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "tag" and first_tag_at is None:
+                first_tag_at = time.perf_counter() - start
+            events.append(event)
+    return events, first_tag_at, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标签流式接口检查")
+    parser.add_argument("--page-size", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务延迟（秒）")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    args = parser.parse_args()
+
+    all_ok = True
+    pages = -(-TAGS_COUNT // args.page_size)
+    base_params = {"image_name": "library/nginx", "page_size": args.page_size}
+    with run_stub(args.stub_port, args.latency, 0.0) as stub_url, \
+            run_spider("xuanyuan-spider", 9188, upstream_env(stub_url), quiet=True) as base_url, \
+            httpx.Client(base_url=base_url, timeout=60) as client:
+        for window in (1, 8):
+            events, first_tag_at, elapsed = read_stream(client, {**base_params, "window": window})
+            names = [event["data"]["name"] for event in events if event["type"] == "tag"]
+            ok = names == [f"v{i}" for i in range(TAGS_COUNT)] and events[-1]["type"] == "done"
+            all_ok &= ok
+            print(f"window={window}: pages={pages} tags={len(names)} first_tag={first_tag_at * 1000:.0f}ms "
+                  f"total={elapsed:.2f}s {'ok' if ok else 'FAILED'}")
+
+        # 匹配到的标签在第 match_page 页，之后最多再多请求一个窗口的分页
+        window = 4
+        match_index = args.page_size * 5 + 3
+        match_page = match_index // args.page_size + 1
+        httpx.post(f"{stub_url}/__reset")
+        events, _, elapsed = read_stream(client, {**base_params, "window": window, "match": f"v{match_index}"})
+        time.sleep(args.latency * 2)
+        # 返回 304 的请求同时计入路径和 not_modified，只按路径统计
+        stats = httpx.get(f"{stub_url}/__stats").json()
+        upstream_pages = sum(count for path, count in stats.items() if path != "not_modified")
+        done = events[-1]
+        ok = (done["type"] == "done" and done["data"]["matched"]
+              and events[-2]["data"]["name"] == f"v{match_index}"
+              and upstream_pages <= match_page + window)
+        all_ok &= ok
+        print(f"match=v{match_index}: pages_read={done['data']['pages']} upstream_pages={upstream_pages} "
+              f"total={elapsed:.2f}s {'ok' if ok else 'FAILED'}")
+
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
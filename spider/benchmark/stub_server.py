@@ -0,0 +1,179 @@
+"""
+本地上游桩服务：用录制的页面模拟上游站点，支持配置延迟和抖动，响应带 ETag / Last-Modified 并支持条件请求
+
+各上游挂载在不同的路径前缀下，爬虫服务通过环境变量指向对应前缀：
+    DUDUBIRD_URL=http://127.0.0.1:9100/dudubird
+    XUANYUAN_DOCKERS_URL=http://127.0.0.1:9100/xuanyuan-dockers
+    XUANYUAN_CLOUD_URL=http://127.0.0.1:9100/xuanyuan-cloud
+
+用法:
+    python stub_server.py --port 9100 --latency 0.05 --jitter 0.02 --tail-ratio 0.05 --tail-latency 1.0
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from email.utils import formatdate
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+DUDUBIRD_PREFIX = "/dudubird"
+XUANYUAN_DOCKERS_PREFIX = "/xuanyuan-dockers"
+XUANYUAN_CLOUD_PREFIX = "/xuanyuan-cloud"
+# 请求路径或参数中带这些标记时模拟上游故障，供批量接口等检查部分失败
+NOT_FOUND_MARKER = "stub-404"
+SLOW_MARKER = "stub-slow"
+SLOW_DELAY = 5.0
+# 模拟的 Docker Hub 仓库标签总数，标签名为 v0 ~ v{TAGS_COUNT - 1}
+TAGS_COUNT = 1000
+
+HTML = "text/html; charset=utf-8"
+JSON = "application/json"
+
+
+def create_app(latency: float = 0.05, jitter: float = 0.0,
+               tail_ratio: float = 0.0, tail_latency: float = 0.0) -> Starlette:
+    # 按路径统计上游命中次数，供合并/缓存类检查使用
+    hits = Counter()
+    # POST /__fail?status=503 后所有上游接口返回该状态码，模拟上游故障；/__reset 恢复。
+    # 指定 count 时只有接下来的 count 个请求失败
+    failure = {}
+
+    async def delay():
+        seconds = latency + random.uniform(-jitter, jitter)
+        # 按比例模拟长尾请求
+        if tail_ratio and random.random() < tail_ratio:
+            seconds = tail_latency
+        await asyncio.sleep(max(0.0, seconds))
+
+    def failure_response():
+        if failure.get("count") is not None:
+            failure["count"] -= 1
+            if failure["count"] <= 0:
+                status = failure["status"]
+                failure.clear()
+                return Response(status_code=status)
+        headers = {"Retry-After": failure["retry_after"]} if failure.get("retry_after") else None
+        return Response(status_code=failure["status"], headers=headers)
+
+    # 所有内容都视为在桩服务启动时最后修改
+    last_modified = formatdate(time.time(), usegmt=True)
+    # 各录制页面的当前内容，POST /__edit 可以修改，模拟上游数据更新
+    contents = {}
+
+    def conditional_response(request, content: bytes, media_type: str) -> Response:
+        # 与 Docker Hub 等上游一样返回 ETag / Last-Modified，If-None-Match 命中时返回 304（计入 not_modified）
+        etag = f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+        if request.headers.get("if-none-match") == etag:
+            hits["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content, media_type=media_type, headers={"ETag": etag, "Last-Modified": last_modified})
+
+    def fixture_route(path: str, fixture: str, media_type: str) -> Route:
+        contents[fixture] = load_fixture(fixture)
+
+        async def endpoint(request):
+            hits[request.url.path] += 1
+            target = f"{request.url.path}?{request.url.query}"
+            await delay()
+            if failure:
+                return failure_response()
+            if NOT_FOUND_MARKER in target:
+                return Response(status_code=404)
+            if SLOW_MARKER in target:
+                await asyncio.sleep(SLOW_DELAY)
+            return conditional_response(request, contents[fixture], media_type)
+
+        return Route(path, endpoint)
+
+    tag_template = json.loads(load_fixture("xuanyuan/tags.json"))["results"][0]
+
+    async def docker_hub_tags(request):
+        # 代理接口把 Docker Hub 的地址放在 url 参数中，按其中的 page / page_size 生成对应分页
+        hits[request.url.path] += 1
+        query = parse_qs(urlparse(request.query_params.get("url", "")).query)
+        page = int(query.get("page", ["1"])[0])
+        page_size = int(query.get("page_size", ["25"])[0])
+        await delay()
+        if failure:
+            return failure_response()
+        start = (page - 1) * page_size
+        results = [{**tag_template, "id": index, "name": f"v{index}"}
+                   for index in range(start, min(start + page_size, TAGS_COUNT))]
+        content = JSONResponse({"count": TAGS_COUNT, "next": None, "previous": None, "results": results}).body
+        return conditional_response(request, content, JSON)
+
+    async def stats(request):
+        return JSONResponse(dict(hits))
+
+    async def reset(request):
+        hits.clear()
+        failure.clear()
+        return JSONResponse({})
+
+    async def fail(request):
+        failure["status"] = int(request.query_params.get("status", 503))
+        failure["retry_after"] = request.query_params.get("retry_after")
+        count = request.query_params.get("count")
+        failure["count"] = int(count) if count else None
+        return JSONResponse(failure)
+
+    async def edit(request):
+        # POST /__edit?fixture=dudubird/image_detail.html&old=...&new=... 替换录制页面中的一段文本
+        fixture = request.query_params["fixture"]
+        old, new = request.query_params["old"].encode(), request.query_params["new"].encode()
+        replaced = contents[fixture].count(old)
+        contents[fixture] = contents[fixture].replace(old, new)
+        return JSONResponse({"replaced": replaced}, status_code=200 if replaced else 404)
+
+    return Starlette(routes=[
+        Mount(DUDUBIRD_PREFIX, routes=[
+            fixture_route("/i/search", "dudubird/search.html", HTML),
+            fixture_route("/image/{image_name:path}", "dudubird/image_detail.html", HTML),
+        ]),
+        Mount(XUANYUAN_DOCKERS_PREFIX, routes=[
+            fixture_route("/search", "xuanyuan/search.html", HTML),
+            fixture_route("/image/{image_name:path}", "xuanyuan/image.html", HTML),
+            Route("/api/tags", docker_hub_tags),
+        ]),
+        Mount(XUANYUAN_CLOUD_PREFIX, routes=[
+            fixture_route("/api/docker/searchv4", "xuanyuan/searchv4.json", JSON),
+            fixture_route("/api/docker/filter", "xuanyuan/filter.json", JSON),
+        ]),
+        Route("/__stats", stats),
+        Route("/__reset", reset, methods=["POST"]),
+        Route("/__fail", fail, methods=["POST"]),
+        Route("/__edit", edit, methods=["POST"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地上游桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.05, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动（秒）")
+    parser.add_argument("--tail-ratio", type=float, default=0.0, help="长尾请求比例")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="长尾请求延迟（秒）")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.jitter, args.tail_ratio, args.tail_latency),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
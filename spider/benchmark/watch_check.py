@@ -0,0 +1,207 @@
+"""
+变化监控检查（dudubird 镜像详情 / xuanyuan 镜像标签）：
+1. 订阅后先收到每个目标的完整状态（snapshot）
+2. 上游没有变化（304）或只有浏览量、拉取时间等字段变化时不推送任何事件
+3. 上游数据更新后只推送变化的部分（change），缓存中的数据同时更新
+4. 带 Last-Event-ID 重连时只补发错过的增量；轮询接口带 since 时没有变化就返回空列表
+5. 对比同一时间段内客户端定期轮询完整数据与订阅变化收到的字节数
+6. 状态哈希与各层字段的顺序无关，上游调整字段顺序不会产生变化事件
+
+用法:
+    python watch_check.py --interval 0.5
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from harness import SPIDER_ROOT, run_spider, run_stub, upstream_env
+
+sys.path.insert(0, str(SPIDER_ROOT / "dudubird-spider"))
+from util.watch import fingerprint  # noqa: E402
+
+SERVICES = {
+    "dudubird-spider": {
+        "port_offset": 0,
+        "prefix": "/api/dudubird/watch",
+        "param": "image_name",
+        "targets": ["library/nginx:latest", "library/redis:7"],
+        "expected_targets": ["library/nginx:latest", "library/redis:7"],
+        "full": ("/api/dudubird/image_info", lambda target: {"image_name": target}),
+        "fixture": "dudubird/image_detail.html",
+        # 只改浏览量：不应推送
+        "noise": ('<span class="badge bg-secondary">2836</span>', '<span class="badge bg-secondary">2837</span>'),
+        # 重新同步：只推送 sync_time
+        "change": ("<td>2024-05-21 17:46</td>", "<td>2025-10-01 09:30</td>"),
+        "expected_delta": {"changed": {"sync_time": "2025-10-01 09:30"}, "removed": []},
+        "updated": "2025-10-01 09:30",
+    },
+    "xuanyuan-spider": {
+        "port_offset": 22,
+        "prefix": "/api/xuanyuan/v2/image_tags/watch",
+        "param": "image",
+        "targets": ["library/elasticsearch:7.17", "elasticsearch:7.17", "bitnami/elasticsearch:7.17"],
+        "expected_targets": ["bitnami/elasticsearch:7.17", "library/elasticsearch:7.17"],
+        "full": ("/api/xuanyuan/v2/image_tags",
+                 lambda target: dict(zip(("namespace", "name", "tag"), target.replace(":", "/").split("/")))),
+        "fixture": "xuanyuan/filter.json",
+        # 只改拉取时间：不应推送
+        "noise": ('last_pulled": "2026-10-01T08:00:00.000000Z"', 'last_pulled": "2026-10-02T08:00:00.000000Z"'),
+        # 标签 7.17.4 被 7.17.5 取代：推送新增和删除的标签
+        "change": ('"name": "7.17.4"', '"name": "7.17.5"'),
+        "expected_delta": lambda delta: list(delta["changed"]) == ["7.17.5"] and delta["removed"] == ["7.17.4"],
+        "updated": "7.17.5",
+    },
+}
+
+
+class EventStream:
+    """在后台读取 SSE 事件"""
+
+    def __init__(self, client: httpx.AsyncClient, url: str, params, headers=None):
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.bytes = 0
+        self._task = asyncio.create_task(self._read(client, url, params, headers or {}))
+
+    async def _read(self, client, url, params, headers):
+        async with client.stream("GET", url, params=params, headers=headers) as response:
+            response.raise_for_status()
+            event = {}
+            async for line in response.aiter_lines():
+                self.bytes += len(line.encode()) + 1
+                if not line:
+                    if event:
+                        await self.events.put({"id": event.get("id"), "type": event.get("event"),
+                                               "data": json.loads(event.get("data", "null"))})
+                    event = {}
+                elif not line.startswith(":"):
+                    name, _, value = line.partition(": ")
+                    event[name] = value
+
+    async def take(self, count: int, timeout: float):
+        """等待 count 个非心跳事件"""
+        events = []
+        deadline = time.monotonic() + timeout
+        while len(events) < count and time.monotonic() < deadline:
+            try:
+                event = await asyncio.wait_for(self.events.get(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            if event["type"] != "ping":
+                events.append(event)
+        return events
+
+    async def aclose(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, httpx.HTTPError):
+            pass
+
+
+async def check_service(service: str, config: dict, stub_url: str, base_url: str, interval: float) -> dict:
+    checks = {}
+    prefix, param = config["prefix"], config["param"]
+    params = [(param, target) for target in config["targets"]]
+    expected = sorted(config["expected_targets"])
+    quiet = interval * 4
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client, \
+            httpx.AsyncClient(base_url=stub_url, timeout=10) as stub:
+        started = time.monotonic()
+        stream = EventStream(client, f"{prefix}/events", params)
+        ready, *snapshots = await stream.take(1 + len(expected), timeout=10)
+        checks["ready"] = ready["type"] == "ready" and ready["data"]["targets"] == expected
+        checks["snapshot"] = (sorted(event["data"]["target"] for event in snapshots) == expected
+                              and all(event["type"] == "snapshot" for event in snapshots))
+        snapshot_id = max((event["id"] for event in snapshots), key=lambda event_id: int(event_id.split("-")[1]))
+
+        # 上游未变化：条件请求 304，不推送
+        idle = await stream.take(1, timeout=quiet)
+        stats = (await client.get(prefix)).json()
+        print(f"{service}: idle events={len(idle)} not_modified={stats['not_modified']}")
+        checks["idle"] = not idle and stats["not_modified"] > 0
+
+        # 只有易变字段变化：重新下载解析，但规范化后的哈希不变，不推送
+        await stub.post("/__edit", params={"fixture": config["fixture"], "old": config["noise"][0],
+                                           "new": config["noise"][1]})
+        noise = await stream.take(1, timeout=quiet)
+        stats = (await client.get(prefix)).json()
+        print(f"{service}: volatile-only events={len(noise)} unchanged={stats['unchanged']}")
+        checks["volatile"] = not noise and stats["unchanged"] > 0
+
+        # 真正的变化：只推送增量
+        await stub.post("/__edit", params={"fixture": config["fixture"], "old": config["change"][0],
+                                           "new": config["change"][1]})
+        changes = await stream.take(len(expected), timeout=interval * 6)
+        expected_delta = config["expected_delta"]
+        delta_ok = [event["type"] == "change" and (
+            expected_delta(event["data"]) if callable(expected_delta)
+            else {key: event["data"][key] for key in ("changed", "removed")} == expected_delta)
+            for event in changes]
+        print(f"{service}: change events={len(changes)} "
+              f"delta={json.dumps(changes[0]['data'], ensure_ascii=False)[:160] if changes else None}")
+        checks["change"] = len(changes) == len(expected) and all(delta_ok)
+        elapsed = time.monotonic() - started
+        watch_bytes = stream.bytes
+        await stream.aclose()
+
+        # 检查结果写回了缓存，普通接口立即返回新数据
+        path, full_params = config["full"]
+        full = await client.get(path, params=full_params(expected[0]))
+        checks["cache_updated"] = config["updated"] in full.text
+        # 同一时间段内每个检查周期轮询一次全部目标时收到的字节数
+        polls = int(elapsed / interval) * len(expected)
+        print(f"{service}: {elapsed:.1f}s, polling full payloads ~{polls} x {len(full.content)}B = "
+              f"{polls * len(full.content)}B, watch stream {watch_bytes}B")
+
+        # 带 Last-Event-ID 重连：只补发错过的增量
+        resumed = EventStream(client, f"{prefix}/events", params, {"Last-Event-ID": snapshot_id})
+        ready, *replayed = await resumed.take(1 + len(expected), timeout=5)
+        await resumed.aclose()
+        checks["resume"] = [event["type"] for event in replayed] == ["change"] * len(expected)
+        # 其他进程（或重启前）的 id 无法补发，退化为完整状态
+        foreign = EventStream(client, f"{prefix}/events", params, {"Last-Event-ID": "00000000-1"})
+        ready, *fallback = await foreign.take(1 + len(expected), timeout=5)
+        await foreign.aclose()
+        checks["resume_fallback"] = [event["type"] for event in fallback] == ["snapshot"] * len(expected)
+
+        # 轮询：since 为最新 id 时没有事件
+        latest = (await client.get(f"{prefix}/changes", params=params)).json()
+        polled = (await client.get(f"{prefix}/changes", params=params + [("since", latest["last_event_id"])])).json()
+        print(f"{service}: poll first={len(latest['events'])} events, since latest={len(polled['events'])} events")
+        checks["poll"] = len(latest["events"]) == len(expected) and polled["events"] == []
+
+        invalid = await client.get(f"{prefix}/events", params=[(param, " ")])
+        checks["invalid"] = invalid.status_code == 400
+    return {f"{service} {name}": ok for name, ok in checks.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="变化监控检查")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=9166)
+    args = parser.parse_args()
+    env = {"SPIDER_PREFETCH": "0", "SPIDER_WATCH_INTERVAL": str(args.interval), "SPIDER_WATCH_KEEPALIVE": "1"}
+    # 嵌套的标签条目字段顺序不同，哈希相同
+    checks = {"fingerprint key order": fingerprint(
+        {"7.17.4": {"digest": "sha256:1", "images": [{"os": "linux", "architecture": "amd64"}]}, "7.17.5": {}}
+    ) == fingerprint(
+        {"7.17.5": {}, "7.17.4": {"images": [{"architecture": "amd64", "os": "linux"}], "digest": "sha256:1"}})}
+    for service, config in SERVICES.items():
+        with run_stub(args.stub_port, 0.05, 0.0) as stub_url, \
+                run_spider(service, args.port + config["port_offset"], {**upstream_env(stub_url), **env},
+                           quiet=True) as base_url:
+            checks.update(asyncio.run(check_service(service, config, stub_url, base_url, args.interval)))
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print("ok" if not failed else f"failed: {failed}")
+    sys.exit(0 if not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
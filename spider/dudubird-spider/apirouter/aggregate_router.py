@@ -0,0 +1,90 @@
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, FastAPI, Query, Request
+from fastapi.responses import StreamingResponse
+
+from apirouter.dudubird_router import search_view
+from model.aggregated_image import AggregatedSearchResponse
+from util.aggregate import (AGGREGATE_DEADLINE, AGGREGATE_MAX_DEADLINE, DOCKER_HUB, FORMATS, SOURCE_DUDUBIRD,
+                            SOURCE_XUANYUAN, collect, from_dudubird, from_xuanyuan, gather_sources, stream_events)
+from util.http_client import get_client, XUANYUAN_SPIDER
+from util.json_response import FastJSONResponse, loads
+from util.request_timing import TimedRoute
+from util.response_cache import CachePolicy, ResponseCache
+from util.search_view import parse_order
+
+aggregate_router = APIRouter(route_class=TimedRoute)
+
+# xuanyuan 服务自身也有缓存，这里再缓存一份，超过截止时间在后台完成的查询下次可以直接命中
+XUANYUAN_SEARCH_CACHE_POLICY = CachePolicy.from_env("aggregate_xuanyuan", ttl=600, stale_ttl=3600)
+# 只取合并需要的字段
+XUANYUAN_SEARCH_FIELDS = "namespace,name,description,star_count,pull_count,is_official,last_updated,logo_url"
+
+
+async def search_dudubird(app: FastAPI, search: str, site: str, platform: str, sort: str):
+    view = await search_view(app, search, site, platform, sort)
+    _, results = view.query(parse_order(None, sort))
+    return [from_dudubird(item) for item in results]
+
+
+async def search_xuanyuan(app: FastAPI, search: str, page_size: int):
+    params = {"image_name": search, "page": 1, "page_size": page_size, "fields": XUANYUAN_SEARCH_FIELDS}
+    key = ResponseCache.make_key("aggregate_xuanyuan", params)
+
+    async def parse(response: httpx.Response):
+        return loads(response.content).get("results") or []
+
+    async def fetch():
+        # xuanyuan 服务返回 ETag，内容未变化（304）时复用上次的结果
+        return await app.state.upstream_validators.get(
+            get_client(app, XUANYUAN_SPIDER), "/api/xuanyuan/v2/search", parse, params)
+
+    cache: ResponseCache = app.state.response_cache
+    results = await cache.get_or_load(key, lambda: app.state.single_flight.do(key, fetch),
+                                      XUANYUAN_SEARCH_CACHE_POLICY)
+    return [from_xuanyuan(item) for item in results]
+
+
+@aggregate_router.get("/search", response_model=AggregatedSearchResponse)
+async def aggregate_search(
+    request: Request,
+    search: str,
+    site: str = "All",
+    platform: str = "All",
+    sort: str = "名称排序",
+    page_size: int = Query(25, ge=1, le=100),
+    deadline: float = Query(AGGREGATE_DEADLINE, gt=0, le=AGGREGATE_MAX_DEADLINE),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|sse)$"),
+):
+    """
+    同时搜索 dudubird 和 xuanyuan，合并去重后返回
+
+    - site / platform / sort: 同 /api/dudubird/search_images；site 不是 All 或 docker.io 时不查询 xuanyuan
+    - page_size: xuanyuan（Docker Hub）搜索结果条数
+    - deadline: 等待各搜索源的截止时间（秒），到时返回已经得到的结果，partial 为 true
+    - stream: ndjson 或 sse 时每个搜索源返回后立即输出 {"type": "source" | "done", "data": ...}，
+      source 事件包含该源的状态和 added / updated / removed 增量
+    - 同一镜像（仓库:标签@架构）只保留一条，sources 记录提供它的搜索源；
+      Docker Hub 仓库信息（描述、星标、下载量）合并到同一仓库的 dudubird 镜像上
+    """
+    app = request.app
+    loaders = {SOURCE_DUDUBIRD: lambda: search_dudubird(app, search, site, platform, sort)}
+    # xuanyuan 只有 Docker Hub 上的镜像
+    if site in ("All", DOCKER_HUB):
+        loaders[SOURCE_XUANYUAN] = lambda: search_xuanyuan(app, search, page_size)
+    sources = gather_sources(loaders, deadline)
+
+    if stream is not None:
+        return StreamingResponse(
+            stream_events(sources, stream),
+            media_type=FORMATS[stream],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    data = await collect(sources)
+    # 合并后的条目已经是 AggregatedImageItem 字段，直接编码
+    response = FastJSONResponse(data)
+    if data["partial"]:
+        # 不完整的结果不让客户端缓存
+        response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from bs4 import BeautifulSoup
-from util.image_info_util import extract_image_info, safe_find
+import math
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from util.image_info_util import extract_image_columns
+from util.compact_images import CompactImages, compact_search_result
+from util.detail_extractor import extract_image_detail
+from util.http_client import get_client, DUDUBIRD
+from util.response_cache import CachePolicy, ResponseCache
+from util.json_response import FastJSONResponse
+from util.stage_timer import stage
+from util.request_timing import TimedRoute
+from util.batch import BATCH_MAX_ITEMS, batch_limits, run_batch
+from util.search_view import (SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, SearchResults, parse_date_bound,
+                              parse_order, parse_size_bound, upstream_sort)
+from util.upstream_governor import UpstreamUnavailable, unavailable_error
+from util.watch import FORMATS, Watcher, WatchLimitExceeded, watch_keys
 from model.image_search_response import ImageSearchResponse
-from model.image_info import ImageInfo
-import json
-import requests
+from model.image_info_batch import ImageInfoBatchRequest
+import httpx
 import logging
 
 logging.basicConfig(
@@ -15,15 +28,138 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-dudubird_router = APIRouter()
+dudubird_router = APIRouter(route_class=TimedRoute)
 
+# 镜像数据一天最多变化几次，过期后先返回旧数据并在后台刷新；
+# 搜索结果在内存中以紧凑存储保存，从持久化存储或其他 worker 读取时同样转换
+SEARCH_CACHE_POLICY = CachePolicy.from_env("search_images", ttl=600, stale_ttl=3600, decode=compact_search_result)
+IMAGE_INFO_CACHE_POLICY = CachePolicy.from_env("image_info", ttl=1800, stale_ttl=6 * 3600)
+# 每次访问都会变化的字段，不参与变化检测
+WATCH_VOLATILE_FIELDS = ("views",)
 
-@dudubird_router.get("/search_images", response_model=ImageSearchResponse)
+
+async def load_search_results(app: FastAPI, params: dict):
+    # 相同参数的并发请求共享同一次上游抓取和解析
+    return await app.state.single_flight.do(
+        ResponseCache.make_key("/i/search", params),
+        lambda: _fetch_search_results(app, params))
+
+
+async def load_image_info(app: FastAPI, image_name: str):
+    url = f"/image/{image_name}"
+    return await app.state.single_flight.do(
+        url, lambda: _fetch_image_info(app, url))
+
+
+async def get_image_info(app: FastAPI, image_name: str):
+    cache: ResponseCache = app.state.response_cache
+    return await cache.get_or_load(
+        ResponseCache.make_key("image_info", {"image_name": image_name}),
+        lambda: load_image_info(app, image_name),
+        IMAGE_INFO_CACHE_POLICY)
+
+
+async def check_image_info(app: FastAPI, image_name: str):
+    """
+    变化监控的检查：不等缓存过期直接向上游确认，结果写回缓存。
+    上游未变化时条件请求返回 304，得到的仍是上次解析出的同一个对象
+    """
+    cache: ResponseCache = app.state.response_cache
+    key = ResponseCache.make_key("image_info", {"image_name": image_name})
+    await cache.refresh(key, lambda: load_image_info(app, image_name), IMAGE_INFO_CACHE_POLICY)
+    image_info = cache.get(key, allow_stale=True, policy=IMAGE_INFO_CACHE_POLICY)
+    return image_info if image_info is not None else await get_image_info(app, image_name)
+
+
+def image_info_state(image_info: Dict[str, Any]) -> Dict[str, Any]:
+    """参与变化检测的镜像详情字段"""
+    return {name: value for name, value in image_info.items() if name not in WATCH_VOLATILE_FIELDS}
+
+
+def create_watcher(app: FastAPI) -> Watcher:
+    return Watcher(lambda image_name: check_image_info(app, image_name), image_info_state)
+
+
+async def search_image_items(app: FastAPI, search: str, site: str, platform: str, sort: str):
+    """搜索结果 {"count", "results"}，来自上游和缓存时 results 为 CompactImages，供搜索接口和聚合搜索共用"""
+    # 开启本地索引且本地结果完整时直接返回，不请求上游
+    index = app.state.image_index
+    if index is not None:
+        with stage("index"):
+            results = index.search(search, site, platform, sort)
+        if results is not None:
+            return {"count": len(results), "results": results}
+
+    params = {"site": site, "platform": platform,
+              "sort": sort, "search": search}
+    cache: ResponseCache = app.state.response_cache
+    return await cache.get_or_load(
+        ResponseCache.make_key("search_images", params),
+        lambda: load_search_results(app, params),
+        SEARCH_CACHE_POLICY)
+
+
+async def search_view(app: FastAPI, search: str, site: str, platform: str, sort: str) -> SearchResults:
+    """全部搜索结果的类型化视图；本地能计算的排序方式共用同一次（按名称排序的）抓取和缓存"""
+    sort = upstream_sort(sort)
+    data = await search_image_items(app, search, site, platform, sort)
+    key = ResponseCache.make_key("search_images", {"site": site, "platform": platform, "sort": sort, "search": search})
+    return app.state.search_views.get(key, data)
+
+
+async def _fetch_search_results(app: FastAPI, params: dict):
+    url = "/i/search"
+    logger.info(f"Fetching URL: {url} {params}")
+
+    async def parse(response: httpx.Response):
+        # 解析在执行池中进行，避免阻塞事件循环
+        columns = await app.state.parse_pool.run(
+            extract_image_columns, response.text)
+        if app.state.image_index is not None:
+            app.state.image_index.ingest(params, columns.rows())
+
+        # 紧凑存储：分类字段字典编码、数值列为 array，输出时才转换为 dict；序列化后仍是 ImageItem 列表
+        results = CompactImages(columns)
+        return {"count": len(results), "results": results}
+
+    def not_modified(_):
+        # 页面未变化时不调用 parse，但本地索引中该查询的结果同样已经确认是最新的
+        if app.state.image_index is not None:
+            app.state.image_index.touch(params)
+
+    # 上游支持条件请求时，页面未变化（304）直接复用上次的解析结果，不重新下载和解析
+    return await app.state.upstream_validators.get(get_client(app, DUDUBIRD), url, parse, params, not_modified)
+
+
+async def _fetch_image_info(app: FastAPI, url: str):
+    logger.info(f"Fetching URL: {url}")
+
+    async def parse(response: httpx.Response):
+        # 详情页解析在执行池中进行，避免阻塞事件循环
+        image_info = await app.state.parse_pool.run(
+            extract_image_detail, response.text)
+        if app.state.image_index is not None:
+            app.state.image_index.update_from_detail(image_info)
+        return image_info
+
+    return await app.state.upstream_validators.get(get_client(app, DUDUBIRD), url, parse)
+
+
+# 不分页时响应中没有 page 等字段，与 FastJSONResponse 直接返回的内容一致
+@dudubird_router.get("/search_images", response_model=ImageSearchResponse, response_model_exclude_none=True)
 async def search_images(
+    request: Request,
     search: str,
     site: str = "All",
     platform: str = "All",
-    sort: str = "名称排序"
+    sort: str = "名称排序",
+    order_by: Optional[str] = Query(None, pattern="^-?(name|size|date)$"),
+    min_size: Optional[str] = None,
+    max_size: Optional[str] = None,
+    synced_after: Optional[str] = None,
+    synced_before: Optional[str] = None,
+    page: Optional[int] = Query(None, ge=1),
+    page_size: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
 ):
     """
     搜索Docker镜像信息
@@ -61,126 +197,50 @@ async def search_images(
     - 浏览量
     - 最近同步
     - 最早同步
+    - order_by: 本地排序，name / size / date，前缀 - 表示降序（如 -size），指定时忽略 sort
+    - min_size / max_size: 镜像大小范围（如 500MB、1.5GB 或字节数），包含边界
+    - synced_after / synced_before: 同步时间范围（如 2025-09-01、2025-09-01 12:00 或 Unix 时间戳），包含边界；
+      synced_before 只有日期时包含当天全天
+    - page / page_size: 分页，不传 page 时返回全部结果
+
+    除浏览量外的排序、筛选和翻页都在缓存的全部结果上进行，不重新请求上游；count 为符合条件的总数
     """
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        bounds = {
+            "min_size": parse_size_bound(min_size),
+            "max_size": parse_size_bound(max_size),
+            "synced_after": parse_date_bound(synced_after),
+            "synced_before": parse_date_bound(synced_before, end_of_day=True),
         }
-        url = f"https://docker.aityp.com/i/search?site={
-            site}&platform={platform}&sort={sort}&search={search}"
-        logger.info(f"Fetching URL: {url}")
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        image_infos = extract_image_info(response.text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return {
-            "count": len(image_infos),
-            "results": image_infos
-        }
-    except requests.RequestException as e:
+    try:
+        view = await search_view(request.app, search, site, platform, sort)
+        with stage("query"):
+            total, results = view.query(parse_order(order_by, sort), page=page, page_size=page_size, **bounds)
+        data = {"count": total, "results": results}
+        if page is not None:
+            data.update(page=page, page_size=page_size, total_pages=math.ceil(total / page_size))
+        # 结果已经是 ImageItem 字段，直接编码，不再按 response_model 重新校验
+        return FastJSONResponse(data)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"请求目标网站失败: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
 
 @dudubird_router.get("/image_info")
-async def image_info(image_name: str):
+async def image_info(request: Request, image_name: str):
     try:
-        # 模拟浏览器访问
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
+        # 解析时已经过 ImageInfo 校验，直接编码返回
+        return FastJSONResponse(await get_image_info(request.app, image_name))
 
-        url = f"https://docker.aityp.com/image/{image_name}"
-        logger.info(f"Fetching URL: {url}")
-
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 改进的表格数据提取方法
-        def get_table_value(label):
-            try:
-                # 查找包含指定文本的td元素
-                for td in soup.find_all('td'):
-                    if td.text.strip() and label in td.text.strip():
-                        next_td = td.find_next_sibling('td')
-                        if next_td:
-                            # 对于有badge的情况
-                            badge = next_td.find('span', class_='badge')
-                            if badge:
-                                return badge.get_text(strip=True)
-                            # 对于链接的情况
-                            link = next_td.find('a')
-                            if link:
-                                return link.get_text(strip=True)
-                            return next_td.get_text(strip=True)
-                return "N/A"
-            except Exception as e:
-                logger.warning(
-                    f"Error extracting table value for {label}: {e}")
-                return "N/A"
-
-        # 提取镜像详情
-        image_details = {"error": "Details not found"}
-        details_code = safe_find(soup, 'find', 'code', id='codeBlock4')
-        if details_code:
-            try:
-                image_details = json.loads(details_code.get_text(strip=True))
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse image details: {e}")
-                image_details = {"error": f"Invalid JSON: {str(e)}"}
-
-        # 提取卡片内容
-        def get_card_content(title):
-            card_header = safe_find(
-                soup, 'find', 'div', class_='card-header', string=title)
-            if card_header:
-                card_body = card_header.find_next('div', class_='card-body')
-                if card_body:
-                    return [badge.get_text(strip=True) for badge in card_body.find_all('span', class_='badge')]
-            return []
-
-        # 构建响应数据
-        info = ImageInfo(
-            source_image=get_table_value("源镜像"),
-            domestic_image=get_table_value("国内镜像"),
-            image_id=get_table_value("镜像ID"),
-            image_tag=get_table_value("镜像TAG"),
-            size=get_table_value("大小"),
-            image_source=get_table_value("镜像源"),
-            project_info=get_table_value("项目信息"),
-            cmd=get_table_value("CMD"),
-            entrypoint=get_table_value("启动入口"),
-            working_dir=get_table_value("工作目录"),
-            os_platform=get_table_value("OS/平台"),
-            views=get_table_value("浏览量"),
-            created_at=get_table_value("镜像创建"),
-            sync_time=get_table_value("同步时间"),
-            updated_at=get_table_value("更新时间"),
-            open_ports=get_card_content("开放端口"),
-            env_vars=get_card_content("环境变量"),
-            image_labels=get_card_content("镜像标签"),
-            docker_pull_cmd=safe_find(soup, 'find', 'code', id='codeBlock1').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlock1') else "N/A",
-            containerd_pull_cmd=safe_find(soup, 'find', 'code', id='codeBlock2').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlock2') else "N/A",
-            shell_replace_cmd=safe_find(soup, 'find', 'code', id='codeBlock3').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlock3') else "N/A",
-            ansible_docker_cmd=safe_find(soup, 'find', 'code', id='codeBlockAnsibleDocker').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlockAnsibleDocker') else "N/A",
-            ansible_containerd_cmd=safe_find(soup, 'find', 'code', id='codeBlockAnsibleContainerd').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlockAnsibleContainerd') else "N/A",
-            build_history=safe_find(soup, 'find', 'code', id='codeBlock6').get_text(
-                strip=True) if safe_find(soup, 'find', 'code', id='codeBlock6') else "N/A",
-            image_details=image_details
-        )
-
-        return info.model_dump()
-
-    except requests.RequestException as e:
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    except httpx.HTTPError as e:
         logger.error(f"Request error: {e}")
         raise HTTPException(
             status_code=500, detail=f"Request failed: {str(e)}")
@@ -188,3 +248,103 @@ async def image_info(image_name: str):
         logger.error(f"Unexpected error: {e}")
         raise HTTPException(
             status_code=500, detail=f"Error processing request: {str(e)}")
+
+
+@dudubird_router.post("/image_info/batch")
+async def image_info_batch(request: Request, body: ImageInfoBatchRequest):
+    """
+    批量获取镜像详情，并发抓取，单项失败不影响其他条目
+
+    返回与 image_names 顺序一致的 results，每项包含 image_name、ok、status、error 和 data
+    """
+    if len(body.image_names) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"最多一次查询 {BATCH_MAX_ITEMS} 个镜像")
+
+    concurrency, timeout = batch_limits(body.concurrency, body.timeout)
+    # 重复的镜像名只抓取一次
+    image_names = list(dict.fromkeys(body.image_names))
+    outcomes = await run_batch(
+        image_names, lambda image_name: get_image_info(request.app, image_name), concurrency, timeout)
+    by_name = dict(zip(image_names, outcomes))
+
+    results = [{"image_name": image_name, **by_name[image_name]} for image_name in body.image_names]
+    succeeded = sum(1 for result in results if result["ok"])
+    return {
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+@dudubird_router.get("/watch/events")
+async def watch_events(
+    request: Request,
+    image_name: List[str] = Query(...),
+    format: str = Query("sse", pattern="^(ndjson|sse)$"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    订阅镜像详情的变化（可传多个 image_name），以 SSE（或 NDJSON）推送
+
+    - 服务端按 SPIDER_WATCH_INTERVAL 定期重新检查，只有内容（不含浏览量）变化时才推送
+    - 事件：ready；snapshot（完整状态，第一次检查完成或无法补发时）；
+      change（增量，changed 为变化字段的新值，removed 为删除的字段）；error（检查失败）；ping（心跳）；
+      reset（客户端读取太慢，需要重连）
+    - 断线重连时带上 Last-Event-ID 请求头，只补发之后的增量
+    """
+    watcher: Watcher = request.app.state.watcher
+    try:
+        subscription = watcher.subscribe(watch_keys(image_name), last_event_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WatchLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return StreamingResponse(
+        watcher.stream(subscription, format),
+        media_type=FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@dudubird_router.get("/watch/changes")
+async def watch_changes(request: Request, image_name: List[str] = Query(...), since: Optional[str] = None):
+    """
+    不保持连接的轮询：登记监控的镜像，返回 since（上次返回的 last_event_id）之后的事件，没有变化时 events 为空。
+    第一次轮询或无法补发时返回完整状态（snapshot）；pending 为还没有完成第一次检查的镜像
+    """
+    try:
+        return request.app.state.watcher.poll(watch_keys(image_name), since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WatchLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+@dudubird_router.get("/watch")
+async def watch_stats(request: Request):
+    """变化监控的检查、变化、推送计数，以及各监控目标的版本、哈希和最近一次检查结果"""
+    return request.app.state.watcher.snapshot(targets=True)
+
+
+@dudubird_router.get("/cache/stats")
+async def cache_stats(request: Request):
+    """缓存命中、未命中、淘汰、请求合并、上游条件请求计数，以及本地索引和热门条目预取的状态"""
+    index = request.app.state.image_index
+    prefetcher = request.app.state.prefetcher
+    cache: ResponseCache = request.app.state.response_cache
+    return {
+        **cache.snapshot(),
+        "single_flight": request.app.state.single_flight.snapshot(),
+        "search_views": request.app.state.search_views.snapshot(),
+        "upstream_validators": request.app.state.upstream_validators.snapshot(),
+        "image_index": index.snapshot() if index is not None else None,
+        "prefetch": prefetcher.snapshot() if prefetcher is not None else None,
+        # 多进程模式下 broker 的全局计数
+        "broker": await cache.shared.broker_stats() if cache.shared is not None else None,
+    }
+
+
+@dudubird_router.get("/upstream/stats")
+async def upstream_stats(request: Request):
+    """各上游站点的熔断状态、并发上限、限流计数、最近的限流决策，以及重试和对冲统计"""
+    return request.app.state.http_clients.snapshot()
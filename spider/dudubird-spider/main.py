@@ -1,7 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from apirouter.dudubird_router import dudubird_router
+from apirouter.dudubird_router import create_watcher, dudubird_router, load_search_results
+from apirouter.aggregate_router import aggregate_router
+from util.http_client import UpstreamClients, UPSTREAMS
+from util.parse_pool import ParsePool
+from util.response_cache import ResponseCache
+from util.cache_broker import BrokerClient
+from util.json_response import FastJSONResponse
+from util.prefetcher import PREFETCH_ENABLED, Prefetcher
+from util.persistent_store import PersistentStore
+from util.image_index import LOCAL_INDEX_ENABLED, ImageIndex, IndexRefresher
+from util.single_flight import SingleFlight
+from util.search_view import SearchViews
+from util.request_timing import ServerTimingMiddleware
+from util.http_cache import HttpCacheMiddleware
+from util.upstream_validators import ValidatorCache
+from util.metrics import metrics_endpoint, register_app_collector, unregister_app_collector
+from util.profiler import ProfilerMiddleware
+from util.health import healthz
 
 
 logging.basicConfig(
@@ -11,8 +29,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 应用级共享的上游连接池，所有路由复用
+    app.state.http_clients = UpstreamClients(UPSTREAMS)
+    # 记录上游的 ETag / Last-Modified，再次抓取时发送条件请求
+    app.state.upstream_validators = ValidatorCache()
+    # 页面解析使用有界执行池
+    app.state.parse_pool = ParsePool()
+    # 响应持久化到本地 SQLite，重启后直接从磁盘命中，避免冷启动时集中请求上游
+    store = PersistentStore.from_env()
+    if store is not None:
+        store.start()
+    # 多进程模式下（设置了 SPIDER_BROKER_SOCKET）与其他 worker 共享缓存
+    app.state.response_cache = ResponseCache(store=store, shared=BrokerClient.from_env())
+    app.state.single_flight = SingleFlight()
+    # 搜索结果的类型化视图，翻页、排序和筛选不重新抓取和解析
+    app.state.search_views = SearchViews()
+    # 统计访问热度，热门条目在缓存过期前后台预取
+    app.state.prefetcher = None
+    if PREFETCH_ENABLED:
+        app.state.prefetcher = Prefetcher(app.state.response_cache)
+        app.state.response_cache.on_access = app.state.prefetcher.record
+        app.state.prefetcher.start()
+    # 可选的本地搜索索引，从持久化存储预热并在后台增量刷新
+    app.state.image_index = None
+    refresher = None
+    if LOCAL_INDEX_ENABLED:
+        app.state.image_index = ImageIndex()
+        refresher = IndexRefresher(app.state.image_index, lambda params: load_search_results(app, params))
+        refresher.start(store)
+    # 镜像详情的变化监控，客户端订阅后定期检查并只推送变化的字段
+    app.state.watcher = create_watcher(app)
+    app.state.watcher.start()
+    metrics_collector = register_app_collector(app)
+    yield
+    unregister_app_collector(metrics_collector)
+    await app.state.watcher.aclose()
+    if app.state.prefetcher is not None:
+        await app.state.prefetcher.aclose()
+    if refresher is not None:
+        await refresher.aclose()
+    await app.state.response_cache.aclose()
+    await app.state.http_clients.aclose()
+    app.state.parse_pool.shutdown()
+
+
+# 未显式返回响应对象的路由也用 orjson 编码
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# GET 响应的 ETag / 304、按缓存剩余有效期设置 Cache-Control，以及 gzip / br 压缩
+app.add_middleware(HttpCacheMiddleware)
 # 允许跨域请求
 app.add_middleware(
     CORSMiddleware,
@@ -20,12 +88,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
+# 各阶段耗时通过 Server-Timing 响应头返回
+app.add_middleware(ServerTimingMiddleware)
+# 设置 SPIDER_PROFILING=1 后可通过 X-Spider-Profile 请求头对单个请求做采样分析
+app.add_middleware(ProfilerMiddleware)
+
+# Prometheus 指标
+app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+# 存活 / 就绪检查
+app.add_api_route("/healthz", healthz, include_in_schema=False)
 
 
 app.include_router(dudubird_router, prefix="/api/dudubird")
+# 同时搜索 dudubird 和 xuanyuan 服务并合并结果
+app.include_router(aggregate_router, prefix="/api/aggregate")
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app="main:app", host="0.0.0.0", port=8166, reload=True)
+    from util import cluster
+    # 默认不启用 reload（开发时设置 SPIDER_RELOAD=1）；
+    # SPIDER_WORKERS > 1 时多个 worker 通过本地 broker 进程共享缓存、合并上游请求
+    cluster.serve("main:app", port=8166, app=app)
@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from model.image_item import ImageItem
+
+
+class AggregatedImageItem(ImageItem):
+    # 去重用的标识：dudubird 条目为 仓库:标签@架构，只来自 xuanyuan 的条目为仓库名
+    id: str
+    # 带镜像源的完整仓库名，如 docker.io/library/nginx
+    repository: str
+    tag: str = ""
+    # 提供该条目的搜索源，按合并顺序
+    sources: List[str]
+    # 以下字段来自 xuanyuan（Docker Hub）搜索结果
+    description: Optional[str] = None
+    star_count: Optional[int] = None
+    pull_count: Optional[int] = None
+    is_official: Optional[bool] = None
+    last_updated: Optional[str] = None
+
+
+class SourceStatus(BaseModel):
+    ok: bool
+    status: int
+    error: Optional[str] = None
+    count: int = 0
+    elapsed_ms: float
+
+
+class AggregatedSearchResponse(BaseModel):
+    count: int
+    # 有搜索源在截止时间前没有返回或失败
+    partial: bool
+    sources: Dict[str, SourceStatus]
+    results: List[AggregatedImageItem]
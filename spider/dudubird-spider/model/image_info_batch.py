@@ -0,0 +1,9 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class ImageInfoBatchRequest(BaseModel):
+    image_names: List[str] = Field(min_length=1)
+    # 不超过服务端配置的并发上限和单项超时
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    timeout: Optional[float] = Field(default=None, gt=0)
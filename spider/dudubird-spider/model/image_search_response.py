@@ -1,8 +1,12 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from model.image_item import ImageItem
 
 
 class ImageSearchResponse(BaseModel):
     count: int
     results: List[ImageItem]
+    # 传入 page 时返回分页信息，count 为符合条件的总数
+    page: Optional[int] = None
+    page_size: Optional[int] = None
+    total_pages: Optional[int] = None
@@ -0,0 +1,249 @@
+import os
+import time
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set, Tuple
+
+from util.batch import run_item
+from util.json_response import dumps
+
+# 聚合搜索默认等待各搜索源的截止时间（秒）和请求可设置的上限，到时返回已经得到的结果
+AGGREGATE_DEADLINE = float(os.getenv("SPIDER_AGGREGATE_DEADLINE", 3.0))
+AGGREGATE_MAX_DEADLINE = float(os.getenv("SPIDER_AGGREGATE_MAX_DEADLINE", 30.0))
+# 单个搜索源的最长加载时间（秒），超过截止时间的加载在后台继续，结果写入缓存供下次使用
+AGGREGATE_SOURCE_TIMEOUT = float(os.getenv("SPIDER_AGGREGATE_SOURCE_TIMEOUT", 20.0))
+
+SOURCE_DUDUBIRD = "dudubird"
+SOURCE_XUANYUAN = "xuanyuan"
+# 合并后的结果按这个顺序排列，同一来源内保持原有顺序
+SOURCES = (SOURCE_DUDUBIRD, SOURCE_XUANYUAN)
+
+DOCKER_HUB = "docker.io"
+DOCKER_HUB_ALIASES = {"docker.io", "index.docker.io", "registry-1.docker.io"}
+# 只来自 Docker Hub 搜索的条目合并到同一仓库的 dudubird 条目时带上的字段
+METADATA_FIELDS = ("description", "star_count", "pull_count", "is_official", "last_updated")
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+# 超过截止时间仍在加载的搜索源，保留引用直到完成
+_background: Set[asyncio.Task] = set()
+
+
+def canonical_repository(registry: str, path: str) -> str:
+    """带镜像源的完整仓库名，Docker Hub 的官方镜像补全 library/ 前缀"""
+    registry = registry.lower() or DOCKER_HUB
+    if registry in DOCKER_HUB_ALIASES:
+        registry = DOCKER_HUB
+        if "/" not in path:
+            path = f"library/{path}"
+    return f"{registry}/{path.lower()}"
+
+
+def split_image_name(image_name: str, registry: str) -> Tuple[str, str]:
+    """dudubird 的镜像名（docker.io 不带镜像源，其他带）拆分为 (完整仓库名, 标签)"""
+    path = image_name
+    prefixes = DOCKER_HUB_ALIASES if registry in DOCKER_HUB_ALIASES else {registry}
+    for prefix in prefixes:
+        if path.startswith(f"{prefix}/"):
+            path = path[len(prefix) + 1:]
+            break
+    name, sep, tag = path.rpartition(":")
+    if not sep or "/" in tag:
+        name, tag = path, ""
+    return canonical_repository(registry, name), tag
+
+
+def from_dudubird(item: Dict[str, Any]) -> Dict[str, Any]:
+    repository, tag = split_image_name(item["image_name"], item.get("source") or DOCKER_HUB)
+    return {
+        **item,
+        "id": f"{repository}:{tag}@{item.get('platform', '')}",
+        "repository": repository,
+        "tag": tag,
+        "sources": [SOURCE_DUDUBIRD],
+    }
+
+
+def from_xuanyuan(item: Dict[str, Any]) -> Dict[str, Any]:
+    namespace = item.get("namespace") or "library"
+    repository = canonical_repository(DOCKER_HUB, f"{namespace}/{item['name']}")
+    return {
+        "icon_path": item.get("logo_url") or "",
+        "image_name": f"{namespace}/{item['name']}",
+        "platform": "",
+        "source": DOCKER_HUB,
+        "size": "",
+        "collection_date": "",
+        "id": repository,
+        "repository": repository,
+        "tag": "",
+        "sources": [SOURCE_XUANYUAN],
+        **{field: item.get(field) for field in METADATA_FIELDS},
+    }
+
+
+class Aggregator:
+    """
+    按搜索源逐个合并结果并去重，每次合并返回本次新增、更新和移除的条目，供流式输出增量：
+
+    - 相同 id 的条目只保留一个，sources 记录所有提供它的搜索源
+    - 只有仓库级信息的条目（来自 Docker Hub 搜索）与同一仓库的具体镜像合并：
+      把描述、星标等字段补充到这些镜像上，不再单独作为一条结果
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._ranks: Dict[str, Tuple[int, int]] = {}
+        # 仓库名 -> 该仓库下具体镜像（带标签）的 id
+        self._tagged: Dict[str, List[str]] = {}
+        # 仓库名 -> 仓库级信息（字段值, 来源）
+        self._metadata: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+
+    def add(self, source: str, items: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        added: Dict[str, Dict[str, Any]] = {}
+        updated: Dict[str, Dict[str, Any]] = {}
+        removed: List[str] = []
+        rank = source_rank(source)
+        for index, item in enumerate(items):
+            item_id, repository = item["id"], item["repository"]
+            existing = self._items.get(item_id)
+            if existing is not None:
+                if self._merge_sources(existing, item["sources"]) and item_id not in added:
+                    updated[item_id] = existing
+                continue
+            if item["tag"]:
+                metadata = self._metadata.get(repository)
+                if metadata is not None:
+                    self._apply(item, *metadata)
+                # 仓库级条目先到时被具体镜像取代，已经输出过的需要通知移除
+                if self._items.pop(repository, None) is not None:
+                    self._ranks.pop(repository, None)
+                    updated.pop(repository, None)
+                    if added.pop(repository, None) is None:
+                        removed.append(repository)
+                self._tagged.setdefault(repository, []).append(item_id)
+            else:
+                fields = {field: item.get(field) for field in METADATA_FIELDS}
+                self._metadata[repository] = (fields, item["sources"])
+                tagged = self._tagged.get(repository)
+                if tagged:
+                    for tagged_id in tagged:
+                        if self._apply(self._items[tagged_id], fields, item["sources"]) and tagged_id not in added:
+                            updated[tagged_id] = self._items[tagged_id]
+                    continue
+            self._items[item_id] = item
+            self._ranks[item_id] = (rank, index)
+            added[item_id] = item
+        return {"added": list(added.values()), "updated": list(updated.values()), "removed": removed}
+
+    def _apply(self, item: Dict[str, Any], fields: Dict[str, Any], sources: List[str]) -> bool:
+        changed = self._merge_sources(item, sources)
+        for field, value in fields.items():
+            if value is not None and item.get(field) != value:
+                item[field] = value
+                changed = True
+        return changed
+
+    @staticmethod
+    def _merge_sources(item: Dict[str, Any], sources: List[str]) -> bool:
+        missing = [source for source in sources if source not in item["sources"]]
+        item["sources"] = item["sources"] + missing
+        return bool(missing)
+
+    def results(self) -> List[Dict[str, Any]]:
+        return [self._items[item_id] for item_id in sorted(self._items, key=self._ranks.__getitem__)]
+
+
+def source_rank(source: str) -> int:
+    return SOURCES.index(source) if source in SOURCES else len(SOURCES)
+
+
+async def _run_source(name: str, load: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    started = time.monotonic()
+    outcome = await run_item(load, AGGREGATE_SOURCE_TIMEOUT, name)
+    outcome["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return outcome
+
+
+async def gather_sources(loaders: Dict[str, Callable[[], Awaitable[Any]]],
+                         deadline: float) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    并发加载各搜索源，按返回的先后产出 (搜索源, 结果)，结果格式与批量接口的单项相同，另有 elapsed_ms。
+
+    所有搜索源共用同一个截止时间，总耗时取决于最慢的搜索源而不是各源之和；
+    到截止时间仍未返回的搜索源产出 504，其加载在后台继续完成并写入缓存
+    """
+    started = time.monotonic()
+    tasks = {asyncio.create_task(_run_source(name, load)): name for name, load in loaders.items()}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            # 同时返回的搜索源按合并顺序产出
+            for task in sorted(done, key=lambda task: source_rank(tasks[task])):
+                yield tasks[task], task.result()
+    finally:
+        for task in pending:
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    for task in pending:
+        yield tasks[task], {"ok": False, "status": 504, "error": f"Deadline of {deadline:g}s exceeded",
+                            "data": None, "elapsed_ms": elapsed_ms}
+
+
+def source_status(outcome: Dict[str, Any], count: int) -> Dict[str, Any]:
+    return {"ok": outcome["ok"], "status": outcome["status"], "error": outcome["error"],
+            "count": count, "elapsed_ms": outcome["elapsed_ms"]}
+
+
+def is_partial(statuses: Dict[str, Dict[str, Any]]) -> bool:
+    return not all(status["ok"] for status in statuses.values())
+
+
+def encode_event(event: str, data: Dict[str, Any], format: str) -> bytes:
+    payload = dumps(data)
+    if format == "sse":
+        return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+    return b'{"type": "' + event.encode() + b'", "data": ' + payload + b"}\n"
+
+
+async def collect(sources: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """等待所有搜索源（或截止时间）后返回合并结果"""
+    aggregator = Aggregator()
+    statuses = {}
+    async for source, outcome in sources:
+        items = outcome["data"] if outcome["ok"] else []
+        aggregator.add(source, items)
+        statuses[source] = source_status(outcome, len(items))
+    results = aggregator.results()
+    return {
+        "count": len(results),
+        "partial": is_partial(statuses),
+        "sources": {source: statuses[source] for source in sorted(statuses, key=source_rank)},
+        "results": results,
+    }
+
+
+async def stream_events(sources: AsyncIterator[Tuple[str, Dict[str, Any]]], format: str) -> AsyncIterator[bytes]:
+    """
+    每个搜索源返回时输出一个 source 事件，包含该源的状态和合并后的增量（added / updated / removed），
+    全部返回或到截止时间后输出汇总（done）
+    """
+    aggregator = Aggregator()
+    statuses = {}
+    try:
+        async for source, outcome in sources:
+            items = outcome["data"] if outcome["ok"] else []
+            statuses[source] = source_status(outcome, len(items))
+            yield encode_event("source", {"source": source, **statuses[source], **aggregator.add(source, items)},
+                               format)
+    finally:
+        await sources.aclose()
+    yield encode_event("done", {"count": len(aggregator.results()), "partial": is_partial(statuses),
+                                "sources": statuses}, format)
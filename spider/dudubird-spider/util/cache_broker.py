@@ -0,0 +1,311 @@
+import os
+import time
+import struct
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from util.json_response import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# 多进程模式下各 worker 共享缓存的 unix socket，由启动器（util.cluster）设置，为空时不使用
+BROKER_SOCKET = os.getenv("SPIDER_BROKER_SOCKET", "")
+BROKER_MAX_BYTES = int(os.getenv("SPIDER_BROKER_MAX_BYTES", 256 * 1024 * 1024))
+# 负责加载的 worker 最长持有租约多久（秒），超时后其他 worker 可以接手
+BROKER_LEASE_TIMEOUT = float(os.getenv("SPIDER_BROKER_LEASE_TIMEOUT", 30))
+# 等待其他 worker 加载结果的最长时间（秒），超时后自己加载
+BROKER_WAIT_TIMEOUT = float(os.getenv("SPIDER_BROKER_WAIT_TIMEOUT", 20))
+# 连不上 broker 后多久再重试（秒），期间只使用本进程的缓存
+BROKER_RETRY_INTERVAL = float(os.getenv("SPIDER_BROKER_RETRY_INTERVAL", 5))
+BROKER_REQUEST_TIMEOUT = 2.0
+
+# 帧格式：头部长度、数据长度（各 4 字节）+ JSON 头部 + 数据（序列化后的缓存值）
+FRAME = struct.Struct("!II")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    header_size, body_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = loads(await reader.readexactly(header_size))
+    body = await reader.readexactly(body_size) if body_size else b""
+    return header, body
+
+
+def write_frame(writer: asyncio.StreamWriter, header: Dict[str, Any], body: bytes = b""):
+    encoded = dumps(header)
+    writer.writelines([FRAME.pack(len(encoded), len(body)), encoded, body])
+
+
+@dataclass
+class SharedEntry:
+    """broker 中的缓存条目，时间均为 Unix 时间戳"""
+    payload: bytes
+    expires_at: float
+    stale_until: float
+
+
+class CacheBroker:
+    """
+    多个 worker 进程共享的缓存和跨进程请求合并，在独立进程中通过 unix socket 提供服务。
+
+    - set：写入按字节数限制的 LRU 缓存，值为序列化后的 JSON
+    - lease：缓存缺失时只有第一个 worker 得到租约去请求上游，其他 worker 等待，
+      持有者写入结果（set）后等待方直接拿到数据；持有者释放租约、断开连接或超时后由其他 worker 接手
+    """
+
+    def __init__(self, max_bytes: int = BROKER_MAX_BYTES, lease_timeout: float = BROKER_LEASE_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.lease_timeout = lease_timeout
+        self._entries: "OrderedDict[str, SharedEntry]" = OrderedDict()
+        self._bytes = 0
+        # 键 -> (持有租约的连接, 租约到期时间)
+        self._leases: Dict[str, Tuple[int, float]] = {}
+        # 键 -> 等待结果的 (连接, 请求 id, 需要比该时间更晚过期的数据)
+        self._waiters: Dict[str, List[Tuple[asyncio.StreamWriter, int, float]]] = {}
+        self.stats = {"hits": 0, "sets": 0, "leases": 0, "waits": 0, "busy": 0, "evictions": 0}
+
+    async def serve(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._handle, path)
+        logger.info(f"Cache broker listening on {path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = id(writer)
+        try:
+            while True:
+                header, body = await read_frame(reader)
+                self._dispatch(connection, writer, header, body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # worker 退出时释放它持有的租约，等待方重新竞争
+            for key, (holder, _) in list(self._leases.items()):
+                if holder == connection:
+                    self._release(key)
+            for key, waiters in list(self._waiters.items()):
+                self._waiters[key] = [waiter for waiter in waiters if waiter[0] is not writer]
+            writer.close()
+
+    def _dispatch(self, connection: int, writer: asyncio.StreamWriter, header: Dict[str, Any], body: bytes):
+        op, key, request_id = header["op"], header.get("key"), header.get("id")
+        now = time.time()
+        if op == "set":
+            self._set(key, SharedEntry(body, header["expires_at"], header["stale_until"]))
+        elif op == "release":
+            holder = self._leases.get(key)
+            if holder is not None and holder[0] == connection:
+                self._release(key)
+        elif op == "lease":
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > max(header["min_expires_at"], now):
+                self.stats["hits"] += 1
+                self._entries.move_to_end(key)
+                self._reply(writer, request_id, "hit", entry)
+                return
+            lease = self._leases.get(key)
+            if lease is None or lease[1] <= now:
+                self.stats["leases"] += 1
+                self._leases[key] = (connection, now + self.lease_timeout)
+                self._reply(writer, request_id, "granted")
+            elif header.get("wait"):
+                self.stats["waits"] += 1
+                self._waiters.setdefault(key, []).append((writer, request_id, header["min_expires_at"]))
+            else:
+                self.stats["busy"] += 1
+                self._reply(writer, request_id, "busy")
+        elif op == "stats":
+            self._reply(writer, request_id, "ok", extra=self.snapshot())
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, request_id: int, status: str,
+               entry: Optional[SharedEntry] = None, extra: Optional[Dict[str, Any]] = None):
+        if writer.is_closing():
+            return
+        header = {"id": request_id, "status": status, **(extra or {})}
+        if entry is None:
+            write_frame(writer, header)
+            return
+        header.update(expires_at=entry.expires_at, stale_until=entry.stale_until)
+        write_frame(writer, header, entry.payload)
+
+    def _set(self, key: str, entry: SharedEntry):
+        self.stats["sets"] += 1
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.payload)
+        if len(entry.payload) <= self.max_bytes:
+            self._entries[key] = entry
+            self._bytes += len(entry.payload)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.payload)
+                self.stats["evictions"] += 1
+        self._leases.pop(key, None)
+        waiters = self._waiters.pop(key, [])
+        for writer, request_id, min_expires_at in waiters:
+            if entry.expires_at > min_expires_at:
+                self._reply(writer, request_id, "hit", entry)
+            else:
+                self._reply(writer, request_id, "retry")
+
+    def _release(self, key: str):
+        self._leases.pop(key, None)
+        for writer, request_id, _ in self._waiters.pop(key, []):
+            self._reply(writer, request_id, "retry")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "leased": len(self._leases),
+            "waiting": sum(len(waiters) for waiters in self._waiters.values()),
+        }
+
+
+class BrokerClient:
+    """
+    worker 进程中的 broker 连接，所有请求复用一条连接、按请求 id 分发响应。
+
+    broker 不可用时各方法返回 unavailable / None，调用方退回到只使用本进程缓存
+    """
+
+    def __init__(self, path: str, wait_timeout: float = BROKER_WAIT_TIMEOUT,
+                 retry_interval: float = BROKER_RETRY_INTERVAL):
+        self.path = path
+        self.wait_timeout = wait_timeout
+        self.retry_interval = retry_interval
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._retry_at = 0.0
+        self._connect_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "leases": 0, "waits": 0, "timeouts": 0, "published": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["BrokerClient"]:
+        return cls(BROKER_SOCKET) if BROKER_SOCKET else None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self) -> bool:
+        if self.connected:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                self.stats["errors"] += 1
+                self._retry_at = time.monotonic() + self.retry_interval
+                logger.warning(f"Cache broker unavailable at {self.path}: {e}")
+                return False
+            self._read_task = asyncio.create_task(self._read_loop(reader))
+            return True
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                header, body = await read_frame(reader)
+                future = self._pending.pop(header["id"], None)
+                if future is not None and not future.done():
+                    future.set_result((header, body))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.warning(f"Cache broker connection closed: {e}")
+        finally:
+            self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("cache broker connection closed"))
+            self._pending.clear()
+
+    async def _request(self, header: Dict[str, Any], timeout: float) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """发送请求并等待响应，连接失败时返回 None，超时抛出 TimeoutError"""
+        if not await self._connect():
+            return None
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        write_frame(self._writer, {**header, "id": request_id})
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except ConnectionError:
+            self.stats["errors"] += 1
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _send(self, header: Dict[str, Any], body: bytes = b""):
+        # 不需要响应的请求（set / release）直接写入连接缓冲区，不等待
+        if self.connected:
+            write_frame(self._writer, header, body)
+
+    async def lease(self, key: str, min_expires_at: float, wait: bool) -> Tuple[str, Optional[SharedEntry]]:
+        """
+        请求加载 key 的租约，返回 (状态, 条目)：
+        hit（其他 worker 已有比 min_expires_at 更晚过期的数据）、granted（由本进程加载）、
+        busy（其他 worker 正在加载，wait=False 时）、retry（等待超时或持有者放弃）、unavailable（broker 不可用）
+        """
+        if wait:
+            self.stats["waits"] += 1
+        try:
+            response = await self._request(
+                {"op": "lease", "key": key, "min_expires_at": min_expires_at, "wait": wait},
+                self.wait_timeout if wait else BROKER_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return "retry", None
+        if response is None:
+            return "unavailable", None
+        header, body = response
+        status = header["status"]
+        if status == "hit":
+            self.stats["hits"] += 1
+            return status, SharedEntry(body, header["expires_at"], header["stale_until"])
+        if status == "granted":
+            self.stats["leases"] += 1
+        return status, None
+
+    def publish(self, key: str, payload: bytes, expires_at: float, stale_until: float):
+        """写入共享缓存，同时结束本进程持有的租约"""
+        if self.connected:
+            self.stats["published"] += 1
+        self._send({"op": "set", "key": key, "expires_at": expires_at, "stale_until": stale_until}, payload)
+
+    def release(self, key: str):
+        self._send({"op": "release", "key": key})
+
+    async def broker_stats(self) -> Optional[Dict[str, Any]]:
+        try:
+            response = await self._request({"op": "stats"}, BROKER_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if response is None:
+            return None
+        header = dict(response[0])
+        for name in ("id", "status"):
+            header.pop(name, None)
+        return header
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "path": self.path, "connected": self.connected}
+
+    async def aclose(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
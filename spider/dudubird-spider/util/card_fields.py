@@ -0,0 +1,96 @@
+import re
+import calendar
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, List, Optional, Tuple
+
+# 搜索结果卡片徽章中识别的镜像源
+REGISTRIES = ('docker.io', 'docker.elastic.co', 'ghcr.io', 'quay.io', 'gcr.io', 'k8s.gcr.io', 'registry.k8s.io')
+
+# 徽章分类，模块加载时编译一次。各分支都从文本开头匹配，按 架构 > 镜像源 > 大小 > 同步时间 的顺序尝试，
+# 与逐个子串判断的优先级一致，一次 match 即可确定类别（lastgroup）
+BADGE_PATTERN = re.compile(
+    r"(?P<platform>.*linux/)"
+    r"|(?P<source>.*(?:" + "|".join(re.escape(registry) for registry in REGISTRIES) + r"))"
+    r"|(?P<size>.*(?:MB|GB))"
+    r"|(?P<date>(?=.*-).*:)",
+    re.DOTALL,
+)
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+SIZE_PATTERN = re.compile(r"([\d.]+)\s*([KMGT]?B)", re.IGNORECASE)
+DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+# 上游页面的同步时间是北京时间
+COLLECTION_UTC_OFFSET = 8 * 3600
+
+
+def classify_badge(text: str) -> Optional[str]:
+    """徽章文本 -> platform / source / size / date，无法识别时为 None"""
+    match = BADGE_PATTERN.match(text)
+    return match.lastgroup if match else None
+
+
+def parse_size(size: str) -> int:
+    """'584.29MB' -> 字节数，无法解析时为 0"""
+    match = SIZE_PATTERN.search(size or "")
+    if not match:
+        return 0
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_date(date: str) -> int:
+    """'2025-09-07 01:05'（或只有日期）-> Unix 时间戳（秒），无法解析时为 0"""
+    match = DATE_PATTERN.search(date or "")
+    if not match:
+        return 0
+    year, month, day, hour, minute, second = (int(value or 0) for value in match.groups())
+    try:
+        return calendar.timegm((year, month, day, hour, minute, second)) - COLLECTION_UTC_OFFSET
+    except ValueError:
+        return 0
+
+
+@dataclass
+class ImageColumns:
+    """
+    搜索结果的列式表示，每个字段一列（下标对应同一条结果）。
+
+    大小和同步时间在解析时就转换为数值列（字节数、Unix 时间戳），服务端排序和筛选时不再逐条解析字符串
+    """
+    FIELDS: ClassVar[Tuple[str, ...]] = ("icon_path", "image_name", "platform", "source", "size", "collection_date")
+
+    icon_path: List[str] = field(default_factory=list)
+    image_name: List[str] = field(default_factory=list)
+    platform: List[str] = field(default_factory=list)
+    source: List[str] = field(default_factory=list)
+    size: List[str] = field(default_factory=list)
+    collection_date: List[str] = field(default_factory=list)
+    size_bytes: List[int] = field(default_factory=list)
+    collected_at: List[int] = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.image_name)
+
+    def append(self, icon_path: str, image_name: str, platform: str, source: str, size: str, collection_date: str):
+        self.icon_path.append(icon_path)
+        self.image_name.append(image_name)
+        self.platform.append(platform)
+        self.source.append(source)
+        self.size.append(size)
+        self.collection_date.append(collection_date)
+        self.size_bytes.append(parse_size(size))
+        self.collected_at.append(parse_date(collection_date))
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, str]]) -> "ImageColumns":
+        columns = cls()
+        for row in rows:
+            columns.append(*(row[name] for name in cls.FIELDS))
+        return columns
+
+    def rows(self) -> List[Dict[str, str]]:
+        """按行输出，字段与 ImageItem 一致"""
+        return [dict(zip(self.FIELDS, values))
+                for values in zip(*(getattr(self, name) for name in self.FIELDS))]
+
+    def numeric(self) -> Dict[str, List[int]]:
+        return {"size_bytes": self.size_bytes, "collected_at": self.collected_at}
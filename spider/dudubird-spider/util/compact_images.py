@@ -0,0 +1,133 @@
+import sys
+from array import array
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+
+from util.card_fields import ImageColumns
+
+
+class Categories:
+    """
+    字典编码的分类列（架构、镜像源、图标地址）：每个不同的值只保存一次并 intern，
+    不同搜索结果之间也共用同一个字符串对象，每行只存 2 字节的编码
+    """
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values: Iterable[str]):
+        self.values: List[str] = []
+        self.codes = array("H")
+        codes: Dict[str, int] = {}
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(sys.intern(value))
+                if code > 0xFFFF and self.codes.typecode == "H":
+                    self.codes = array("I", self.codes)
+            self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+
+class PackedStrings:
+    """
+    取值各不相同的字符串列（镜像名、大小、同步时间）拼接为一个字符串和偏移数组，读取时切片。
+    这些字段基本都是 ASCII，拼接后每个字符只占 1 字节，省去每个字符串对象约 50 字节的开销
+    """
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, values: Iterable[str]):
+        values = list(values)
+        offsets = array("I", [0])
+        total = 0
+        for value in values:
+            total += len(value)
+            offsets.append(total)
+        self.data = "".join(values)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        return (data[start:end] for start, end in zip(offsets, islice(offsets, 1, None)))
+
+
+class CompactImages:
+    """
+    缓存中的搜索结果的紧凑存储，字段与 ImageItem 一致。
+
+    分类字段字典编码，其余字符串打包存储，大小和同步时间的数值列为 array；
+    只有输出（响应、持久化）时才按需要的行转换为 dict，翻页时只转换当前页
+    """
+    __slots__ = ("icon_path", "image_name", "platform", "source", "size", "collection_date",
+                 "size_bytes", "collected_at")
+    FIELDS = ImageColumns.FIELDS
+
+    def __init__(self, columns: ImageColumns):
+        self.icon_path = Categories(columns.icon_path)
+        self.image_name = PackedStrings(columns.image_name)
+        self.platform = Categories(columns.platform)
+        self.source = Categories(columns.source)
+        self.size = PackedStrings(columns.size)
+        self.collection_date = PackedStrings(columns.collection_date)
+        self.size_bytes = array("q", columns.size_bytes)
+        self.collected_at = array("q", columns.collected_at)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, str]]) -> "CompactImages":
+        return cls(ImageColumns.from_rows(rows))
+
+    def __len__(self):
+        return len(self.size_bytes)
+
+    def row(self, index: int) -> Dict[str, str]:
+        return {
+            "icon_path": self.icon_path[index],
+            "image_name": self.image_name[index],
+            "platform": self.platform[index],
+            "source": self.source[index],
+            "size": self.size[index],
+            "collection_date": self.collection_date[index],
+        }
+
+    def rows(self, indexes: Optional[Iterable[int]] = None) -> List[Dict[str, str]]:
+        """按下标顺序转换为 dict 列表，不传时为全部结果"""
+        if indexes is None or indexes == range(len(self)):
+            # 全部结果按列整体展开，比逐行取值快
+            return [{"icon_path": icon_path, "image_name": image_name, "platform": platform, "source": source,
+                     "size": size, "collection_date": collection_date}
+                    for icon_path, image_name, platform, source, size, collection_date
+                    in zip(*(getattr(self, name) for name in self.FIELDS))]
+        return [self.row(index) for index in indexes]
+
+    def names(self) -> List[str]:
+        return list(self.image_name)
+
+    def numeric(self) -> Dict[str, array]:
+        return {"size_bytes": self.size_bytes, "collected_at": self.collected_at}
+
+    def to_json(self) -> List[Dict[str, str]]:
+        return self.rows()
+
+
+def compact_search_result(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    搜索结果 {"count", "results"} 中的 results 转换为紧凑存储。
+    用于从持久化存储或其他 worker 读取的 JSON，已经是紧凑存储时原样返回
+    """
+    results = data.get("results")
+    if isinstance(results, CompactImages) or not isinstance(results, list):
+        return data
+    return {"count": data.get("count", len(results)), "results": CompactImages.from_rows(results)}
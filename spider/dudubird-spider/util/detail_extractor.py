@@ -0,0 +1,140 @@
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+from model.image_info import ImageInfo
+from util.html_parser import make_soup
+from util.stage_timer import stage
+
+logger = logging.getLogger(__name__)
+
+# ImageInfo 字段 -> 详情页表格中的标签
+TABLE_FIELDS = {
+    "source_image": "源镜像",
+    "domestic_image": "国内镜像",
+    "image_id": "镜像ID",
+    "image_tag": "镜像TAG",
+    "size": "大小",
+    "image_source": "镜像源",
+    "project_info": "项目信息",
+    "cmd": "CMD",
+    "entrypoint": "启动入口",
+    "working_dir": "工作目录",
+    "os_platform": "OS/平台",
+    "views": "浏览量",
+    "created_at": "镜像创建",
+    "sync_time": "同步时间",
+    "updated_at": "更新时间",
+}
+
+# ImageInfo 字段 -> 卡片标题
+CARD_FIELDS = {
+    "open_ports": "开放端口",
+    "env_vars": "环境变量",
+    "image_labels": "镜像标签",
+}
+
+# ImageInfo 字段 -> 代码块 id
+CODE_FIELDS = {
+    "docker_pull_cmd": "codeBlock1",
+    "containerd_pull_cmd": "codeBlock2",
+    "shell_replace_cmd": "codeBlock3",
+    "ansible_docker_cmd": "codeBlockAnsibleDocker",
+    "ansible_containerd_cmd": "codeBlockAnsibleContainerd",
+    "build_history": "codeBlock6",
+}
+DETAILS_CODE_ID = "codeBlock4"
+
+
+class DetailPageIndex:
+    """
+    对详情页只遍历一次，建立表格行、代码块和卡片标题的索引。
+
+    各查询的语义与逐字段 find 的旧实现一致：
+    - 表格取文档顺序中第一个文本包含标签、且有相邻 td 的单元格
+    - 代码块取第一个对应 id 的 code
+    - 卡片取第一个 string 等于标题的 card-header 之后的第一个 card-body
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self._rows: List[Tuple[str, Tag]] = []
+        self._codes: Dict[str, Tag] = {}
+        self._card_bodies: Dict[str, Optional[Tag]] = {}
+
+        pending_headers = []
+        for node in soup.find_all(['td', 'code', 'div']):
+            if node.name == 'td':
+                text = node.text.strip()
+                if text:
+                    next_td = node.find_next_sibling('td')
+                    if next_td:
+                        self._rows.append((text, next_td))
+            elif node.name == 'code':
+                code_id = node.get('id')
+                if code_id and code_id not in self._codes:
+                    self._codes[code_id] = node
+            else:
+                classes = node.get('class') or []
+                if 'card-body' in classes and pending_headers:
+                    for title in pending_headers:
+                        self._card_bodies[title] = node
+                    pending_headers = []
+                if 'card-header' in classes:
+                    title = node.string
+                    if title is not None and title not in self._card_bodies:
+                        self._card_bodies[title] = None
+                        pending_headers.append(title)
+
+    def table_value(self, label: str) -> str:
+        for text, next_td in self._rows:
+            if label in text:
+                # 对于有badge的情况
+                badge = next_td.find('span', class_='badge')
+                if badge:
+                    return badge.get_text(strip=True)
+                # 对于链接的情况
+                link = next_td.find('a')
+                if link:
+                    return link.get_text(strip=True)
+                return next_td.get_text(strip=True)
+        return "N/A"
+
+    def code_text(self, code_id: str) -> Optional[str]:
+        code = self._codes.get(code_id)
+        return code.get_text(strip=True) if code else None
+
+    def card_badges(self, title: str) -> List[str]:
+        card_body = self._card_bodies.get(title)
+        if card_body is None:
+            return []
+        return [badge.get_text(strip=True) for badge in card_body.find_all('span', class_='badge')]
+
+
+def parse_image_details(text: Optional[str]) -> Dict:
+    if text is None:
+        return {"error": "Details not found"}
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse image details: {e}")
+        return {"error": f"Invalid JSON: {str(e)}"}
+
+
+def extract_image_detail(html_content):
+    """单次遍历解析镜像详情页，返回 ImageInfo 字典"""
+    return extract_from_soup(make_soup(html_content))
+
+
+def extract_from_soup(soup: BeautifulSoup):
+    index = DetailPageIndex(soup)
+
+    fields = {field: index.table_value(label) for field, label in TABLE_FIELDS.items()}
+    fields.update({field: index.card_badges(title) for field, title in CARD_FIELDS.items()})
+    for field, code_id in CODE_FIELDS.items():
+        text = index.code_text(code_id)
+        fields[field] = text if text is not None else "N/A"
+    fields["image_details"] = parse_image_details(index.code_text(DETAILS_CODE_ID))
+
+    with stage("validate"):
+        return ImageInfo(**fields).model_dump()
@@ -0,0 +1,192 @@
+import os
+import ssl
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI
+from util.metrics import UpstreamTimer
+from util.fetch_policy import FetchPolicy, PolicyTransport
+from util.upstream_governor import GOVERNOR_ENABLED, GovernedTransport, GovernorSettings, HostGovernor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# 上游站点名称 -> 基础地址，可通过环境变量指向本地桩服务
+DUDUBIRD = "docker.aityp.com"
+# 聚合搜索时查询的 xuanyuan 爬虫服务
+XUANYUAN_SPIDER = "xuanyuan-spider"
+
+UPSTREAMS = {
+    DUDUBIRD: os.getenv("DUDUBIRD_URL", "https://docker.aityp.com"),
+    XUANYUAN_SPIDER: os.getenv("XUANYUAN_SPIDER_URL", "http://127.0.0.1:8188"),
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class HttpClientSettings:
+    """连接池与超时配置，均可通过 SPIDER_HTTP_* 环境变量覆盖"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 15.0
+    write_timeout: float = 5.0
+    pool_timeout: float = 5.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "HttpClientSettings":
+        return cls(
+            max_connections=_env_int(
+                "SPIDER_HTTP_MAX_CONNECTIONS", cls.max_connections),
+            max_keepalive_connections=_env_int(
+                "SPIDER_HTTP_MAX_KEEPALIVE", cls.max_keepalive_connections),
+            keepalive_expiry=_env_float(
+                "SPIDER_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            connect_timeout=_env_float(
+                "SPIDER_HTTP_CONNECT_TIMEOUT", cls.connect_timeout),
+            read_timeout=_env_float(
+                "SPIDER_HTTP_READ_TIMEOUT", cls.read_timeout),
+            write_timeout=_env_float(
+                "SPIDER_HTTP_WRITE_TIMEOUT", cls.write_timeout),
+            pool_timeout=_env_float(
+                "SPIDER_HTTP_POOL_TIMEOUT", cls.pool_timeout),
+            http2=_env_bool("SPIDER_HTTP2", cls.http2),
+        )
+
+
+def http2_available() -> bool:
+    """HTTP/2 依赖 h2 包（httpx[http2]），未安装时回退到 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """包装底层传输，记录每次上游请求的耗时、状态码和并发数"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str):
+        self._transport = transport
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with UpstreamTimer(self.upstream) as timer:
+            response = await self._transport.handle_async_request(request)
+            timer.status = str(response.status_code)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def build_transport(name: str, base_url: str, settings: HttpClientSettings,
+                    governor: Optional[HostGovernor] = None,
+                    policy: Optional[FetchPolicy] = None,
+                    ssl_context: Optional[ssl.SSLContext] = None) -> httpx.AsyncBaseTransport:
+    http2 = settings.http2 and base_url.startswith("https") and http2_available()
+    # 指定 transport 后 AsyncClient 的 http2 / limits 参数不再生效，需要传给底层传输
+    transport = httpx.AsyncHTTPTransport(
+        verify=ssl_context if ssl_context is not None else True,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+    )
+    transport = InstrumentedTransport(transport, name)
+    if governor is not None:
+        # 限流和熔断在最外层，被拒绝或排队的时间不计入上游请求耗时
+        transport = GovernedTransport(transport, governor)
+    if policy is not None:
+        # 重试和对冲的每次请求都经过限流和熔断
+        transport = PolicyTransport(transport, name, policy)
+    return transport
+
+
+def build_client(base_url: str, settings: HttpClientSettings,
+                 transport: httpx.AsyncBaseTransport) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=DEFAULT_HEADERS,
+        transport=transport,
+        timeout=httpx.Timeout(
+            connect=settings.connect_timeout,
+            read=settings.read_timeout,
+            write=settings.write_timeout,
+            pool=settings.pool_timeout,
+        ),
+    )
+
+
+class UpstreamClients:
+    """每个上游站点一个应用级共享的 AsyncClient，在 lifespan 中创建和关闭"""
+
+    def __init__(self, upstreams: Dict[str, str], settings: Optional[HttpClientSettings] = None):
+        self.settings = settings or HttpClientSettings.from_env()
+        # 每个上游站点独立的限流、自适应并发和熔断
+        self.governors: Dict[str, HostGovernor] = {
+            name: HostGovernor(name, GovernorSettings.from_env(name))
+            for name in upstreams
+        } if GOVERNOR_ENABLED else {}
+        # 所有上游共用一个 SSL 上下文，CA 证书只加载一次（每次加载约 20ms，影响启动时间）。
+        # https 上游的 http2 设置相同，连接时写入的 ALPN 也相同，可以共用
+        ssl_context = httpx.create_ssl_context()
+        self._transports = {
+            name: build_transport(name, base_url, self.settings,
+                                  self.governors.get(name), FetchPolicy.from_env(name), ssl_context)
+            for name, base_url in upstreams.items()
+        }
+        self._clients = {
+            name: build_client(base_url, self.settings, self._transports[name])
+            for name, base_url in upstreams.items()
+        }
+        logger.info(f"Created HTTP clients for upstreams: {upstreams}")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        return self._clients[name]
+
+    def governor_snapshot(self) -> Dict[str, Any]:
+        return {name: governor.snapshot() for name, governor in self.governors.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各上游的限流 / 熔断状态和重试 / 对冲统计"""
+        snapshot = {}
+        for name, transport in self._transports.items():
+            snapshot[name] = {
+                "governor": self.governors[name].snapshot() if name in self.governors else None,
+                "fetch_policy": transport.snapshot() if isinstance(transport, PolicyTransport) else None,
+            }
+        return snapshot
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+
+
+def get_client(app: FastAPI, name: str) -> httpx.AsyncClient:
+    return app.state.http_clients.get(name)
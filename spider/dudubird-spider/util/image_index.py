@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from util.card_fields import parse_size
+
+logger = logging.getLogger(__name__)
+
+# 本地索引模式（默认关闭）：用抓取过的搜索结果和详情页建立索引，能确定结果完整时直接在本地查询
+LOCAL_INDEX_ENABLED = os.getenv("DUDUBIRD_LOCAL_INDEX", "").lower() in ("1", "true", "yes", "on")
+# 已抓取的查询多久后需要重新抓取（秒），以及超过多久不再用于本地查询
+INDEX_REFRESH_INTERVAL = float(os.getenv("DUDUBIRD_INDEX_REFRESH_INTERVAL", 3600))
+INDEX_MAX_AGE = float(os.getenv("DUDUBIRD_INDEX_MAX_AGE", 6 * 3600))
+# 后台刷新的检查间隔（秒）和每次最多重新抓取的查询数，控制对上游的压力
+INDEX_REFRESH_TICK = float(os.getenv("DUDUBIRD_INDEX_REFRESH_TICK", 60))
+INDEX_REFRESH_BATCH = int(os.getenv("DUDUBIRD_INDEX_REFRESH_BATCH", 2))
+# substring：之前抓取过的关键词是当前关键词的子串即认为本地结果完整（上游按子串匹配并返回全部结果）
+# exact：只有抓取过完全相同的关键词时才在本地查询
+INDEX_COVERAGE = os.getenv("DUDUBIRD_INDEX_COVERAGE", "substring")
+
+ALL = "All"
+NGRAM = 3
+# 一次写入超过这么多条记录时整体重建排序列
+BULK_THRESHOLD = 1024
+# 索引没有变化期间保留的查询结果数，同一查询的翻页和切换排序复用同一份结果
+RESULTS_CACHE_SIZE = 256
+
+# 排序方式 -> (排序列, 是否降序)；浏览量不在搜索结果字段中，仍由上游排序
+SORTS = {
+    "名称排序": ("name", False),
+    "镜像大小": ("size", True),
+    "最近同步": ("date", True),
+    "最早同步": ("date", False),
+}
+
+Query = Tuple[str, str, str]
+EMPTY: Set[int] = frozenset()
+
+
+def ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _discard(postings: Dict[str, Set[int]], key: str, item_id: int):
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(item_id)
+        if not ids:
+            del postings[key]
+
+
+def normalize_query(search: str, site: str = ALL, platform: str = ALL) -> Query:
+    return (search or "").strip().lower(), site or ALL, platform or ALL
+
+
+class ImageIndex:
+    """
+    镜像搜索结果的内存索引。
+
+    - 名称按 3-gram 建倒排索引，查询时取各 gram 倒排表的交集再校验子串；短于 3 个字符的关键词直接扫描
+    - 镜像大小、同步时间、名称各维护一个有序列，增删记录时用二分插入/删除；
+      匹配结果较少时直接排序，较多时按有序列顺序扫描取出
+    - 记录抓取过的查询（关键词、镜像源、架构）及抓取时间，只有能确定本地结果完整时才返回本地结果
+    """
+
+    def __init__(self, coverage: str = INDEX_COVERAGE, max_age: float = INDEX_MAX_AGE):
+        self.coverage = coverage
+        self.max_age = max_age
+        # (image_name, platform) -> 记录编号；删除的记录置为 None，编号不复用
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._items: List[Optional[Dict[str, Any]]] = []
+        self._names: List[str] = []
+        self._sizes: List[int] = []
+        self._grams: Dict[str, Set[int]] = {}
+        # 镜像源、架构 -> 记录编号集合，筛选条件与名称 gram 一起求交集
+        self._by_source: Dict[str, Set[int]] = {}
+        self._by_platform: Dict[str, Set[int]] = {}
+        self._live = 0
+        # 排序列 -> [(排序值, 名称, 记录编号)]，同值按名称排列保证结果稳定
+        self._columns: Dict[str, List[Tuple[Any, str, int]]] = {"name": [], "size": [], "date": []}
+        # 已抓取的查询 -> 抓取时间
+        self._queries: Dict[Query, float] = {}
+        # 记录每次增删改时加一；(查询, 排序) -> 结果，版本变化时清空
+        self.version = 0
+        self._results: "OrderedDict[Tuple[Query, str], List[Dict[str, Any]]]" = OrderedDict()
+        self.stats = {"local_hits": 0, "misses": 0, "ingested_queries": 0, "removed": 0}
+
+    def __len__(self):
+        return self._live
+
+    def _sort_key(self, column: str, item_id: int) -> Tuple[Any, str, int]:
+        name = self._names[item_id]
+        if column == "size":
+            return self._sizes[item_id], name, item_id
+        if column == "date":
+            return self._items[item_id]["collection_date"], name, item_id
+        return name, name, item_id
+
+    def _index_columns(self, item_id: int):
+        for column, entries in self._columns.items():
+            insort(entries, self._sort_key(column, item_id))
+
+    def _unindex_columns(self, item_id: int):
+        for column, entries in self._columns.items():
+            position = bisect_left(entries, self._sort_key(column, item_id))
+            del entries[position]
+
+    def _changed(self):
+        self.version += 1
+        self._results.clear()
+
+    def _upsert(self, item: Dict[str, Any], index_columns: bool = True) -> int:
+        key = (item["image_name"], item["platform"])
+        item_id = self._ids.get(key)
+        if item_id is not None and self._items[item_id] == item:
+            return item_id
+        self._changed()
+        if item_id is None:
+            item_id = len(self._items)
+            self._ids[key] = item_id
+            name = item["image_name"].lower()
+            self._items.append(item)
+            self._names.append(name)
+            self._sizes.append(parse_size(item["size"]))
+            for gram in ngrams(name):
+                self._grams.setdefault(gram, set()).add(item_id)
+            self._by_source.setdefault(item["source"], set()).add(item_id)
+            self._by_platform.setdefault(item["platform"], set()).add(item_id)
+            self._live += 1
+        else:
+            if index_columns:
+                self._unindex_columns(item_id)
+            previous_source = self._items[item_id]["source"]
+            if previous_source != item["source"]:
+                _discard(self._by_source, previous_source, item_id)
+                self._by_source.setdefault(item["source"], set()).add(item_id)
+            self._items[item_id] = item
+            self._sizes[item_id] = parse_size(item["size"])
+        if index_columns:
+            self._index_columns(item_id)
+        return item_id
+
+    def _rebuild_columns(self):
+        live = [item_id for item_id, item in enumerate(self._items) if item is not None]
+        for column in self._columns:
+            self._columns[column] = sorted(self._sort_key(column, item_id) for item_id in live)
+
+    def _remove(self, item_id: int):
+        item = self._items[item_id]
+        if item is None:
+            return
+        self._changed()
+        self._unindex_columns(item_id)
+        del self._ids[(item["image_name"], item["platform"])]
+        for gram in ngrams(self._names[item_id]):
+            _discard(self._grams, gram, item_id)
+        _discard(self._by_source, item["source"], item_id)
+        _discard(self._by_platform, item["platform"], item_id)
+        self._items[item_id] = None
+        self._live -= 1
+        self.stats["removed"] += 1
+
+    def _filtered(self, search: str, site: str, platform: str) -> List[int]:
+        postings = []
+        if len(search) >= NGRAM:
+            postings.extend(self._grams.get(gram, EMPTY) for gram in ngrams(search))
+        if site != ALL:
+            postings.append(self._by_source.get(site, EMPTY))
+        if platform != ALL:
+            postings.append(self._by_platform.get(platform, EMPTY))
+        if postings:
+            # 从最小的集合开始求交集
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        else:
+            candidates = (item_id for item_id, item in enumerate(self._items) if item is not None)
+        # gram 命中不代表连续出现，最后校验子串
+        names = self._names
+        return [item_id for item_id in candidates if search in names[item_id]]
+
+    def _sorted(self, ids: List[int], column: str, descending: bool) -> List[int]:
+        entries = self._columns[column]
+        # 匹配较少时直接排序，否则按有序列顺序扫描，避免 O(k log k) 的排序
+        if len(ids) * 16 < len(entries):
+            keys = sorted((self._sort_key(column, item_id) for item_id in ids), reverse=descending)
+            return [item_id for _, _, item_id in keys]
+        wanted = set(ids)
+        ordered = reversed(entries) if descending else entries
+        return [item_id for _, _, item_id in ordered if item_id in wanted]
+
+    def _fresh(self, query: Query, now: float) -> bool:
+        fetched_at = self._queries.get(query)
+        return fetched_at is not None and now - fetched_at <= self.max_age
+
+    def covers(self, search: str, site: str, platform: str) -> bool:
+        """之前抓取过的某个查询的结果是否包含当前查询的全部结果"""
+        now = time.time()
+        filters = {(site, platform), (ALL, platform), (site, ALL), (ALL, ALL)}
+        keywords = {search}
+        if self.coverage == "substring":
+            keywords.update(search[i:j] for i in range(len(search)) for j in range(i + 1, len(search) + 1))
+        # 已抓取的查询较多时逐个检查当前关键词的子串，较少时逐个检查已抓取的查询
+        if len(keywords) * len(filters) < len(self._queries):
+            return any(self._fresh((keyword, *query_filter), now)
+                       for keyword in keywords for query_filter in filters)
+        return any(keyword in keywords and (query_site, query_platform) in filters and now - fetched_at <= self.max_age
+                   for (keyword, query_site, query_platform), fetched_at in self._queries.items())
+
+    def search(self, search: str, site: str = ALL, platform: str = ALL,
+               sort: str = "名称排序") -> Optional[List[Dict[str, Any]]]:
+        """
+        本地能给出完整结果时返回排好序的结果，否则返回 None，由调用方请求上游。
+        索引没有变化时同一查询返回同一个列表对象，调用方可以据此复用在结果上建立的视图
+        """
+        search, site, platform = normalize_query(search, site, platform)
+        if sort not in SORTS or not self.covers(search, site, platform):
+            self.stats["misses"] += 1
+            return None
+        self.stats["local_hits"] += 1
+        key = ((search, site, platform), sort)
+        results = self._results.get(key)
+        if results is not None:
+            self._results.move_to_end(key)
+            return results
+        column, descending = SORTS[sort]
+        ids = self._sorted(self._filtered(search, site, platform), column, descending)
+        results = self._results[key] = [self._items[i] for i in ids]
+        while len(self._results) > RESULTS_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return results
+
+    def ingest(self, params: Dict[str, str], items: List[Dict[str, Any]], fetched_at: Optional[float] = None):
+        """
+        写入一次上游搜索的结果。上游返回的是该查询的全部结果，
+        索引中匹配该查询但这次没有返回的记录视为已下架并删除
+        """
+        query = normalize_query(params.get("search", ""), params.get("site", ALL), params.get("platform", ALL))
+        # 批量写入较多记录时整体重建排序列，比逐条二分插入快
+        bulk = len(items) > max(BULK_THRESHOLD, self._live // 8)
+        seen = {self._upsert(item, index_columns=not bulk) for item in items}
+        if bulk:
+            self._rebuild_columns()
+        if query[0]:
+            for item_id in self._filtered(*query):
+                if item_id not in seen:
+                    self._remove(item_id)
+        self.touch(params, fetched_at)
+        self.stats["ingested_queries"] += 1
+
+    def touch(self, params: Dict[str, str], fetched_at: Optional[float] = None):
+        """记录查询的抓取时间；上游确认结果没有变化（304）时只调用这里，不重新写入"""
+        query = normalize_query(params.get("search", ""), params.get("site", ALL), params.get("platform", ALL))
+        fetched_at = fetched_at or time.time()
+        if fetched_at > self._queries.get(query, 0):
+            self._queries[query] = fetched_at
+
+    def update_from_detail(self, info: Dict[str, Any]):
+        """详情页中的大小和同步时间更新已有记录"""
+        item_id = self._ids.get((info.get("source_image"), info.get("os_platform")))
+        if item_id is None:
+            return
+        item = self._items[item_id]
+        updated = {
+            **item,
+            "size": info["size"] if info.get("size", "N/A") != "N/A" else item["size"],
+            "collection_date": info["sync_time"] if info.get("sync_time", "N/A") != "N/A" else item["collection_date"],
+        }
+        if updated != item:
+            self._upsert(updated)
+
+    def stale_queries(self, refresh_interval: float, limit: int) -> List[Query]:
+        """最久没有刷新、且超过刷新间隔的查询"""
+        now = time.time()
+        stale = [(fetched_at, query) for query, fetched_at in self._queries.items()
+                 if now - fetched_at > refresh_interval]
+        stale.sort()
+        return [query for _, query in stale[:limit]]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "items": self._live,
+            "queries": len(self._queries),
+            "version": self.version,
+            # 最久没有刷新的查询距上次抓取的秒数
+            "oldest_query_age": round(time.time() - min(self._queries.values()), 1) if self._queries else None,
+            "grams": len(self._grams),
+        }
+
+
+def search_params(key: str) -> Optional[Dict[str, str]]:
+    """从 ResponseCache.make_key("search_images", params) 生成的键中还原查询参数"""
+    _, _, encoded = key.partition("?")
+    try:
+        return json.loads(encoded)
+    except json.JSONDecodeError:
+        return None
+
+
+class IndexRefresher:
+    """后台任务：从持久化存储预热索引，之后按间隔重新抓取最久未刷新的查询"""
+
+    def __init__(self, index: ImageIndex, fetch: Callable[[Dict[str, str]], Awaitable[Any]],
+                 refresh_interval: float = INDEX_REFRESH_INTERVAL, tick: float = INDEX_REFRESH_TICK,
+                 batch: int = INDEX_REFRESH_BATCH):
+        self.index = index
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.tick = tick
+        self.batch = batch
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, store=None, key_prefix: str = "search_images?"):
+        self._task = asyncio.create_task(self._run(store, key_prefix))
+
+    async def warm(self, store, key_prefix: str):
+        records = await store.scan_prefix(key_prefix)
+        for key, record in records:
+            params = search_params(key)
+            if params is not None and isinstance(record.value, dict):
+                self.index.ingest(params, record.value.get("results", []), record.fetched_at)
+        logger.info(f"Warmed image index with {len(self.index)} items from {len(records)} stored searches")
+
+    async def _run(self, store, key_prefix: str):
+        if store is not None:
+            try:
+                await self.warm(store, key_prefix)
+            except Exception as e:
+                logger.warning(f"Failed to warm image index: {e}")
+        while True:
+            await asyncio.sleep(self.tick)
+            for search, site, platform in self.index.stale_queries(self.refresh_interval, self.batch):
+                try:
+                    # 抓取结果在解析后写入索引
+                    await self.fetch({"site": site, "platform": platform, "sort": "名称排序", "search": search})
+                except Exception as e:
+                    logger.warning(f"Failed to refresh index query {search!r}: {e}")
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
@@ -1,11 +1,19 @@
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+from util.html_parser import Region, has_classes, make_soup
+from util.card_fields import ImageColumns, classify_badge
+import logging
 
+logger = logging.getLogger(__name__)
 
-def extract_image_info(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
+# 搜索结果只需要卡片区域
+SEARCH_CARDS = Region(strainer=SoupStrainer('div', class_=has_classes('card')), css='div.card')
+
+
+def extract_image_columns(html_content) -> ImageColumns:
+    soup = make_soup(html_content, SEARCH_CARDS)
     image_cards = soup.find_all('div', class_='card')
 
-    image_info_list = []
+    columns = ImageColumns()
 
     for card in image_cards:
         icon = card.find('img', class_='rounded-circle svg-container')
@@ -14,35 +22,23 @@ def extract_image_info(html_content):
         name_tag = card.find('a', target='_blank')
         image_name = name_tag.text if name_tag else None
 
-        badges = card.find_all('span', class_='badge')
-        platform = None
-        source = None
-        size = None
-        date = None
-
-        for badge in badges:
+        # 每个徽章只做一次预编译的正则匹配来确定字段，后出现的同类徽章覆盖前面的
+        fields = {}
+        for badge in card.find_all('span', class_='badge'):
             badge_text = badge.text.strip()
-            if 'linux/' in badge_text:
-                platform = badge_text
-            elif any(x in badge_text for x in ['docker.io', 'docker.elastic.co', 'ghcr.io', 'quay.io', 'gcr.io', 'k8s.gcr.io', 'registry.k8s.io']):
-                source = badge_text
-            elif 'MB' in badge_text or 'GB' in badge_text:
-                size = badge_text
-            elif '-' in badge_text and ':' in badge_text:
-                date = badge_text
-
-        if all([icon_path, image_name, platform, source, size, date]):
-            image_info = {
-                'icon_path': 'https://docker.aityp.com/'+icon_path,
-                'image_name': image_name,
-                'platform': platform,
-                'source': source,
-                'size': size,
-                'collection_date': date
-            }
-            image_info_list.append(image_info)
-
-    return image_info_list
+            kind = classify_badge(badge_text)
+            if kind is not None:
+                fields[kind] = badge_text
+
+        if icon_path and image_name and len(fields) == 4:
+            columns.append('https://docker.aityp.com/'+icon_path, image_name,
+                           fields['platform'], fields['source'], fields['size'], fields['date'])
+
+    return columns
+
+
+def extract_image_info(html_content):
+    return extract_image_columns(html_content).rows()
 
 
 def safe_find(soup, method, *args, **kwargs):
@@ -53,3 +49,4 @@ def safe_find(soup, method, *args, **kwargs):
     except Exception as e:
         logger.warning(f"Error finding element: {e}")
         return None
+
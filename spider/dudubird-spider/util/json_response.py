@@ -0,0 +1,95 @@
+import json
+from typing import Any, List, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    # 未安装 orjson 时回退到标准库 json，输出格式相同
+    orjson = None
+
+# orjson 3.9 起支持直接嵌入已编码的 JSON 片段
+_Fragment = getattr(orjson, "Fragment", None)
+
+
+class RawJSON(bytes):
+    """上游返回的原始 JSON 字节，原样缓存、持久化和返回，不解码"""
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, RawJSON):
+        return _Fragment(value) if _Fragment is not None else loads(value)
+    # 紧凑存储的缓存记录等自定义类型，序列化（持久化、响应）时才转换为 JSON 结构
+    to_json = getattr(value, "to_json", None)
+    if to_json is not None:
+        return to_json()
+    return str(value)
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """紧凑的 UTF-8 JSON，无法直接序列化的值按 str() 输出；sort_keys 时各层对象的键都排序"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(value, default=_default, option=option)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default,
+                      sort_keys=sort_keys).encode("utf-8")
+
+
+def loads(payload: bytes) -> Any:
+    if orjson is not None:
+        # orjson 不接受 bytes 的子类，通过 memoryview 传入，不复制
+        return orjson.loads(memoryview(payload) if isinstance(payload, RawJSON) else payload)
+    return json.loads(payload)
+
+
+def is_json_document(payload: bytes) -> bool:
+    """只检查第一个非空白字符，用于在不解码的情况下排除上游返回的 HTML 错误页"""
+    head = payload[:64].lstrip()
+    return head[:1] in (b"{", b"[")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用 orjson 编码的 JSONResponse。
+
+    路由直接返回该响应时 FastAPI 不再做 response_model 校验和 jsonable_encoder 转换
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """直接返回已编码的 JSON 字节"""
+    media_type = "application/json"
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """fields=name,last_updated -> ["name", "last_updated"]"""
+    if not fields:
+        return []
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def project(payload: bytes, fields: List[str]) -> bytes:
+    """只保留 results 中每一项的指定字段（顶层为列表时作用于列表本身），其他顶层字段不变"""
+    data = loads(payload)
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return payload
+    projected = [{field: item[field] for field in fields if field in item} if isinstance(item, dict) else item
+                 for item in items]
+    if isinstance(data, dict):
+        data["results"] = projected
+    else:
+        data = projected
+    return dumps(data)
+
+
+def passthrough_response(payload: bytes, fields: Optional[str] = None) -> Response:
+    """原样返回上游 JSON；指定 fields 时才解码并裁剪字段"""
+    names = parse_fields(fields)
+    if names:
+        payload = project(payload, names)
+    return RawJSONResponse(payload)
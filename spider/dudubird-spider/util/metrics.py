@@ -0,0 +1,167 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+
+# 当前请求匹配到的路由模板，上游请求的指标按它打标签（single_flight 的任务会继承发起方的上下文）
+current_route: ContextVar[str] = ContextVar("current_route", default="")
+
+# 解析类阶段多在毫秒级，上游请求可能到十几秒
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "spider_stage_seconds", "各阶段（fetch / parse / extract / validate / serialize）耗时",
+    ["route", "stage"], buckets=BUCKETS)
+REQUEST_SECONDS = Histogram(
+    "spider_request_seconds", "路由处理总耗时",
+    ["route", "method", "status"], buckets=BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge(
+    "spider_requests_in_flight", "正在处理的请求数", ["route"])
+UPSTREAM_SECONDS = Histogram(
+    "spider_upstream_request_seconds", "上游请求耗时（到收到响应头）",
+    ["route", "upstream"], buckets=BUCKETS)
+UPSTREAM_RESPONSES = Counter(
+    "spider_upstream_responses", "上游响应数，按状态码统计，连接失败等记为 error",
+    ["route", "upstream", "status"])
+UPSTREAM_IN_FLIGHT = Gauge(
+    "spider_upstream_in_flight", "正在进行的上游请求数", ["upstream"])
+FETCH_ATTEMPTS = Counter(
+    "spider_fetch_attempts", "上游请求次数，按首次请求 / 重试 / 对冲统计", ["upstream", "kind"])
+HEDGE_OUTCOMES = Counter(
+    "spider_fetch_hedge_outcomes", "发出对冲请求后先返回的一方", ["upstream", "winner"])
+FETCH_BUDGET_EXHAUSTED = Counter(
+    "spider_fetch_budget_exhausted", "因额外请求预算用尽而放弃的重试 / 对冲次数", ["upstream", "kind"])
+HTTP_CACHE_RESPONSES = Counter(
+    "spider_http_cache_responses", "返回 304、按 gzip / br 压缩、复用已压缩响应体的次数", ["outcome"])
+
+CIRCUIT_STATES = {"closed": 0.0, "half_open": 0.5, "open": 1.0}
+
+
+def observe_request(route: str, method: str, status: int, elapsed: float, stages: Optional[Dict[str, float]]):
+    REQUEST_SECONDS.labels(route, method, str(status)).observe(elapsed)
+    for name, seconds in (stages or {}).items():
+        STAGE_SECONDS.labels(route, name).observe(seconds)
+
+
+class UpstreamTimer:
+    """记录一次上游请求的耗时、状态码和并发数"""
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.status = "error"
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.labels(self.upstream).inc()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        route = current_route.get()
+        UPSTREAM_IN_FLIGHT.labels(self.upstream).dec()
+        UPSTREAM_SECONDS.labels(route, self.upstream).observe(time.perf_counter() - self.start)
+        UPSTREAM_RESPONSES.labels(route, self.upstream, self.status).inc()
+
+
+class AppStateCollector:
+    """抓取时从 app.state 读取缓存和请求合并的统计，不在热路径上额外计数"""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def collect(self):
+        cache = getattr(self.app.state, "response_cache", None)
+        if cache is not None:
+            snapshot = cache.snapshot()
+            lookups = CounterMetricFamily(
+                "spider_cache_lookups", "响应缓存查询次数", labels=["result"])
+            lookups.add_metric(["hit"], snapshot["hits"])
+            lookups.add_metric(["stale_hit"], snapshot["stale_hits"])
+            lookups.add_metric(["miss"], snapshot["misses"])
+            yield lookups
+            yield CounterMetricFamily(
+                "spider_cache_disk_hits", "内存未命中、从持久化存储命中的次数", value=snapshot["disk_hits"])
+            yield CounterMetricFamily("spider_cache_evictions", "响应缓存淘汰次数", value=snapshot["evictions"])
+            refreshes = CounterMetricFamily(
+                "spider_cache_refreshes", "后台刷新次数", labels=["result"])
+            refreshes.add_metric(["ok"], snapshot["refreshes"])
+            refreshes.add_metric(["error"], snapshot["refresh_errors"])
+            yield refreshes
+            yield GaugeMetricFamily("spider_cache_entries", "响应缓存条目数", value=snapshot["entries"])
+            yield GaugeMetricFamily("spider_cache_bytes", "响应缓存占用字节数", value=snapshot["bytes"])
+
+        prefetcher = getattr(self.app.state, "prefetcher", None)
+        if prefetcher is not None:
+            snapshot = prefetcher.snapshot(limit=0)
+            prefetches = CounterMetricFamily("spider_prefetches", "热门条目预取次数", labels=["result"])
+            prefetches.add_metric(["ok"], snapshot["prefetches"])
+            prefetches.add_metric(["error"], snapshot["prefetch_errors"])
+            yield prefetches
+            yield GaugeMetricFamily("spider_prefetch_tracked", "跟踪访问热度的条目数", value=snapshot["tracked"])
+
+        browser_pool = getattr(self.app.state, "browser_pool", None)
+        if browser_pool is not None:
+            snapshot = browser_pool.snapshot()
+            renders = CounterMetricFamily("spider_browser_renders", "浏览器渲染次数", labels=["result"])
+            renders.add_metric(["ok"], snapshot["renders"])
+            renders.add_metric(["error"], snapshot["render_errors"])
+            renders.add_metric(["timeout"], snapshot["render_timeouts"])
+            renders.add_metric(["queue_timeout"], snapshot["queue_timeouts"])
+            yield renders
+            recycled = CounterMetricFamily("spider_browser_recycled", "浏览器会话重建次数", labels=["reason"])
+            for reason in ("pages", "memory", "error", "idle"):
+                recycled.add_metric([reason], snapshot[f"recycled_{reason}"])
+            yield recycled
+            sessions = GaugeMetricFamily("spider_browser_sessions", "浏览器会话数", labels=["state"])
+            sessions.add_metric(["in_use"], snapshot["in_use"])
+            sessions.add_metric(["idle"], snapshot["idle"])
+            yield sessions
+
+        single_flight = getattr(self.app.state, "single_flight", None)
+        if single_flight is not None:
+            snapshot = single_flight.snapshot()
+            calls = CounterMetricFamily(
+                "spider_single_flight_calls", "请求合并调用次数", labels=["role"])
+            calls.add_metric(["leader"], snapshot["leaders"])
+            calls.add_metric(["shared"], snapshot["shared"])
+            yield calls
+            yield GaugeMetricFamily(
+                "spider_single_flight_in_flight", "正在进行的合并请求数", value=snapshot["in_flight"])
+
+        clients = getattr(self.app.state, "http_clients", None)
+        governors = clients.governor_snapshot() if clients is not None else {}
+        if governors:
+            limit = GaugeMetricFamily("spider_governor_limit", "上游自适应并发上限", labels=["upstream"])
+            queued = GaugeMetricFamily("spider_governor_queued", "等待并发名额的请求数", labels=["upstream"])
+            circuit_open = GaugeMetricFamily(
+                "spider_governor_circuit_open", "熔断状态（0 正常，1 熔断，0.5 探测中）", labels=["upstream"])
+            decisions = CounterMetricFamily(
+                "spider_governor_decisions", "限流决策次数", labels=["upstream", "decision"])
+            throttle_wait = CounterMetricFamily(
+                "spider_governor_throttle_wait_seconds", "令牌桶限速累计等待时间", labels=["upstream"])
+            for upstream, governor in governors.items():
+                limit.add_metric([upstream], governor["limit"])
+                queued.add_metric([upstream], governor["queued"])
+                circuit_open.add_metric([upstream], CIRCUIT_STATES[governor["state"]])
+                for decision in ("admitted", "throttled", "shed", "rejected_open"):
+                    decisions.add_metric([upstream, decision], governor[decision])
+                throttle_wait.add_metric([upstream], governor["throttle_wait_seconds"])
+            yield from (limit, queued, circuit_open, decisions, throttle_wait)
+
+
+def register_app_collector(app: FastAPI) -> AppStateCollector:
+    collector = AppStateCollector(app)
+    REGISTRY.register(collector)
+    return collector
+
+
+def unregister_app_collector(collector: AppStateCollector):
+    REGISTRY.unregister(collector)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,48 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from util import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 解析池类型：thread（默认，BeautifulSoup 解析期间会持有 GIL，但不会阻塞事件循环）
+# 或 process（多核并行解析，任务函数和参数必须可 pickle）
+PARSE_POOL_KIND = os.getenv("DUDUBIRD_PARSE_POOL", "thread")
+PARSE_WORKERS = int(os.getenv("DUDUBIRD_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+# 排队中的解析任务上限，超过后新请求在协程中等待，避免无限堆积
+PARSE_MAX_PENDING = int(os.getenv("DUDUBIRD_PARSE_MAX_PENDING", PARSE_WORKERS * 8))
+
+
+class ParsePool:
+    """CPU 密集型的 HTML 解析任务在有界执行池中运行，不占用事件循环"""
+
+    def __init__(self, kind: str = PARSE_POOL_KIND, workers: int = PARSE_WORKERS,
+                 max_pending: int = PARSE_MAX_PENDING):
+        self.kind = kind
+        self.workers = workers
+        self._executor = self._create_executor(kind, workers)
+        self._slots = asyncio.Semaphore(max_pending)
+        logger.info(f"Created {kind} parse pool with {workers} workers")
+
+    @staticmethod
+    def _create_executor(kind: str, workers: int) -> Executor:
+        if kind == "process":
+            return ProcessPoolExecutor(max_workers=workers)
+        if kind == "thread":
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        raise ValueError(f"Unknown parse pool kind: {kind}")
+
+    async def run(self, func, *args, **kwargs):
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            # 执行池中不继承请求上下文，阶段耗时随结果一并带回
+            result, stages = await loop.run_in_executor(
+                self._executor, partial(stage_timer.collect, func, *args, **kwargs))
+        stage_timer.merge(stages)
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
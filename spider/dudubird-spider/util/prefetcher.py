@@ -0,0 +1,206 @@
+import os
+import time
+import random
+import zlib
+import asyncio
+import logging
+from array import array
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from util.response_cache import CachePolicy, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# 设为 0 关闭热门数据预取
+PREFETCH_ENABLED = os.getenv("SPIDER_PREFETCH", "1").lower() not in ("0", "false", "no", "off")
+# 跟踪的热门条目数
+PREFETCH_TOP_K = int(os.getenv("SPIDER_PREFETCH_TOP_K", 64))
+# 访问次数达到该值才预取，避免为偶尔访问一次的条目请求上游
+PREFETCH_MIN_COUNT = int(os.getenv("SPIDER_PREFETCH_MIN_COUNT", 3))
+# 每隔多久检查一次（秒）；缓存剩余有效期少于 lead 秒的热门条目会被预取
+PREFETCH_INTERVAL = float(os.getenv("SPIDER_PREFETCH_INTERVAL", 30))
+PREFETCH_LEAD = float(os.getenv("SPIDER_PREFETCH_LEAD", 120))
+# 两次预取之间的平均间隔（秒），实际间隔在 0.5 ~ 1.5 倍之间随机
+PREFETCH_SPACING = float(os.getenv("SPIDER_PREFETCH_SPACING", 1.0))
+# 每隔多久把访问计数减半（秒），热度只反映最近的访问
+PREFETCH_DECAY_INTERVAL = float(os.getenv("SPIDER_PREFETCH_DECAY_INTERVAL", 3600))
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class CountMinSketch:
+    """
+    固定内存的访问计数，估计值只会偏大不会偏小。
+
+    使用保守更新：只增加各行中等于当前最小值的计数器，减小哈希冲突带来的高估
+    """
+
+    def __init__(self, width: int = 16384, depth: int = 4, seed: Optional[int] = None):
+        self.width = width
+        self.depth = depth
+        self._rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+        # 各行哈希的种子；指定 seed 时可复现（用于检查脚本）
+        rng = random.Random(seed)
+        self._seeds = [rng.getrandbits(32) for _ in range(depth)]
+
+    def _indexes(self, key: str) -> List[int]:
+        # 字符串的 hash() 每个进程不同，先转为 crc32 再与各行的种子混合，相同种子的计数在各进程中一致
+        digest = zlib.crc32(key.encode())
+        return [hash((seed, digest)) % self.width for seed in self._seeds]
+
+    def add(self, key: str) -> int:
+        indexes = self._indexes(key)
+        estimate = min(row[index] for row, index in zip(self._rows, indexes)) + 1
+        for row, index in zip(self._rows, indexes):
+            if row[index] < estimate:
+                row[index] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def decay(self):
+        for row in self._rows:
+            for index, count in enumerate(row):
+                if count:
+                    row[index] = count >> 1
+
+
+class TopK:
+    """按 CountMinSketch 的估计值保留访问最多的 k 个键"""
+
+    def __init__(self, k: int, sketch: Optional[CountMinSketch] = None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch()
+        self._counts: Dict[str, int] = {}
+        # 当前最冷的条目，替换时才重新计算
+        self._coldest: Optional[Tuple[int, str]] = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, key: str) -> Optional[str]:
+        """记录一次访问，有条目被挤出时返回它的键"""
+        count = self.sketch.add(key)
+        if key in self._counts:
+            self._counts[key] = count
+            if self._coldest is not None and self._coldest[1] == key:
+                self._coldest = None
+            return None
+        if len(self._counts) < self.k:
+            self._counts[key] = count
+            self._coldest = None
+            return None
+        if self._coldest is None:
+            self._coldest = min((count, key) for key, count in self._counts.items())
+        coldest_count, coldest = self._coldest
+        if count <= coldest_count:
+            return None
+        del self._counts[coldest]
+        self._counts[key] = count
+        self._coldest = None
+        return coldest
+
+    def decay(self):
+        self.sketch.decay()
+        self._counts = {key: count >> 1 for key, count in self._counts.items()}
+        self._coldest = None
+
+    def items(self) -> List[Tuple[str, int]]:
+        """按访问次数从多到少排列"""
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+
+
+class Prefetcher:
+    """
+    记录缓存条目的访问热度，在热门条目过期前后台重新抓取和解析。
+
+    ResponseCache 每次 get_or_load 时调用 record，记下键、加载函数和缓存策略；
+    后台任务定期找出即将过期的热门条目，按固定间隔（带随机抖动）逐个刷新，不集中请求上游
+    """
+
+    def __init__(self, cache: ResponseCache, top_k: int = PREFETCH_TOP_K,
+                 min_count: int = PREFETCH_MIN_COUNT, interval: float = PREFETCH_INTERVAL,
+                 lead: float = PREFETCH_LEAD, spacing: float = PREFETCH_SPACING,
+                 decay_interval: float = PREFETCH_DECAY_INTERVAL):
+        self.cache = cache
+        self.top = TopK(top_k)
+        self.min_count = min_count
+        self.interval = interval
+        # 至少提前两个检查周期，避免在两次检查之间过期
+        self.lead = max(lead, interval * 2)
+        self.spacing = spacing
+        self.decay_interval = decay_interval
+        # 热门条目 -> 最近一次访问时的加载函数和缓存策略
+        self._jobs: Dict[str, Tuple[Loader, CachePolicy]] = {}
+        self._last_decay = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "rounds": 0, "prefetches": 0, "prefetch_errors": 0, "decays": 0}
+
+    def record(self, key: str, loader: Loader, policy: CachePolicy):
+        self.stats["recorded"] += 1
+        evicted = self.top.add(key)
+        if evicted is not None:
+            self._jobs.pop(evicted, None)
+        if key in self.top:
+            self._jobs[key] = (loader, policy)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def due(self) -> List[str]:
+        """访问次数足够、缓存缺失或即将过期的热门条目，按热度排列"""
+        due = []
+        for key, count in self.top.items():
+            job = self._jobs.get(key)
+            if count < self.min_count or job is None:
+                continue
+            remaining = self.cache.remaining_ttl(key, job[1])
+            if remaining is None or remaining < self.lead:
+                due.append(key)
+        return due
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval * random.uniform(0.8, 1.2))
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"Prefetch round failed: {e}")
+
+    async def run_once(self):
+        if time.monotonic() - self._last_decay >= self.decay_interval:
+            self.top.decay()
+            self._last_decay = time.monotonic()
+            self.stats["decays"] += 1
+        self.stats["rounds"] += 1
+        for index, key in enumerate(self.due()):
+            if index:
+                await asyncio.sleep(self.spacing * random.uniform(0.5, 1.5))
+            job = self._jobs.get(key)
+            if job is None:
+                continue
+            loader, policy = job
+            try:
+                # 多进程模式下其他 worker 已经刷新或正在刷新时不再请求上游
+                if await self.cache.refresh(key, loader, policy):
+                    self.stats["prefetches"] += 1
+            except Exception as e:
+                self.stats["prefetch_errors"] += 1
+                logger.warning(f"Prefetch failed for {key}: {e}")
+
+    def snapshot(self, limit: int = 20) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tracked": len(self.top),
+            "top": [{"key": key, "count": count} for key, count in self.top.items()[:limit]],
+        }
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
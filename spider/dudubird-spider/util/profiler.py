@@ -0,0 +1,58 @@
+import os
+import logging
+
+from starlette.datastructures import Headers
+from starlette.responses import HTMLResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-spider-profile"
+# 采样分析器默认关闭，开启后请求头带 X-Spider-Profile: html|text 时返回该请求的分析结果
+PROFILING_ENABLED = os.getenv("SPIDER_PROFILING", "").lower() in ("1", "true", "yes", "on")
+PROFILE_INTERVAL = float(os.getenv("SPIDER_PROFILE_INTERVAL", "0.001"))
+
+
+class ProfilerMiddleware:
+    """
+    按请求开启 pyinstrument 采样分析。
+
+    分析结果替代原响应返回，原响应体被丢弃；pyinstrument 为可选依赖，未安装时忽略请求头。
+    """
+
+    def __init__(self, app: ASGIApp, enabled: bool = PROFILING_ENABLED, interval: float = PROFILE_INTERVAL):
+        self.app = app
+        self.enabled = enabled
+        self.interval = interval
+        self._profiler_cls = None
+        if enabled:
+            try:
+                from pyinstrument import Profiler
+                self._profiler_cls = Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, per-request profiling is disabled")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self._profiler_cls is None:
+            await self.app(scope, receive, send)
+            return
+        mode = Headers(scope=scope).get(PROFILE_HEADER, "").lower()
+        if mode not in ("html", "text", "1"):
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message: Message):
+            pass
+
+        profiler = self._profiler_cls(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        if mode == "text":
+            response = PlainTextResponse(profiler.output_text(unicode=True, color=False))
+        else:
+            response = HTMLResponse(profiler.output_html())
+        await response(scope, receive, send)
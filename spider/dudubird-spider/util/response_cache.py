@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from util.cache_broker import BrokerClient, SharedEntry
+from util.http_cache import record_freshness
+from util.json_response import RawJSON, dumps, loads
+from util.persistent_store import PersistentStore
+from util.upstream_governor import is_upstream_failure
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = int(os.getenv("SPIDER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 上游不可用时，超过 stale 期限的旧数据还能兜底返回多久（秒）
+CACHE_ERROR_TTL = float(os.getenv("SPIDER_CACHE_ERROR_TTL", 24 * 3600))
+# 多进程模式下等待其他 worker 加载时，最多重新竞争几次租约
+SHARED_LEASE_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    ttl 内直接命中；过期后 stale_ttl 内先返回旧值，同时后台刷新；
+    再之后的 error_ttl 内只在上游失败（熔断、超时、429 / 5xx）时返回旧值。
+
+    raw=True 时缓存值是上游原始 JSON 字节（RawJSON），从持久化存储读取时也不解码；
+    decode 用于把从持久化存储或其他 worker 读取、解码后的 JSON 转换为内存中的表示（如紧凑存储的搜索结果）
+    """
+    ttl: float
+    stale_ttl: float = 0.0
+    error_ttl: float = 0.0
+    raw: bool = False
+    decode: Optional[Callable[[Any], Any]] = None
+
+    @classmethod
+    def from_env(cls, name: str, ttl: float, stale_ttl: float = 0.0,
+                 error_ttl: float = CACHE_ERROR_TTL, raw: bool = False,
+                 decode: Optional[Callable[[Any], Any]] = None) -> "CachePolicy":
+        prefix = f"SPIDER_CACHE_{name.upper()}"
+        return cls(
+            ttl=float(os.getenv(f"{prefix}_TTL", ttl)),
+            stale_ttl=float(os.getenv(f"{prefix}_STALE_TTL", stale_ttl)),
+            error_ttl=float(os.getenv(f"{prefix}_ERROR_TTL", error_ttl)),
+            raw=raw,
+            decode=decode,
+        )
+
+    def load(self, payload: bytes) -> Any:
+        """持久化或其他 worker 发布的字节 -> 缓存中的值"""
+        if self.raw:
+            return RawJSON(payload)
+        value = loads(payload)
+        return self.decode(value) if self.decode is not None else value
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    expires_at: float
+    stale_until: float
+
+
+def serialize(value: Any) -> bytes:
+    if isinstance(value, RawJSON):
+        return value
+    return dumps(value)
+
+
+def estimate_size(value: Any) -> int:
+    """按序列化后的字节数估算条目占用"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(serialize(value))
+
+
+class ResponseCache:
+    """
+    进程内响应缓存：TTL + 按字节数限制的 LRU 淘汰 + stale-while-revalidate。
+
+    配置了 store 时作为二级缓存：写入同时持久化，内存未命中时从磁盘读取，
+    重启后仍在 stale 期限内的数据可以直接返回并在后台刷新。
+
+    多进程模式下配置 shared（本地 broker）：写入同时发布给其他 worker，
+    缓存缺失和后台刷新时同一个键只有一个 worker 请求上游，其他 worker 直接使用它的结果。
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, store: Optional[PersistentStore] = None,
+                 shared: Optional[BrokerClient] = None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.shared = shared
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # 每次 get_or_load 时回调 (key, loader, policy)，用于统计访问热度（见 Prefetcher）
+        self.on_access: Optional[Callable[[str, Callable[[], Awaitable[Any]], CachePolicy], None]] = None
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "disk_hits": 0,
+            "shared_hits": 0,
+            "stale_if_error": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+        }
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+        """按规范化后的查询参数生成缓存键：去除首尾空白、忽略空值、参数排序"""
+        normalized = {}
+        for name, value in params.items():
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == "":
+                continue
+            normalized[name] = value
+        return f"{endpoint}?{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+    def get(self, key: str, allow_stale: bool = False, policy: Optional[CachePolicy] = None) -> Optional[Any]:
+        entry = self._lookup(key, policy=policy)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now < entry.expires_at or (allow_stale and now < entry.stale_until):
+            return entry.value
+        return None
+
+    def set(self, key: str, value: Any, policy: CachePolicy):
+        # 原始 JSON 字节直接持久化和共享，其他 bytes 只缓存在本进程内存中
+        shareable = isinstance(value, RawJSON) or not isinstance(value, (bytes, bytearray))
+        if shareable and (self.store is not None or self.shared is not None):
+            payload = serialize(value)
+            if self.store is not None:
+                self.store.put(key, payload, policy.ttl, policy.stale_ttl, policy.error_ttl)
+            if self.shared is not None:
+                expires_at = time.time() + policy.ttl
+                self.shared.publish(key, payload, expires_at, expires_at + policy.stale_ttl)
+            size = len(payload)
+        else:
+            if self.shared is not None:
+                self.shared.release(key)
+            size = estimate_size(value)
+        now = time.monotonic()
+        self._insert(key, CacheEntry(
+            value=value,
+            size=size,
+            expires_at=now + policy.ttl,
+            stale_until=now + policy.ttl + policy.stale_ttl,
+        ))
+
+    def _insert(self, key: str, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.stats["evictions"] += 1
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _lookup(self, key: str, grace: float = 0.0, policy: Optional[CachePolicy] = None) -> Optional[CacheEntry]:
+        """
+        先查内存，未命中时从持久化存储读取并放回内存（超过 stale 期限 grace 秒以上的不再读取）；
+        按 policy 还原为缓存中的值（raw 时为持久化的原始字节，不解码）
+        """
+        entry = self._entries.get(key)
+        if entry is not None or self.store is None:
+            return entry
+        record = self.store.get(key)
+        if record is None:
+            return None
+        # 持久化的是 Unix 时间，换算成本进程的 monotonic 时间
+        offset = time.monotonic() - time.time()
+        entry = CacheEntry(
+            value=policy.load(record.payload) if policy is not None else record.value,
+            size=record.size,
+            expires_at=record.expires_at + offset,
+            stale_until=record.stale_until + offset,
+        )
+        if entry.stale_until + grace <= time.monotonic():
+            return None
+        self.stats["disk_hits"] += 1
+        self._insert(key, entry)
+        return entry
+
+    def _adopt(self, key: str, shared: SharedEntry, policy: CachePolicy) -> CacheEntry:
+        """放入其他 worker 加载的数据（不再持久化和发布）"""
+        offset = time.monotonic() - time.time()
+        entry = CacheEntry(
+            value=policy.load(shared.payload),
+            size=len(shared.payload),
+            expires_at=shared.expires_at + offset,
+            stale_until=shared.stale_until + offset,
+        )
+        self.stats["shared_hits"] += 1
+        self._insert(key, entry)
+        return entry
+
+    def remaining_ttl(self, key: str, policy: Optional[CachePolicy] = None) -> Optional[float]:
+        """距离过期的秒数（已过期时为负数），没有缓存时返回 None"""
+        entry = self._lookup(key, policy=policy)
+        if entry is None:
+            return None
+        return entry.expires_at - time.monotonic()
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], policy: CachePolicy) -> Any:
+        if self.on_access is not None:
+            self.on_access(key, loader, policy)
+        entry = self._lookup(key, policy.error_ttl, policy)
+        fallback = None
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires_at:
+                self.stats["hits"] += 1
+                self._touch(key)
+                record_freshness(entry.expires_at - now, entry.stale_until - entry.expires_at)
+                return entry.value
+            if now < entry.stale_until:
+                self.stats["stale_hits"] += 1
+                self._touch(key)
+                self._schedule_refresh(key, loader, policy)
+                record_freshness(0, entry.stale_until - now)
+                return entry.value
+            if now < entry.stale_until + policy.error_ttl:
+                fallback = entry
+            else:
+                self._discard(key)
+
+        self.stats["misses"] += 1
+        try:
+            value, shared = await self._load(key, loader, policy)
+        except Exception as e:
+            if fallback is None or not is_upstream_failure(e):
+                raise
+            # 上游不可用时用旧数据兜底
+            self.stats["stale_if_error"] += 1
+            logger.warning(f"Serving stale {key} after upstream failure: {e}")
+            record_freshness(0, 0)
+            return fallback.value
+        if shared is not None:
+            record_freshness(shared.expires_at - time.monotonic(), shared.stale_until - shared.expires_at)
+            return shared.value
+        self.set(key, value, policy)
+        record_freshness(policy.ttl, policy.stale_ttl)
+        return value
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                    policy: CachePolicy) -> Tuple[Any, Optional[CacheEntry]]:
+        """
+        缓存缺失时加载数据，返回 (新加载的值, None) 或 (None, 其他 worker 加载的条目)。
+
+        多进程模式下先向 broker 申请租约：其他 worker 已有数据或正在加载时等待并直接使用其结果
+        """
+        status = None
+        if self.shared is not None:
+            for _ in range(SHARED_LEASE_ATTEMPTS):
+                status, shared = await self.shared.lease(key, time.time(), wait=True)
+                if status == "hit":
+                    return None, self._adopt(key, shared, policy)
+                if status in ("granted", "unavailable"):
+                    break
+        try:
+            return await loader(), None
+        except BaseException:
+            if status == "granted":
+                self.shared.release(key)
+            raise
+
+    async def refresh(self, key: str, loader: Callable[[], Awaitable[Any]], policy: CachePolicy) -> bool:
+        """
+        重新加载并写入缓存，返回是否请求了上游。
+
+        多进程模式下其他 worker 正在刷新时跳过，已经刷新过时直接使用其结果
+        """
+        status = None
+        if self.shared is not None:
+            entry = self._entries.get(key)
+            current = entry.expires_at - time.monotonic() + time.time() if entry is not None else time.time()
+            status, shared = await self.shared.lease(key, current, wait=False)
+            if status == "hit":
+                self._adopt(key, shared, policy)
+                return False
+            if status == "busy":
+                return False
+        try:
+            self.set(key, await loader(), policy)
+        except BaseException:
+            if status == "granted":
+                self.shared.release(key)
+            raise
+        return True
+
+    def _touch(self, key: str):
+        # 超过内存上限的条目只在磁盘中，不在 _entries 里
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+    def _schedule_refresh(self, key: str, loader: Callable[[], Awaitable[Any]], policy: CachePolicy):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                if await self.refresh(key, loader, policy):
+                    self.stats["refreshes"] += 1
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                logger.warning(f"Background refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": (self.stats["hits"] + self.stats["stale_hits"]) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "refreshing": len(self._refreshing),
+            "store": self.store.snapshot() if self.store is not None else None,
+            "shared": self.shared.snapshot() if self.shared is not None else None,
+        }
+
+    async def aclose(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        self._refreshing.clear()
+        if self.shared is not None:
+            await self.shared.aclose()
+        if self.store is not None:
+            await self.store.aclose()
@@ -0,0 +1,155 @@
+import os
+import math
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from util.card_fields import DATE_PATTERN, ImageColumns, parse_date, parse_size
+from util.compact_images import CompactImages
+from util.image_index import SORTS
+
+# 搜索接口分页的默认每页条数和上限
+SEARCH_PAGE_SIZE = int(os.getenv("DUDUBIRD_SEARCH_PAGE_SIZE", 50))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("DUDUBIRD_SEARCH_MAX_PAGE_SIZE", 500))
+# 内存中保留的搜索结果视图数
+SEARCH_VIEWS_MAX = int(os.getenv("DUDUBIRD_SEARCH_VIEWS_MAX", 256))
+
+# 上游按名称排序返回；其他能在本地计算的排序都基于这份结果，切换排序不需要重新抓取
+UPSTREAM_SORT = "名称排序"
+# order_by 参数 -> 排序列，前缀 - 表示降序
+ORDER_COLUMNS = ("name", "size", "date")
+
+
+def upstream_sort(sort: str) -> str:
+    """抓取上游时使用的排序方式：本地能排序的都统一为按名称，只有浏览量等本地没有的字段交给上游"""
+    return UPSTREAM_SORT if sort in SORTS else sort
+
+
+def parse_order(order_by: Optional[str], sort: str) -> Optional[Tuple[str, bool]]:
+    """(排序列, 是否降序)；返回 None 表示保持上游返回的顺序"""
+    if order_by:
+        return order_by.lstrip("-"), order_by.startswith("-")
+    if sort == UPSTREAM_SORT or sort not in SORTS:
+        return None
+    return SORTS[sort]
+
+
+def parse_size_bound(value: Optional[str]) -> Optional[int]:
+    """'500MB' / '1.5GB' / 字节数 -> 字节数"""
+    if value is None or value == "":
+        return None
+    if value.isdigit():
+        return int(value)
+    size = parse_size(value)
+    if not size:
+        raise ValueError(f"无法识别的大小: {value}")
+    return size
+
+
+def parse_date_bound(value: Optional[str], end_of_day: bool = False) -> Optional[int]:
+    """
+    '2025-09-01' / '2025-09-01 12:00'（北京时间）/ Unix 时间戳 -> Unix 时间戳。
+    end_of_day 用于包含边界的上限：只有日期时取当天最后一秒，当天晚些时候同步的镜像也在范围内
+    """
+    if value is None or value == "":
+        return None
+    if value.isdigit():
+        return int(value)
+    timestamp = parse_date(value)
+    if not timestamp:
+        raise ValueError(f"无法识别的时间: {value}")
+    if end_of_day and DATE_PATTERN.search(value).group(4) is None:
+        timestamp += 24 * 3600 - 1
+    return timestamp
+
+
+class SearchResults:
+    """
+    一次搜索的全部结果的类型化表示：大小、同步时间为数值列，名称为小写列，
+    各排序方式的下标顺序第一次使用时计算并保留，之后翻页和切换排序只是对下标切片。
+
+    rows 可以是 dict 列表（本地索引的结果）或紧凑存储的 CompactImages，查询时只转换返回的行
+    """
+
+    def __init__(self, rows: Union[List[Dict[str, Any]], CompactImages]):
+        self.rows = rows
+        if isinstance(rows, CompactImages):
+            columns = rows.numeric()
+        else:
+            # 本地索引的结果没有数值列，在这里解析一次
+            columns = ImageColumns.from_rows(rows).numeric()
+        self._values = {"size": columns["size_bytes"], "date": columns["collected_at"]}
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _names(self) -> List[str]:
+        """小写名称列，只在第一次排序时计算"""
+        names = self._values.get("name")
+        if names is None:
+            rows = self.rows
+            image_names = rows.names() if isinstance(rows, CompactImages) else [row["image_name"] for row in rows]
+            names = self._values["name"] = [name.lower() for name in image_names]
+        return names
+
+    def order(self, column: str, descending: bool) -> List[int]:
+        key = (column, descending)
+        order = self._orders.get(key)
+        if order is None:
+            names = self._names()
+            values = self._values[column]
+            order = sorted(range(len(self.rows)), key=lambda i: (values[i], names[i], i), reverse=descending)
+            self._orders[key] = order
+        return order
+
+    def query(self, order: Optional[Tuple[str, bool]] = None,
+              min_size: Optional[int] = None, max_size: Optional[int] = None,
+              synced_after: Optional[int] = None, synced_before: Optional[int] = None,
+              page: Optional[int] = None, page_size: int = SEARCH_PAGE_SIZE) -> Tuple[int, List[Dict[str, Any]]]:
+        """按条件筛选（边界包含在内）、排序并分页，返回 (符合条件的总数, 当前页结果)；page 为空时返回全部"""
+        ids = self.order(*order) if order is not None else range(len(self.rows))
+        if min_size is not None or max_size is not None or synced_after is not None or synced_before is not None:
+            sizes, dates = self._values["size"], self._values["date"]
+            low_size = -math.inf if min_size is None else min_size
+            high_size = math.inf if max_size is None else max_size
+            low_date = -math.inf if synced_after is None else synced_after
+            high_date = math.inf if synced_before is None else synced_before
+            ids = [i for i in ids if low_size <= sizes[i] <= high_size and low_date <= dates[i] <= high_date]
+        total = len(ids)
+        if page is not None:
+            start = (page - 1) * page_size
+            ids = ids[start:start + page_size]
+        rows = self.rows
+        if isinstance(rows, CompactImages):
+            return total, rows.rows(ids)
+        return total, [rows[i] for i in ids]
+
+
+class SearchViews:
+    """
+    搜索结果视图的 LRU，键为缓存键。结果仍是同一个对象时复用视图（含已计算的排序），
+    结果被刷新（响应缓存重新抓取、本地索引有变化）时重建
+    """
+
+    def __init__(self, max_entries: int = SEARCH_VIEWS_MAX):
+        self.max_entries = max_entries
+        self._views: "OrderedDict[str, SearchResults]" = OrderedDict()
+        self.stats = {"hits": 0, "builds": 0}
+
+    def get(self, key: str, data: Dict[str, Any]) -> SearchResults:
+        # 响应缓存命中时 data 是同一个对象；本地索引每次返回新的 data，但索引没有变化时 results 是同一个列表
+        cached = self._views.get(key)
+        if cached is not None and cached.rows is data["results"]:
+            self.stats["hits"] += 1
+            self._views.move_to_end(key)
+            return cached
+        self.stats["builds"] += 1
+        view = SearchResults(data["results"])
+        self._views[key] = view
+        self._views.move_to_end(key)
+        while len(self._views) > self.max_entries:
+            self._views.popitem(last=False)
+        return view
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._views), "max_entries": self.max_entries}
@@ -0,0 +1,395 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from util.batch import run_item
+from util.json_response import dumps
+
+logger = logging.getLogger(__name__)
+
+# 每个监控目标的检查间隔（秒），实际间隔在 0.9 ~ 1.1 倍之间随机，避免集中请求上游
+WATCH_INTERVAL = float(os.getenv("SPIDER_WATCH_INTERVAL", 300))
+# 同时进行的检查数和单次检查超时（秒）
+WATCH_CONCURRENCY = int(os.getenv("SPIDER_WATCH_CONCURRENCY", 4))
+WATCH_CHECK_TIMEOUT = float(os.getenv("SPIDER_WATCH_CHECK_TIMEOUT", 30))
+# 全局监控目标上限，以及单个订阅最多监控的目标数
+WATCH_MAX_TARGETS = int(os.getenv("SPIDER_WATCH_MAX_TARGETS", 1000))
+WATCH_MAX_SUBSCRIPTION_TARGETS = int(os.getenv("SPIDER_WATCH_MAX_SUBSCRIPTION_TARGETS", 100))
+# 每个目标保留的增量条数，断线重连（Last-Event-ID）时从这里补发
+WATCH_HISTORY = int(os.getenv("SPIDER_WATCH_HISTORY", 32))
+# 没有订阅、也没有轮询之后目标继续保留多久（秒）
+WATCH_IDLE_TTL = float(os.getenv("SPIDER_WATCH_IDLE_TTL", 600))
+# 每个订阅未发送事件的队列长度，积压超过时断开，客户端重连后补发
+WATCH_QUEUE_SIZE = int(os.getenv("SPIDER_WATCH_QUEUE_SIZE", 256))
+# 没有事件时的心跳间隔（秒），防止代理断开空闲连接
+WATCH_KEEPALIVE = float(os.getenv("SPIDER_WATCH_KEEPALIVE", 15))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+Event = Tuple[str, Optional[str], Dict[str, Any]]
+
+
+class WatchLimitExceeded(Exception):
+    """监控目标数超过上限"""
+
+
+def watch_keys(values: List[str]) -> List[str]:
+    """去除空白和重复的目标，数量为 0 或超过单个订阅的上限时抛出 ValueError"""
+    keys = list(dict.fromkeys(value.strip() for value in values if value and value.strip()))
+    if not keys:
+        raise ValueError("至少需要一个监控目标")
+    if len(keys) > WATCH_MAX_SUBSCRIPTION_TARGETS:
+        raise ValueError(f"最多同时监控 {WATCH_MAX_SUBSCRIPTION_TARGETS} 个目标")
+    return keys
+
+
+def fingerprint(state: Dict[str, Any]) -> str:
+    """规范化状态的哈希，各层对象的键都排序后编码，与字段顺序无关"""
+    return hashlib.blake2b(dumps(state, sort_keys=True), digest_size=16).hexdigest()
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """两份规范化状态之间的增量：changed 为新增或变化的条目（新值），removed 为删除的键"""
+    changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    removed = [key for key in old if key not in new]
+    return {"changed": changed, "removed": removed}
+
+
+def encode_event(event: str, data: Dict[str, Any], format: str, event_id: Optional[str] = None) -> bytes:
+    payload = dumps(data)
+    if format == "sse":
+        head = b"id: " + event_id.encode() + b"\n" if event_id else b""
+        return head + b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+    head = b'{"type": "' + event.encode() + b'", '
+    if event_id:
+        head += b'"id": "' + event_id.encode() + b'", '
+    return head + b'"data": ' + payload + b"}\n"
+
+
+class WatchTarget:
+    """一个监控目标：当前的规范化状态和哈希，以及最近的增量"""
+
+    def __init__(self, key: str):
+        self.key = key
+        # 上次加载到的原始数据，上游未变化（304）时加载函数返回同一个对象，不再规范化和计算哈希
+        self.source: Any = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.hash: Optional[str] = None
+        self.version = 0
+        # 第一次得到状态时的事件序号，以及被挤出 history 的最后一条增量的序号
+        self.base_seq = 0
+        self.dropped_seq = 0
+        self.history: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self.checked_at: Optional[int] = None
+        self.error: Optional[Dict[str, Any]] = None
+        self.subscribers = 0
+        self.last_seen = time.monotonic()
+        self.next_check = 0.0
+        self.checking = False
+
+    def resumable(self, seq: int) -> bool:
+        """客户端已经收到序号 seq 之前的事件时，能否只补发之后的增量"""
+        return self.state is not None and seq >= self.base_seq and seq >= self.dropped_seq
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "target": self.key,
+            "version": self.version,
+            "hash": self.hash,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "subscribers": self.subscribers,
+            "history": len(self.history),
+        }
+
+
+class Subscription:
+    def __init__(self, targets: List[str], queue_size: int):
+        self.targets = set(targets)
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def put(self, event: Optional[Event]):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Watcher:
+    """
+    镜像元数据的变化监控。
+
+    客户端订阅（或轮询）一组目标后，后台按固定间隔逐个重新加载，把结果规范化（去掉浏览量等每次都变的字段）
+    并计算哈希；哈希不变时什么也不做，变化时只记录与上一份状态的增量（changed / removed），
+    推送给订阅了该目标的客户端，并在 history 中保留最近的增量供断线重连补发。
+
+    事件序号在进程内递增，事件 id 带上进程启动时生成的 epoch；
+    服务重启或连到其他 worker 后 epoch 不同，补发退化为发送完整状态（snapshot）
+    """
+
+    def __init__(self, load: Callable[[str], Awaitable[Any]], normalize: Callable[[Any], Dict[str, Any]],
+                 interval: float = WATCH_INTERVAL, concurrency: int = WATCH_CONCURRENCY,
+                 timeout: float = WATCH_CHECK_TIMEOUT, max_targets: int = WATCH_MAX_TARGETS,
+                 history: int = WATCH_HISTORY, idle_ttl: float = WATCH_IDLE_TTL,
+                 queue_size: int = WATCH_QUEUE_SIZE):
+        self.load = load
+        self.normalize = normalize
+        self.interval = interval
+        self.timeout = timeout
+        self.max_targets = max_targets
+        self.history = history
+        self.idle_ttl = idle_ttl
+        self.queue_size = queue_size
+        self.epoch = f"{random.getrandbits(32):08x}"
+        self._seq = 0
+        self._targets: Dict[str, WatchTarget] = {}
+        self._subscriptions: Set[Subscription] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._checks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"checks": 0, "not_modified": 0, "unchanged": 0, "changes": 0, "errors": 0,
+                      "events": 0, "overflows": 0, "expired": 0}
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.epoch}-{self._seq}"
+
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """本进程发出的事件 id -> 序号，其他进程或无法识别的 id 返回 None"""
+        epoch, _, seq = (event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def register(self, keys: Iterable[str]) -> List[WatchTarget]:
+        """登记监控目标（已存在时只刷新最近访问时间），新目标立即安排第一次检查"""
+        keys = list(dict.fromkeys(keys))
+        new = [key for key in keys if key not in self._targets]
+        if len(self._targets) + len(new) > self.max_targets:
+            raise WatchLimitExceeded(f"监控目标数已达上限 {self.max_targets}")
+        now = time.monotonic()
+        for key in new:
+            self._targets[key] = WatchTarget(key)
+        targets = [self._targets[key] for key in keys]
+        for target in targets:
+            target.last_seen = now
+        if new:
+            self._wakeup.set()
+        return targets
+
+    def replay(self, targets: List[WatchTarget], last_event_id: Optional[str]) -> List[Event]:
+        """
+        让客户端追上当前状态需要的事件：last_event_id 之后的增量还在 history 中时只补发增量，
+        否则发送完整状态；还没有完成第一次检查的目标第一次检查后再推送
+        """
+        seq = self.parse_event_id(last_event_id)
+        events = []
+        for target in targets:
+            if seq is not None and target.resumable(seq):
+                events.extend(("change", f"{self.epoch}-{event_seq}", data)
+                              for event_seq, data in target.history if event_seq > seq)
+            elif target.state is not None:
+                events.append(("snapshot", self.last_event_id, self._snapshot_event(target)))
+            if target.error is not None:
+                events.append(("error", None, {"target": target.key, **target.error}))
+        return events
+
+    def subscribe(self, keys: List[str], last_event_id: Optional[str] = None) -> Subscription:
+        targets = self.register(keys)
+        subscription = Subscription([target.key for target in targets], self.queue_size)
+        # 补发事件和加入订阅之间没有 await，不会漏掉这期间的变化
+        for event in self.replay(targets, last_event_id):
+            subscription.put(event)
+        for target in targets:
+            target.subscribers += 1
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self._subscriptions:
+            return
+        self._subscriptions.discard(subscription)
+        now = time.monotonic()
+        for key in subscription.targets:
+            target = self._targets.get(key)
+            if target is not None:
+                target.subscribers -= 1
+                target.last_seen = now
+
+    def poll(self, keys: List[str], last_event_id: Optional[str] = None) -> Dict[str, Any]:
+        """不保持连接的轮询：返回 last_event_id 之后的事件（没有变化时为空），以及下次轮询使用的 id"""
+        targets = self.register(keys)
+        return {
+            "last_event_id": self.last_event_id,
+            "events": [{"type": event, "id": event_id, "data": data}
+                       for event, event_id, data in self.replay(targets, last_event_id)],
+            "pending": [target.key for target in targets if target.state is None and target.error is None],
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._schedule()
+            except Exception as e:
+                logger.warning(f"Watch scheduling failed: {e}")
+                delay = self.interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _schedule(self) -> float:
+        """启动到期目标的检查，清理长时间没人关注的目标，返回距离下一个到期目标的秒数"""
+        now = time.monotonic()
+        next_due = now + self.interval
+        for key, target in list(self._targets.items()):
+            if target.checking:
+                continue
+            if target.subscribers <= 0 and now - target.last_seen > self.idle_ttl:
+                del self._targets[key]
+                self.stats["expired"] += 1
+                continue
+            if target.next_check <= now:
+                target.checking = True
+                task = asyncio.create_task(self._check(target))
+                self._checks.add(task)
+                task.add_done_callback(self._checks.discard)
+            else:
+                next_due = min(next_due, target.next_check)
+        return max(0.0, next_due - now)
+
+    async def _check(self, target: WatchTarget):
+        try:
+            async with self._slots:
+                outcome = await run_item(lambda: self.load(target.key), self.timeout, target.key)
+                self.stats["checks"] += 1
+                if outcome["ok"]:
+                    self._update(target, outcome["data"])
+                else:
+                    self._fail(target, outcome["status"], outcome["error"])
+        except Exception as e:
+            self._fail(target, 500, str(e))
+        finally:
+            target.checking = False
+            target.next_check = time.monotonic() + self.interval * random.uniform(0.9, 1.1)
+            self._wakeup.set()
+
+    def _update(self, target: WatchTarget, source: Any):
+        target.checked_at = int(time.time())
+        target.error = None
+        if target.state is not None and source is target.source:
+            self.stats["not_modified"] += 1
+            return
+        state = self.normalize(source)
+        digest = fingerprint(state)
+        target.source = source
+        if digest == target.hash:
+            self.stats["unchanged"] += 1
+            return
+        self._seq += 1
+        target.version += 1
+        target.hash = digest
+        if target.state is None:
+            target.state = state
+            target.base_seq = self._seq
+            self._publish(target, "snapshot", self._snapshot_event(target))
+            return
+        data = {"target": target.key, "version": target.version, "hash": digest,
+                "checked_at": target.checked_at, **diff(target.state, state)}
+        target.state = state
+        target.history.append((self._seq, data))
+        while len(target.history) > self.history:
+            target.dropped_seq = target.history.popleft()[0]
+        self.stats["changes"] += 1
+        self._publish(target, "change", data)
+
+    def _fail(self, target: WatchTarget, status: int, message: str):
+        self.stats["errors"] += 1
+        target.checked_at = int(time.time())
+        error = {"status": status, "error": message}
+        # 同样的错误只推送一次
+        if target.error == error:
+            return
+        target.error = error
+        self._publish(target, "error", {"target": target.key, **error}, with_id=False)
+
+    def _snapshot_event(self, target: WatchTarget) -> Dict[str, Any]:
+        return {"target": target.key, "version": target.version, "hash": target.hash,
+                "checked_at": target.checked_at, "state": target.state}
+
+    def _publish(self, target: WatchTarget, event: str, data: Dict[str, Any], with_id: bool = True):
+        event_id = self.last_event_id if with_id else None
+        for subscription in self._subscriptions:
+            if target.key in subscription.targets:
+                self.stats["events"] += 1
+                subscription.put((event, event_id, data))
+
+    async def stream(self, subscription: Subscription, format: str,
+                     keepalive: float = WATCH_KEEPALIVE) -> AsyncIterator[bytes]:
+        """
+        输出订阅的事件：snapshot（完整状态）、change（增量）、error（检查失败），空闲时输出 ping；
+        客户端处理太慢、积压超过队列长度时输出 reset 并结束，重连后从 Last-Event-ID 补发
+        """
+        try:
+            yield encode_event("ready", {"last_event_id": self.last_event_id,
+                                         "targets": sorted(subscription.targets)}, format)
+            while True:
+                if subscription.overflowed:
+                    self.stats["overflows"] += 1
+                    yield encode_event("reset", {"reason": "subscriber queue overflow"}, format)
+                    return
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n" if format == "sse" else encode_event("ping", {}, format)
+                    continue
+                if item is None:
+                    return
+                event, event_id, data = item
+                yield encode_event(event, data, format, event_id)
+        finally:
+            self.unsubscribe(subscription)
+
+    def snapshot(self, targets: bool = False, limit: int = 100) -> Dict[str, Any]:
+        data = {
+            **self.stats,
+            "targets": len(self._targets),
+            "subscriptions": len(self._subscriptions),
+            "checking": len(self._checks),
+            "interval": self.interval,
+            "last_event_id": self.last_event_id,
+        }
+        if targets:
+            data["watched"] = [target.snapshot() for target in list(self._targets.values())[:limit]]
+        return data
+
+    async def aclose(self):
+        # 通知所有订阅结束，流式响应随之关闭，不阻塞服务退出
+        for subscription in list(self._subscriptions):
+            subscription.overflowed = False
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._checks):
+            task.cancel()
@@ -1,112 +1,132 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-import re
-from fastapi.responses import JSONResponse
-from util.image_info_util import fetch_html, parse_html
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi.responses import StreamingResponse
+from util.image_info_util import fetch_html, load_documentation, parse_html, parse_search_html
+from util.browser_pool import BrowserUnavailable, RenderTimeout
+from util.http_client import get_client, XUANYUAN_CLOUD, XUANYUAN_DOCKERS
+from util.response_cache import CachePolicy, ResponseCache
+from util.json_response import FastJSONResponse, RawJSON, is_json_document, loads, passthrough_response
+from util.stage_timer import stage
+from util.request_timing import TimedRoute
+from util.batch import BATCH_MAX_ITEMS, batch_limits, run_batch
+from util.tag_stream import (FORMATS, TAG_PAGE_SIZE_MAX, TAG_STREAM_MAX_WINDOW, TAG_STREAM_WINDOW,
+                             iter_tag_pages, stream_tags)
+from util.upstream_governor import UpstreamUnavailable, unavailable_error
+from util.watch import FORMATS as WATCH_FORMATS, Watcher, WatchLimitExceeded, watch_keys
+from model.image_tags_batch import ImageTagsBatchRequest, ImageTagsQuery
 import httpx
-from bs4 import BeautifulSoup
 
-xuanyuan_router = APIRouter()
+xuanyuan_router = APIRouter(route_class=TimedRoute)
+
+# 镜像数据一天最多变化几次，过期后先返回旧数据并在后台刷新
+# 这几个接口直接转发上游 JSON，缓存原始字节，返回时不再解码和重新编码
+V2_SEARCH_CACHE_POLICY = CachePolicy.from_env("v2_search", ttl=600, stale_ttl=3600, raw=True)
+V2_IMAGE_TAGS_CACHE_POLICY = CachePolicy.from_env("v2_image_tags", ttl=900, stale_ttl=3 * 3600, raw=True)
+IMAGE_TAGS_CACHE_POLICY = CachePolicy.from_env("image_tags", ttl=900, stale_ttl=3 * 3600, raw=True)
+# 文档需要浏览器渲染，代价高且很少变化
+IMAGE_DOCUMENTATION_CACHE_POLICY = CachePolicy.from_env("image_documentation", ttl=6 * 3600, stale_ttl=24 * 3600)
+# 标签中每次有人拉取都会变化的字段，不参与变化检测
+WATCH_VOLATILE_TAG_FIELDS = ("last_pulled", "tag_last_pulled")
+
+
+async def load_json(app: FastAPI, upstream: str, url: str) -> RawJSON:
+    """返回上游的原始 JSON 字节，相同地址的并发请求共享同一次上游抓取"""
+    return await app.state.single_flight.do(
+        f"{upstream}{url}", lambda: _fetch_json(app, upstream, url))
+
+
+async def _fetch_json(app: FastAPI, upstream: str, url: str) -> RawJSON:
+    async def parse(response: httpx.Response) -> RawJSON:
+        # 不解码，只排除上游返回的 HTML 错误页
+        if not is_json_document(response.content):
+            raise ValueError(f"上游返回的不是 JSON: {response.headers.get('content-type')}")
+        return RawJSON(response.content)
+
+    # 上游支持条件请求时，内容未变化（304）直接复用上次的结果
+    return await app.state.upstream_validators.get(get_client(app, upstream), url, parse)
+
+def tags_page_url(image_name: str, tag_name: str, page: int, page_size: int) -> str:
+    return f'/api/tags?url=https%3A%2F%2Fhub.docker.com%2Fv2%2Frepositories%2F{image_name}%2Ftags%3Fname%3D{tag_name}%26ordering%3Dlast_updated%26page%3D{page}%26page_size%3D{page_size}'
+
+
+def image_tags_key(namespace: str, name: str, tag: str) -> str:
+    return ResponseCache.make_key("v2_image_tags", {"namespace": namespace, "name": name, "tag": tag})
+
+
+def fetch_image_tags(app: FastAPI, namespace: str, name: str, tag: str):
+    return load_json(app, XUANYUAN_CLOUD, f'/api/docker/filter?namespace={namespace}&name={name}&tag={tag}')
+
+
+async def load_image_tags(app: FastAPI, namespace: str, name: str, tag: str):
+    # 结果按规范化参数缓存
+    cache: ResponseCache = app.state.response_cache
+    return await cache.get_or_load(
+        image_tags_key(namespace, name, tag),
+        lambda: fetch_image_tags(app, namespace, name, tag),
+        V2_IMAGE_TAGS_CACHE_POLICY)
+
+
+def parse_watch_target(target: str) -> Tuple[str, str, str]:
+    """'namespace/name:tag'（namespace 默认为 library，tag 可省略）-> (namespace, name, tag)"""
+    repository, _, tag = target.strip().partition(":")
+    namespace, _, name = repository.rpartition("/")
+    if not name or "/" in namespace:
+        raise ValueError(f"无法识别的镜像: {target}")
+    return namespace or "library", name, tag
+
+
+def watch_target(value: str) -> str:
+    return "{}/{}:{}".format(*parse_watch_target(value))
+
+
+async def check_image_tags(app: FastAPI, target: str):
+    """
+    变化监控的检查：不等缓存过期直接向上游确认，结果写回缓存。
+    上游未变化时条件请求返回 304，得到的仍是上次的同一份原始 JSON
+    """
+    namespace, name, tag = parse_watch_target(target)
+    cache: ResponseCache = app.state.response_cache
+    key = image_tags_key(namespace, name, tag)
+    await cache.refresh(key, lambda: fetch_image_tags(app, namespace, name, tag), V2_IMAGE_TAGS_CACHE_POLICY)
+    data = cache.get(key, allow_stale=True, policy=V2_IMAGE_TAGS_CACHE_POLICY)
+    return data if data is not None else await load_image_tags(app, namespace, name, tag)
+
+
+def _without_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _without_volatile(item) for key, item in value.items() if key not in WATCH_VOLATILE_TAG_FIELDS}
+    if isinstance(value, list):
+        return [_without_volatile(item) for item in value]
+    return value
+
+
+def image_tags_state(payload: RawJSON) -> Dict[str, Any]:
+    """参与变化检测的标签列表：标签名 -> 去掉拉取时间后的标签信息"""
+    results = loads(payload).get("results") or []
+    return {tag["name"]: _without_volatile(tag) for tag in results if isinstance(tag, dict) and tag.get("name")}
+
+
+def create_watcher(app: FastAPI) -> Watcher:
+    return Watcher(lambda target: check_image_tags(app, target), image_tags_state)
 
 # 官网已更新页面，该接口当前已经失效
 @xuanyuan_router.get("/search")
-async def search_images(q: str, filter: Optional[str] = "", page: int = 1):
+async def search_images(request: Request, q: str, filter: Optional[str] = "", page: int = 1):
     # 构建请求URL
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    url = f"https://dockers.xuanyuan.me/search?q={q}&filter={filter}&page={page}"
+    url = f"/search?q={q}&filter={filter}&page={page}"
 
     try:
         # 发送HTTP请求
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
+        client = get_client(request.app, XUANYUAN_DOCKERS)
+        with stage("fetch"):
+            response = await client.get(url)
             response.raise_for_status()
 
         # 解析HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 提取总页码
-        pagination = soup.find('nav', {'aria-label': 'pagination'})
-        total_pages = page  # 默认为当前页码
-
-        if pagination:
-            page_links = pagination.find_all('a')
-            page_numbers = []
-
-            for link in page_links:
-                if link.text.isdigit():
-                    page_numbers.append(int(link.text))
-
-            if page_numbers:
-                total_pages = max(page_numbers)
-            else:
-                # 如果没有找到页码链接，可能是只有一页
-                total_pages = 1
-        else:
-            total_pages = 1
-
-        # 提取镜像信息
-        images = []
-        image_cards = soup.select('.grid.gap-4 a.block')
-
-        for card in image_cards:
-            # 镜像链接
-            image_link = card['href'] if 'href' in card.attrs else ""
-
-            # 镜像名称和作者
-            name = card.select_one(
-                'h3.font-semibold.text-primary').text.strip()
-            author = card.select_one(
-                'p.text-sm.text-muted-foreground').text.strip()
-
-            # 图标链接
-            img_tag = card.select_one('img.rounded-full')
-            icon_url = img_tag['src'] if img_tag and 'src' in img_tag.attrs else ""
-
-            # 镜像介绍
-            description_tag = card.select_one('p.text-sm.mb-4.line-clamp-2')
-            description = description_tag.text.strip() if description_tag else ""
-
-            # star数量
-            star_tag = card.select_one('div.flex.items-center.text-sm')
-            stars = star_tag.text.strip() if star_tag else "0"
-            stars = re.sub(r'[^\d]', '', stars)  # 提取纯数字
-
-            # 拉取数量
-            pulls_tag = card.select_one('div.text-sm.text-muted-foreground')
-            pulls = pulls_tag.text.strip() if pulls_tag else "0"
-
-            # 镜像标签
-            tag = "none"
-            tag_divs = card.find_all(
-                'div', class_=lambda x: x and 'rounded-md' in x and 'border' in x and 'px-2.5' in x and 'py-0.5' in x)
-            if tag_divs:
-                tag_div = tag_divs[0]
-                if "Official" in tag_div.text:
-                    tag = "Official"
-                elif "Verified" in tag_div.text:
-                    tag = "Verified"
-                elif "open_source" in tag_div.text:
-                    tag = "open_source"
-
-            images.append({
-                "name": name,
-                "author": author,
-                "image_link": image_link,
-                "icon_url": icon_url,
-                "description": description,
-                "stars": int(stars) if stars else 0,
-                "pulls": pulls,
-                "tag": tag
-            })
-
-        return {
-            "current_page": page,
-            "total_pages": total_pages,
-            "images": images
-        }
+        return FastJSONResponse(content=parse_search_html(response.text, page))
 
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
     except Exception as e:
@@ -114,59 +134,212 @@ async def search_images(q: str, filter: Optional[str] = "", page: int = 1):
 
 # 官网已更新页面，该接口当前已经失效
 @xuanyuan_router.get("/image_info")
-async def get_image_info(image_name: str):
+async def get_image_info(request: Request, image_name: str, documentation: bool = False):
+    """documentation=true 时通过浏览器池渲染页面，额外返回"详细说明"文档"""
     try:
-        html_content = await fetch_html(image_name)
+        html_content = await fetch_html(request.app, image_name)
         data = parse_html(html_content)
-        return JSONResponse(content=data)
+        if documentation:
+            cache: ResponseCache = request.app.state.response_cache
+            data["documentation"] = await cache.get_or_load(
+                ResponseCache.make_key("image_documentation", {"image_name": image_name}),
+                lambda: load_documentation(request.app, image_name),
+                IMAGE_DOCUMENTATION_CACHE_POLICY)
+        return FastJSONResponse(content=data)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    except BrowserUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=f"页面渲染超时: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @xuanyuan_router.get("/image_tags")
-async def get_image_info(image_name: str, tag_name: Optional[str] = "", page: int = 1, page_size: int = 25):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    url = f'https://dockers.xuanyuan.me/api/tags?url=https%3A%2F%2Fhub.docker.com%2Fv2%2Frepositories%2F{image_name}%2Ftags%3Fname%3D{tag_name}%26ordering%3Dlast_updated%26page%3D{page}%26page_size%3D{page_size}'
+async def get_image_info(request: Request, image_name: str, tag_name: Optional[str] = "", page: int = 1, page_size: int = 25,
+                         fields: Optional[str] = None):
+    """原样返回上游分页；fields=name,last_updated 时 results 中每项只保留这些字段"""
+    url = tags_page_url(image_name, tag_name, page, page_size)
     try:
-        # 发送HTTP请求
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-        data = response.json()
-        return JSONResponse(content=data)
+        # 发送HTTP请求，原始分页按规范化参数缓存
+        cache: ResponseCache = request.app.state.response_cache
+        data = await cache.get_or_load(
+            ResponseCache.make_key("image_tags", {
+                "image_name": image_name, "tag_name": tag_name, "page": page, "page_size": page_size}),
+            lambda: load_json(request.app, XUANYUAN_DOCKERS, url),
+            IMAGE_TAGS_CACHE_POLICY)
+        return passthrough_response(data, fields)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@xuanyuan_router.get("/image_tags/stream")
+async def stream_image_tags(
+    request: Request,
+    image_name: str,
+    tag_name: Optional[str] = "",
+    match: Optional[str] = None,
+    page_size: int = Query(TAG_PAGE_SIZE_MAX, ge=1, le=TAG_PAGE_SIZE_MAX),
+    window: int = Query(TAG_STREAM_WINDOW, ge=1, le=TAG_STREAM_MAX_WINDOW),
+    max_pages: Optional[int] = Query(None, ge=1),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+):
+    """
+    逐页读取镜像的全部标签并以 NDJSON（或 SSE）流式返回
+
+    - tag_name: 传给上游的名称过滤（包含匹配）
+    - match: 找到同名标签后立即结束
+    - window: 同时预取的分页数
+    - 每行（每个事件）为 {"type": "tag" | "done" | "error", "data": ...}，SSE 时 type 为事件名
+    """
+    async def fetch_page(page: int):
+        return loads(await load_json(request.app, XUANYUAN_DOCKERS, tags_page_url(image_name, tag_name, page, page_size)))
+
+    # 第一页在返回响应前获取，失败时仍能返回正常的错误状态码
+    try:
+        first_page = await fetch_page(1)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    pages = iter_tag_pages(first_page, fetch_page, page_size, window, max_pages)
+    return StreamingResponse(
+        stream_tags(pages, match, format),
+        media_type=FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @xuanyuan_router.get("/v2/search")
-async def v2_search_images(image_name: str, page: int = 1, page_size: int = 25):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    url = f'https://xuanyuan.cloud/api/docker/searchv4?q={image_name}&page={page}&limit={page_size}'
+async def v2_search_images(request: Request, image_name: str, page: int = 1, page_size: int = 25,
+                           fields: Optional[str] = None):
+    """原样返回上游搜索结果；fields 指定时 results 中每项只保留这些字段"""
+    url = f'/api/docker/searchv4?q={image_name}&page={page}&limit={page_size}'
     try:
-        # 发送HTTP请求
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-        data = response.json()
-        return JSONResponse(content=data)
+        # 发送HTTP请求，结果按规范化参数缓存
+        cache: ResponseCache = request.app.state.response_cache
+        data = await cache.get_or_load(
+            ResponseCache.make_key("v2_search", {
+                "image_name": image_name, "page": page, "page_size": page_size}),
+            lambda: load_json(request.app, XUANYUAN_CLOUD, url),
+            V2_SEARCH_CACHE_POLICY)
+        return passthrough_response(data, fields)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @xuanyuan_router.get("/v2/image_tags")
-async def v2_search_images(namespace: str, name: str, tag: str):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    url = f'https://xuanyuan.cloud/api/docker/filter?namespace={namespace}&name={name}&tag={tag}'
+async def v2_search_images(request: Request, namespace: str, name: str, tag: str, fields: Optional[str] = None):
+    """原样返回上游标签列表；fields 指定时 results 中每项只保留这些字段"""
     try:
-        # 发送HTTP请求
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-        data = response.json()
-        return JSONResponse(content=data)
+        # 发送HTTP请求，结果按规范化参数缓存
+        data = await load_image_tags(request.app, namespace, name, tag)
+        return passthrough_response(data, fields)
+    except UpstreamUnavailable as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@xuanyuan_router.post("/v2/image_tags/batch")
+async def v2_image_tags_batch(request: Request, body: ImageTagsBatchRequest):
+    """
+    批量查询镜像标签，并发请求，单项失败不影响其他条目
+
+    返回与 items 顺序一致的 results，每项包含查询参数、ok、status、error 和 data
+    """
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"最多一次查询 {BATCH_MAX_ITEMS} 个镜像标签")
+
+    concurrency, timeout = batch_limits(body.concurrency, body.timeout)
+
+    async def load(query: ImageTagsQuery):
+        return await load_image_tags(request.app, query.namespace, query.name, query.tag)
+
+    outcomes = await run_batch(body.items, load, concurrency, timeout)
+    results = [{**query.model_dump(), **outcome} for query, outcome in zip(body.items, outcomes)]
+    succeeded = sum(1 for result in results if result["ok"])
+    # data 为上游原始 JSON，编码时直接嵌入
+    return FastJSONResponse(content={
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    })
+
+
+@xuanyuan_router.get("/v2/image_tags/watch/events")
+async def watch_image_tags(
+    request: Request,
+    image: List[str] = Query(...),
+    format: str = Query("sse", pattern="^(ndjson|sse)$"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    订阅镜像标签列表的变化（可传多个 image，格式 namespace/name:tag，与 /v2/image_tags 的参数对应），
+    以 SSE（或 NDJSON）推送
+
+    - 服务端按 SPIDER_WATCH_INTERVAL 定期重新检查，只有标签内容（不含拉取时间）变化时才推送
+    - 事件：ready；snapshot（完整状态：标签名 -> 标签信息）；change（changed 为新增或变化的标签，
+      removed 为删除的标签名）；error（检查失败）；ping（心跳）；reset（客户端读取太慢，需要重连）
+    - 断线重连时带上 Last-Event-ID 请求头，只补发之后的增量
+    """
+    watcher: Watcher = request.app.state.watcher
+    try:
+        subscription = watcher.subscribe(watch_keys([watch_target(value) for value in image if value.strip()]),
+                                         last_event_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WatchLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return StreamingResponse(
+        watcher.stream(subscription, format),
+        media_type=WATCH_FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@xuanyuan_router.get("/v2/image_tags/watch/changes")
+async def watch_image_tags_changes(request: Request, image: List[str] = Query(...), since: Optional[str] = None):
+    """
+    不保持连接的轮询：登记监控的镜像，返回 since（上次返回的 last_event_id）之后的事件，没有变化时 events 为空。
+    第一次轮询或无法补发时返回完整状态（snapshot）；pending 为还没有完成第一次检查的镜像
+    """
+    try:
+        return request.app.state.watcher.poll(watch_keys([watch_target(value) for value in image if value.strip()]),
+                                              since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WatchLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+@xuanyuan_router.get("/v2/image_tags/watch")
+async def watch_stats(request: Request):
+    """变化监控的检查、变化、推送计数，以及各监控目标的版本、哈希和最近一次检查结果"""
+    return request.app.state.watcher.snapshot(targets=True)
+
+
+@xuanyuan_router.get("/cache/stats")
+async def cache_stats(request: Request):
+    """缓存命中、未命中、淘汰、请求合并、上游条件请求计数，以及热门条目预取和浏览器池的状态"""
+    prefetcher = request.app.state.prefetcher
+    cache: ResponseCache = request.app.state.response_cache
+    return {
+        **cache.snapshot(),
+        "single_flight": request.app.state.single_flight.snapshot(),
+        "upstream_validators": request.app.state.upstream_validators.snapshot(),
+        "prefetch": prefetcher.snapshot() if prefetcher is not None else None,
+        "browser_pool": request.app.state.browser_pool.snapshot(),
+        # 多进程模式下 broker 的全局计数
+        "broker": await cache.shared.broker_stats() if cache.shared is not None else None,
+    }
+
+
+@xuanyuan_router.get("/upstream/stats")
+async def upstream_stats(request: Request):
+    """各上游站点的熔断状态、并发上限、限流计数、最近的限流决策，以及重试和对冲统计"""
+    return request.app.state.http_clients.snapshot()
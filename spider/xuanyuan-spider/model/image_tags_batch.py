@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class ImageTagsQuery(BaseModel):
+    namespace: str
+    name: str
+    tag: str
+
+
+class ImageTagsBatchRequest(BaseModel):
+    items: List[ImageTagsQuery] = Field(min_length=1)
+    # 不超过服务端配置的并发上限和单项超时
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    timeout: Optional[float] = Field(default=None, gt=0)
@@ -0,0 +1,69 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+from fastapi import HTTPException
+from util.upstream_governor import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 批量接口的默认并发上限、单项超时（秒）和单次请求最多条目数
+BATCH_CONCURRENCY = int(os.getenv("SPIDER_BATCH_CONCURRENCY", 8))
+BATCH_ITEM_TIMEOUT = float(os.getenv("SPIDER_BATCH_ITEM_TIMEOUT", 20))
+BATCH_MAX_ITEMS = int(os.getenv("SPIDER_BATCH_MAX_ITEMS", 100))
+
+
+def batch_limits(concurrency: Optional[int], timeout: Optional[float]):
+    """请求可以调低并发和超时，但不能超过服务端配置"""
+    concurrency = min(concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    timeout = min(timeout or BATCH_ITEM_TIMEOUT, BATCH_ITEM_TIMEOUT)
+    return concurrency, timeout
+
+
+def _error(status: int, message: str) -> Dict[str, Any]:
+    return {"ok": False, "status": status, "error": message, "data": None}
+
+
+async def run_batch(items: List[T], load: Callable[[T], Awaitable[Any]],
+                    concurrency: int = BATCH_CONCURRENCY,
+                    timeout: float = BATCH_ITEM_TIMEOUT) -> List[Dict[str, Any]]:
+    """
+    并发执行 load(item)，同时运行的条目不超过 concurrency，每项单独计时。
+
+    返回与 items 顺序一致的结果列表，单项失败只记录在该项中，不影响其他条目：
+    {"ok": bool, "status": int, "error": Optional[str], "data": Any}
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_one(item: T) -> Dict[str, Any]:
+        async with slots:
+            return await run_item(lambda: load(item), timeout, item)
+
+    return await asyncio.gather(*(run_one(item) for item in items))
+
+
+async def run_item(load: Callable[[], Awaitable[Any]], timeout: float, label: Any = None) -> Dict[str, Any]:
+    """
+    执行单项 load() 并限时，异常转换为对应的状态码，不向外抛出：
+    {"ok": bool, "status": int, "error": Optional[str], "data": Any}
+    """
+    try:
+        data = await asyncio.wait_for(load(), timeout)
+        return {"ok": True, "status": 200, "error": None, "data": data}
+    except asyncio.TimeoutError:
+        return _error(504, f"Timed out after {timeout:g}s")
+    except httpx.HTTPStatusError as e:
+        return _error(e.response.status_code, f"Upstream returned {e.response.status_code}")
+    except UpstreamUnavailable as e:
+        return _error(503, str(e))
+    except httpx.HTTPError as e:
+        return _error(502, f"Request failed: {str(e)}")
+    except HTTPException as e:
+        return _error(e.status_code, str(e.detail))
+    except Exception as e:
+        logger.error(f"Batch item {label} failed: {e}")
+        return _error(500, f"Error processing request: {str(e)}")
@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的浏览器会话数（也是并发渲染上限）
+BROWSER_POOL_SIZE = int(os.getenv("XUANYUAN_BROWSER_POOL_SIZE", 2))
+# 单个会话渲染多少个页面、或页面 JS 堆超过多少 MB 后重建
+BROWSER_MAX_PAGES = int(os.getenv("XUANYUAN_BROWSER_MAX_PAGES", 50))
+BROWSER_MAX_MEMORY_MB = float(os.getenv("XUANYUAN_BROWSER_MAX_MEMORY_MB", 512))
+# 空闲多久后关闭会话释放内存（秒）
+BROWSER_IDLE_TIMEOUT = float(os.getenv("XUANYUAN_BROWSER_IDLE_TIMEOUT", 300))
+# 等待页面元素、等待空闲会话的超时（秒）
+BROWSER_RENDER_TIMEOUT = float(os.getenv("XUANYUAN_BROWSER_RENDER_TIMEOUT", 10))
+BROWSER_QUEUE_TIMEOUT = float(os.getenv("XUANYUAN_BROWSER_QUEUE_TIMEOUT", 30))
+# 浏览器驱动工厂，格式为 "模块:可调用对象"，为空时使用无头 Chrome
+BROWSER_DRIVER = os.getenv("XUANYUAN_BROWSER_DRIVER", "")
+
+# WebDriver 的元素定位方式（与 selenium By.XPATH / By.CLASS_NAME 相同）
+XPATH = "xpath"
+CLASS_NAME = "class name"
+
+
+class BrowserUnavailable(Exception):
+    """没有可用的浏览器（未安装 selenium / Chrome，或排队超时）"""
+
+
+class RenderTimeout(Exception):
+    """页面在超时时间内没有出现预期的元素"""
+
+
+def chrome_driver():
+    """默认的无头 Chrome，第一次需要时才导入 selenium（可选依赖，见 requirements-browser.txt）"""
+    try:
+        from selenium import webdriver
+    except ImportError as e:
+        raise BrowserUnavailable("selenium 未安装（pip install -r requirements-browser.txt），无法渲染页面") from e
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    # 文档只需要文本，不加载图片
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    return webdriver.Chrome(options=options)
+
+
+def load_driver_factory(spec: str = BROWSER_DRIVER) -> Callable[[], Any]:
+    if not spec:
+        return chrome_driver
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def wait_for_element(driver, by: str, value: str, timeout: float, poll: float = 0.05):
+    deadline = time.monotonic() + timeout
+    while True:
+        elements = driver.find_elements(by, value)
+        if elements:
+            return elements[0]
+        if time.monotonic() >= deadline:
+            raise RenderTimeout(f"{by}={value} not found after {timeout:g}s")
+        time.sleep(poll)
+
+
+def page_memory_bytes(driver) -> int:
+    """页面的 JS 堆占用（Chrome 的 performance.memory），取不到时为 0"""
+    try:
+        return int(driver.execute_script(
+            "return window.performance && performance.memory ? performance.memory.usedJSHeapSize : 0") or 0)
+    except Exception:
+        return 0
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class BrowserPool:
+    """
+    长期运行的无头浏览器会话池。
+
+    - 会话在第一次渲染时才启动，同一会话在同一个标签页中依次打开页面
+    - 同时渲染的页面数不超过会话数，其余请求排队，排队超时返回 BrowserUnavailable
+    - 会话渲染页面数或 JS 堆占用超过上限、出错、空闲过久时关闭并按需重建
+    - WebDriver 调用是阻塞的，全部在专用线程池中执行
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE,
+                 driver_factory: Optional[Callable[[], Any]] = None,
+                 max_pages: int = BROWSER_MAX_PAGES,
+                 max_memory_bytes: float = BROWSER_MAX_MEMORY_MB * 1024 * 1024,
+                 idle_timeout: float = BROWSER_IDLE_TIMEOUT,
+                 queue_timeout: float = BROWSER_QUEUE_TIMEOUT):
+        self.size = size
+        self.driver_factory = driver_factory or load_driver_factory()
+        self.max_pages = max_pages
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_timeout = idle_timeout
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="browser")
+        self._slots = asyncio.Semaphore(size)
+        self._idle: Deque[BrowserSession] = deque()
+        self._in_use = 0
+        self._reaper: Optional[asyncio.Task] = None
+        self.stats = {
+            "renders": 0,
+            "render_errors": 0,
+            "render_timeouts": 0,
+            "queue_timeouts": 0,
+            "render_seconds": 0.0,
+            "sessions_created": 0,
+            "recycled_pages": 0,
+            "recycled_memory": 0,
+            "recycled_error": 0,
+            "recycled_idle": 0,
+        }
+
+    def start(self):
+        if self._reaper is None and self.idle_timeout > 0:
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def render(self, url: str, action: Callable[[Any, str], Any]) -> Any:
+        """取一个空闲会话执行 action(driver, url)，返回其结果"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["queue_timeouts"] += 1
+            raise BrowserUnavailable(f"等待浏览器超过 {self.queue_timeout:g}s")
+        self._in_use += 1
+        session = None
+        try:
+            session = self._idle.pop() if self._idle else await self._create()
+            start = time.perf_counter()
+            try:
+                result = await self._run(action, session.driver, url)
+            except RenderTimeout:
+                self.stats["render_timeouts"] += 1
+                raise
+            except Exception:
+                # 驱动出错后会话状态不可信，直接重建
+                self.stats["render_errors"] += 1
+                await self._recycle(session, "error")
+                session = None
+                raise
+            finally:
+                self.stats["render_seconds"] += time.perf_counter() - start
+            self.stats["renders"] += 1
+            session.pages += 1
+            reason = await self._run(self._recycle_reason, session)
+            if reason is not None:
+                await self._recycle(session, reason)
+                session = None
+            return result
+        finally:
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._idle.append(session)
+            self._in_use -= 1
+            self._slots.release()
+
+    async def _create(self) -> BrowserSession:
+        driver = await self._run(self.driver_factory)
+        self.stats["sessions_created"] += 1
+        logger.info("Started browser session")
+        return BrowserSession(driver)
+
+    def _recycle_reason(self, session: BrowserSession) -> Optional[str]:
+        if session.pages >= self.max_pages:
+            return "pages"
+        if self.max_memory_bytes and page_memory_bytes(session.driver) > self.max_memory_bytes:
+            return "memory"
+        return None
+
+    async def _recycle(self, session: BrowserSession, reason: str):
+        self.stats[f"recycled_{reason}"] += 1
+        logger.info(f"Closing browser session after {session.pages} pages ({reason})")
+        await self._quit(session)
+
+    async def _quit(self, session: BrowserSession):
+        try:
+            await self._run(session.driver.quit)
+        except Exception as e:
+            logger.warning(f"Failed to quit browser session: {e}")
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            now = time.monotonic()
+            # 最久未用的会话在队首
+            while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+                await self._recycle(self._idle.popleft(), "idle")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "render_seconds": round(self.stats["render_seconds"], 3),
+            "size": self.size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "max_pages": self.max_pages,
+            "max_memory_bytes": self.max_memory_bytes,
+        }
+
+    async def aclose(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        while self._idle:
+            await self._quit(self._idle.pop())
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,114 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+from typing import Optional
+
+import uvicorn
+from starlette.types import ASGIApp
+
+from util.cache_broker import CacheBroker
+
+logger = logging.getLogger(__name__)
+
+# 生产模式的 worker 进程数，大于 1 时启动本地 broker 进程并以多进程方式运行
+WORKERS = int(os.getenv("SPIDER_WORKERS", 1))
+# 监听地址和端口，端口默认为各服务自己的端口
+HOST = os.getenv("SPIDER_HOST", "0.0.0.0")
+PORT = os.getenv("SPIDER_PORT", "")
+# 开发时代码变化自动重启（额外启动一个文件监视进程并在子进程中重新导入应用），生产环境不开启
+RELOAD = os.getenv("SPIDER_RELOAD", "").lower() in ("1", "true", "yes", "on")
+# 退出时等待进行中的请求完成的最长时间（秒）；变化监控的推送连接不会自己结束，超时后断开
+GRACEFUL_SHUTDOWN = float(os.getenv("SPIDER_GRACEFUL_SHUTDOWN", 5))
+# broker 检查启动它的进程是否还在的间隔（秒）
+PARENT_CHECK_INTERVAL = 1.0
+
+
+def serve_broker(path: str, parent: int):
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(asctime)s - %(message)s")
+    try:
+        asyncio.run(_serve_broker(path, parent))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve_broker(path: str, parent: int):
+    """
+    运行 broker，直到启动它的进程退出：启动进程被 SIGKILL 等无法执行清理时，
+    broker 被 init 收养（父进程变化），自行退出并删除自己创建的 socket 文件
+    """
+    task = asyncio.create_task(CacheBroker().serve(path))
+    inode = None
+    while not task.done():
+        if inode is None and os.path.exists(path):
+            inode = os.stat(path).st_ino
+        if os.getppid() != parent:
+            logger.info(f"Launcher {parent} exited, stopping cache broker {path}")
+            task.cancel()
+            break
+        await asyncio.sleep(PARENT_CHECK_INTERVAL)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # 新的启动进程可能已经在同一路径上创建了 socket，只删除自己的
+    if inode is not None and os.path.exists(path) and os.stat(path).st_ino == inode:
+        os.unlink(path)
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def wait_for_socket(path: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"Cache broker did not start: {path}")
+        time.sleep(0.05)
+
+
+def run(app: str, host: str, port: int, workers: int = WORKERS):
+    """
+    启动 broker 进程和 workers 个 uvicorn worker 进程（共享同一个监听端口）。
+
+    worker 通过 SPIDER_BROKER_SOCKET 连接 broker，共享响应缓存并跨进程合并上游请求，
+    不需要 Redis 等外部服务
+    """
+    path = os.getenv("SPIDER_BROKER_SOCKET") or os.path.join(tempfile.gettempdir(), f"spider-broker-{port}.sock")
+    broker = multiprocessing.get_context("spawn").Process(
+        target=serve_broker, args=(path, os.getpid()), name="cache-broker", daemon=True)
+    broker.start()
+    # uvicorn 收到 SIGTERM 时先正常关闭，再恢复原来的信号处理并重新发出该信号；
+    # 默认处理会直接结束进程而跳过下面的清理，这里改为抛出 SystemExit 以执行 finally
+    previous = signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        wait_for_socket(path)
+        # worker 进程继承环境变量
+        os.environ["SPIDER_BROKER_SOCKET"] = path
+        logger.info(f"Starting {workers} workers on {host}:{port} with cache broker {path}")
+        uvicorn.run(app, host=host, port=port, workers=workers, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        broker.terminate()
+        broker.join(timeout=5)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def serve(app_path: str, port: int, app: Optional[ASGIApp] = None):
+    """
+    服务入口（python main.py）：默认不启用 reload，SPIDER_WORKERS > 1 时以多进程模式运行。
+
+    单进程时直接运行已导入的 app 对象，不再按 app_path 重新导入一遍应用模块
+    """
+    port = int(PORT or port)
+    if WORKERS > 1:
+        run(app_path, HOST, port, WORKERS)
+    elif RELOAD or app is None:
+        uvicorn.run(app_path, host=HOST, port=port, reload=RELOAD, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN)
+    else:
+        uvicorn.run(app, host=HOST, port=port, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN)
@@ -0,0 +1,236 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+from util.metrics import FETCH_ATTEMPTS, FETCH_BUDGET_EXHAUSTED, HEDGE_OUTCOMES
+from util.upstream_governor import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# 只有幂等请求才会重试和对冲
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# 网关类错误通常是瞬时的，可以重试；429 交给限流处理，不立即重试
+RETRY_STATUSES = {502, 503, 504}
+
+
+@dataclass(frozen=True)
+class FetchPolicy:
+    """
+    单个上游的重试与对冲配置（单次请求的连接 / 读取超时见 HttpClientSettings）。
+
+    SPIDER_FETCH_<KEY> 对所有上游生效，SPIDER_FETCH_<HOST>_<KEY> 覆盖单个上游
+    """
+    # 失败后最多重试几次，退避时间在 [0, min(backoff_max, backoff_base * 2^n)] 间随机
+    retries: int = 2
+    backoff_base: float = 0.2
+    backoff_max: float = 2.0
+    # 包含重试和退避在内的总耗时上限（秒），超过后不再重试
+    total_timeout: float = 30.0
+    # 第一次请求超过近期耗时的 hedge_quantile 分位仍未返回时，再发一个相同请求，取先返回的
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 0.05
+    # 耗时样本不足时不对冲
+    hedge_min_samples: int = 20
+    # 重试和对冲共用的额外请求预算：每个请求积累 budget_ratio 个，最多积累 budget_max 个
+    budget_ratio: float = 0.1
+    budget_max: float = 10.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "FetchPolicy":
+        host = re.sub(r"\W", "_", name).upper()
+        values = {}
+        for field in fields(cls):
+            key = field.name.upper()
+            value = os.getenv(f"SPIDER_FETCH_{host}_{key}") or os.getenv(f"SPIDER_FETCH_{key}")
+            if not value:
+                continue
+            if isinstance(field.default, bool):
+                values[field.name] = value.lower() in ("1", "true", "yes", "on")
+            else:
+                values[field.name] = type(field.default)(value)
+        return cls(**values)
+
+
+class LatencyTracker:
+    """最近若干次成功请求的耗时，分位数按需计算并缓存"""
+
+    def __init__(self, size: int = 512):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._quantiles: Dict[float, float] = {}
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self._quantiles.clear()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        value = self._quantiles.get(q)
+        if value is None:
+            ordered = sorted(self._samples)
+            value = self._quantiles[q] = ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+        return value
+
+
+class RetryBudget:
+    """额外请求（重试、对冲）不超过正常请求数的一定比例，避免上游变慢时放大负载"""
+
+    def __init__(self, ratio: float, maximum: float):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = maximum
+
+    def deposit(self):
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class PolicyTransport(httpx.AsyncBaseTransport):
+    """包装底层传输，为幂等请求加上带抖动的指数退避重试和对冲请求"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str, policy: FetchPolicy):
+        self._transport = transport
+        self.upstream = upstream
+        self.policy = policy
+        self.latency = LatencyTracker()
+        self.budget = RetryBudget(policy.budget_ratio, policy.budget_max)
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "budget_exhausted": 0,
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method not in IDEMPOTENT_METHODS:
+            return await self._transport.handle_async_request(request)
+        self.stats["requests"] += 1
+        self.budget.deposit()
+        FETCH_ATTEMPTS.labels(self.upstream, "primary").inc()
+        deadline = time.monotonic() + self.policy.total_timeout
+        attempt = 0
+        while True:
+            try:
+                response = await self._hedged(request)
+            except UpstreamUnavailable:
+                # 熔断或排队超时时重试没有意义
+                raise
+            except httpx.TransportError as e:
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                logger.info(f"Retrying {request.url} in {delay:.2f}s after {type(e).__name__}")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    return response
+                await response.aclose()
+                logger.info(f"Retrying {request.url} in {delay:.2f}s after status {response.status_code}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, deadline: float) -> Optional[float]:
+        """可以重试时返回退避时间，否则返回 None"""
+        if attempt >= self.policy.retries:
+            return None
+        delay = random.uniform(0, min(self.policy.backoff_max, self.policy.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return None
+        if not self._withdraw("retry"):
+            return None
+        self.stats["retries"] += 1
+        FETCH_ATTEMPTS.labels(self.upstream, "retry").inc()
+        return delay
+
+    def _withdraw(self, kind: str) -> bool:
+        if self.budget.withdraw():
+            return True
+        self.stats["budget_exhausted"] += 1
+        FETCH_BUDGET_EXHAUSTED.labels(self.upstream, kind).inc()
+        return False
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        if response.status_code < 500:
+            self.latency.add(time.monotonic() - start)
+        return response
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.policy.hedge or len(self.latency) < self.policy.hedge_min_samples:
+            return None
+        return max(self.policy.hedge_min_delay, self.latency.quantile(self.policy.hedge_quantile))
+
+    async def _hedged(self, request: httpx.Request) -> httpx.Response:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._send(request)
+
+        primary = asyncio.ensure_future(self._send(request))
+        tasks = {primary}
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._withdraw("hedge"):
+                hedged = True
+                self.stats["hedges"] += 1
+                FETCH_ATTEMPTS.labels(self.upstream, "hedge").inc()
+                tasks.add(asyncio.ensure_future(self._send(request)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    response = task.result()
+                    # 同时完成的其他请求直接关闭
+                    for other in done - {task}:
+                        if other.exception() is None:
+                            await other.result().aclose()
+                    if hedged:
+                        self._record_winner(task is primary)
+                    return response
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _record_winner(self, primary: bool):
+        winner = "primary" if primary else "hedge"
+        self.stats[f"{winner}_wins"] += 1
+        HEDGE_OUTCOMES.labels(self.upstream, winner).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.latency.quantile(0.95)
+        return {
+            **self.stats,
+            "budget": round(self.budget.tokens, 2),
+            "latency_samples": len(self.latency),
+            "latency_p95": round(p95, 4) if p95 is not None else None,
+            "hedge_delay": self._hedge_delay(),
+            "policy": asdict(self.policy),
+        }
+
+    async def aclose(self):
+        await self._transport.aclose()
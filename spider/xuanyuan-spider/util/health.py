@@ -0,0 +1,13 @@
+from starlette.requests import Request
+from starlette.responses import Response
+
+HEALTHY = b'{"status":"ok"}'
+
+
+async def healthz(request: Request) -> Response:
+    """
+    存活 / 就绪检查，供容器编排探测。
+
+    uvicorn 在 lifespan 启动完成后才开始接受请求，能返回即表示已就绪；不访问上游和缓存
+    """
+    return Response(HEALTHY, media_type="application/json", headers={"Cache-Control": "no-store"})
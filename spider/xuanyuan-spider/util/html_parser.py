@@ -0,0 +1,110 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+from util.stage_timer import stage
+
+logger = logging.getLogger(__name__)
+
+# 可选解析后端：
+# - html.parser：标准库实现，兼容性最好（默认）
+# - lxml：C 实现的 bs4 tree builder，需要安装 lxml
+# - selectolax：用 lexbor 引擎先按 CSS 选出需要的区域，只对这些片段建 bs4 树，需要安装 selectolax
+BACKENDS = ("html.parser", "lxml", "selectolax")
+
+
+@dataclass(frozen=True)
+class Region:
+    """页面中需要实际建树的区域：bs4 后端用 SoupStrainer 过滤，selectolax 后端用等价的 CSS 选择器"""
+    strainer: ElementFilter
+    css: str
+
+
+def has_classes(*names):
+    """
+    CSS 式的类名匹配（同时包含所有类名）。
+
+    SoupStrainer 在建树前匹配，此时 class 仍是未拆分的原始字符串，
+    class_='card' 这类写法无法匹配 "card h-100"，需要用这个函数代替。
+    """
+    return lambda value: value is not None and all(name in value.split() for name in names)
+
+
+class AnyOf(ElementFilter):
+    """多个 SoupStrainer 的并集，匹配其中任意一个的元素都会建树"""
+
+    def __init__(self, *strainers: ElementFilter):
+        self.strainers = strainers
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return any(strainer.allow_tag_creation(nsprefix, name, attrs) for strainer in self.strainers)
+
+    def allow_string_creation(self, string) -> bool:
+        return any(strainer.allow_string_creation(string) for strainer in self.strainers)
+
+
+def backend_available(backend: str) -> bool:
+    if backend == "html.parser":
+        return True
+    try:
+        if backend == "lxml":
+            import lxml  # noqa: F401
+        elif backend == "selectolax":
+            import selectolax  # noqa: F401
+        else:
+            return False
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+    if not backend_available(backend):
+        logger.warning(f"HTML parser backend {backend} is not installed, falling back to html.parser")
+        return "html.parser"
+    return backend
+
+
+HTML_PARSER = resolve_backend(os.getenv("SPIDER_HTML_PARSER", "html.parser"))
+# 是否只对需要的区域建树，关闭后总是整页解析
+PARTIAL_PARSE = os.getenv("SPIDER_HTML_PARTIAL_PARSE", "1").lower() in ("1", "true", "yes", "on")
+
+
+def _select_fragments(html_content: str, css: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+
+    nodes = LexborHTMLParser(html_content).css(css)
+    selected = set(node.mem_id for node in nodes)
+    fragments = []
+    for node in nodes:
+        # 与 SoupStrainer 一致，只保留最外层的匹配区域，内部的匹配随父节点一起保留
+        parent = node.parent
+        while parent is not None and parent.mem_id not in selected:
+            parent = parent.parent
+        if parent is None:
+            fragments.append(node.html)
+    return "".join(fragments)
+
+
+def make_soup(html_content: str, region: Optional[Region] = None, backend: Optional[str] = None) -> BeautifulSoup:
+    """
+    按配置的后端构建 BeautifulSoup。
+
+    指定 region 时只对匹配的区域建树（各区域成为根节点的直接子节点），
+    调用方只能在区域内部查找元素。
+    """
+    backend = backend or HTML_PARSER
+    if not PARTIAL_PARSE:
+        region = None
+    with stage("parse"):
+        if backend == "selectolax":
+            if region is None:
+                # selectolax 不产出 bs4 树，整页解析时退回标准库实现
+                return BeautifulSoup(html_content, 'html.parser')
+            return BeautifulSoup(_select_fragments(html_content, region.css), 'html.parser')
+        return BeautifulSoup(html_content, backend, parse_only=region.strainer if region else None)
@@ -0,0 +1,196 @@
+import os
+import gzip
+import hashlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util.metrics import HTTP_CACHE_RESPONSES
+
+try:
+    import brotli
+except ImportError:
+    # 未安装 brotli 时只使用 gzip
+    brotli = None
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_BYTES = int(os.getenv("SPIDER_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("SPIDER_GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("SPIDER_BROTLI_QUALITY", 4))
+# 按 ETag 缓存压缩后的响应体，轮询同一数据时不重复压缩
+COMPRESS_CACHE_MAX_BYTES = int(os.getenv("SPIDER_COMPRESS_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-ndjson")
+
+# 当前请求读取的缓存数据还能新鲜多久：{"max_age": 秒, "stale": 秒}，取所有缓存读取中的最小值
+_freshness: ContextVar[Optional[Dict[str, float]]] = ContextVar("freshness", default=None)
+
+
+def record_freshness(max_age: float, stale: float):
+    """ResponseCache 每次返回数据时调用，没有经过缓存的响应不设置 max-age"""
+    freshness = _freshness.get()
+    if freshness is None:
+        return
+    if not freshness:
+        freshness.update(max_age=max_age, stale=stale)
+        return
+    freshness["max_age"] = min(freshness["max_age"], max_age)
+    freshness["stale"] = min(freshness["stale"], stale)
+
+
+def cache_control(freshness: Dict[str, float]) -> str:
+    # 数据来自缓存时按剩余有效期缓存，否则要求客户端每次用 ETag 重新验证
+    if not freshness:
+        return "no-cache"
+    max_age = max(0, int(freshness["max_age"]))
+    stale = max(0, int(freshness["stale"]))
+    value = f"public, max-age={max_age}"
+    if stale:
+        value += f", stale-while-revalidate={stale}"
+    return value
+
+
+def etag(body: bytes) -> str:
+    # 按未压缩的内容计算，同一数据不同编码共用一个弱 ETag
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, tag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding 选择 br 或 gzip（忽略 q=0 的编码）"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressedBodies:
+    """压缩结果的 LRU 缓存，键为 (ETag, 编码)"""
+
+    def __init__(self, max_bytes: int = COMPRESS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, tag: str, encoding: str, body: bytes) -> bytes:
+        key = (tag, encoding)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            HTTP_CACHE_RESPONSES.labels("reused").inc()
+            return cached
+        compressed = compress(body, encoding)
+        HTTP_CACHE_RESPONSES.labels(encoding).inc()
+        if len(compressed) <= self.max_bytes:
+            self._entries[key] = compressed
+            self._bytes += len(compressed)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return compressed
+
+
+class HttpCacheMiddleware:
+    """
+    GET 请求的 ETag、条件请求和压缩：
+
+    - 200 响应按内容计算弱 ETag，If-None-Match 命中时返回 304，不再发送响应体
+    - Cache-Control 按响应用到的缓存数据的剩余有效期设置，没有经过缓存的响应为 no-cache
+    - 超过 COMPRESS_MIN_BYTES 的文本 / JSON 响应按 Accept-Encoding 用 br 或 gzip 压缩
+    - 流式响应（NDJSON / SSE）原样转发
+    """
+
+    def __init__(self, app: ASGIApp, min_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_size = min_size
+        self.compressed = CompressedBodies()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        freshness: Dict[str, float] = {}
+        token = _freshness.set(freshness)
+        request_headers = Headers(scope=scope)
+        start_message: Optional[Message] = None
+        streaming = False
+
+        async def send_with_cache(message: Message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # 分块发送的响应不缓冲
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+            for outgoing in self.finish(start_message, message.get("body", b""), request_headers, freshness):
+                await send(outgoing)
+
+        try:
+            await self.app(scope, receive, send_with_cache)
+        finally:
+            _freshness.reset(token)
+
+    def finish(self, start: Message, body: bytes, request_headers: Headers,
+               freshness: Dict[str, float]) -> List[Message]:
+        headers = MutableHeaders(scope=start)
+        if start["status"] != 200:
+            return [start, {"type": "http.response.body", "body": body}]
+
+        tag = headers.get("etag") or etag(body)
+        headers["ETag"] = tag
+        if "cache-control" not in headers:
+            headers["Cache-Control"] = cache_control(freshness)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, tag):
+            HTTP_CACHE_RESPONSES.labels("not_modified").inc()
+            for name in ("content-length", "content-type", "content-encoding"):
+                del headers[name]
+            start["status"] = 304
+            return [start, {"type": "http.response.body", "body": b""}]
+
+        content_type = headers.get("content-type", "")
+        if (len(body) >= self.min_size and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)):
+            headers.add_vary_header("Accept-Encoding")
+            encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+            if encoding is not None:
+                body = self.compressed.get(tag, encoding, body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+        return [start, {"type": "http.response.body", "body": body}]
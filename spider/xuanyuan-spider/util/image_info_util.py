@@ -1,49 +1,179 @@
-from fastapi import HTTPException
+from fastapi import FastAPI, HTTPException
+import re
 import httpx
-from bs4 import BeautifulSoup
-
-def extract_with_selenium(url):
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')  # 无头模式
-    driver = webdriver.Chrome(options=options)
+from bs4 import SoupStrainer
+from util.http_client import get_client, UPSTREAMS, XUANYUAN_DOCKERS
+from util.browser_pool import BROWSER_RENDER_TIMEOUT, CLASS_NAME, XPATH, wait_for_element
+from util.html_parser import AnyOf, Region, has_classes, make_soup
+from util.stage_timer import stage
+
+# 搜索页只需要分页导航和结果网格
+SEARCH_REGIONS = Region(
+    strainer=AnyOf(
+        SoupStrainer('nav', attrs={'aria-label': 'pagination'}),
+        SoupStrainer('div', class_=has_classes('grid', 'gap-4')),
+    ),
+    css='nav[aria-label="pagination"], div.grid.gap-4',
+)
+# 搜索结果卡片中镜像类型标签的类名
+TAG_BADGE_CLASSES = ('rounded-md', 'border', 'px-2.5', 'py-0.5')
+NON_DIGITS = re.compile(r"\D")
+
+# 镜像详情页只需要顶部信息卡片
+IMAGE_CARD = Region(
+    strainer=SoupStrainer(
+        'div', class_=lambda x: x and 'bg-card' in x and 'shadow' in x),
+    css='div[class*="bg-card"][class*="shadow"]',
+)
+
+
+# 文档内容在点击"详细说明"标签后才由前端渲染
+DOC_TAB_XPATH = "//button[contains(text(),'详细说明')]"
+DOCUMENTATION = Region(
+    strainer=SoupStrainer('div', class_=has_classes('prose')),
+    css='div.prose',
+)
+
+
+def extract_with_selenium(driver, url, timeout=BROWSER_RENDER_TIMEOUT):
+    """在浏览器池的会话中打开页面并展开文档，返回渲染后的 HTML（在浏览器线程中执行）"""
+    driver.get(url)
+    # 等待页面加载完成后点击"详细说明"Tab
+    wait_for_element(driver, XPATH, DOC_TAB_XPATH, timeout).click()
+    # 等待内容加载
+    wait_for_element(driver, CLASS_NAME, "prose", timeout)
+    # 获取渲染后的HTML
+    return driver.page_source
+
+
+async def render_html(app: FastAPI, image_name: str):
+    url = f"{UPSTREAMS[XUANYUAN_DOCKERS]}/image/{image_name}"
+    # 同一镜像的并发渲染只占用一个浏览器会话
+    return await app.state.single_flight.do(
+        f"render:{url}", lambda: _render_html(app, url))
+
+
+async def _render_html(app: FastAPI, url: str):
+    with stage("render"):
+        return await app.state.browser_pool.render(url, extract_with_selenium)
+
+
+async def load_documentation(app: FastAPI, image_name: str):
+    html_content = await render_html(app, image_name)
+    with stage("parse"):
+        return parse_documentation(html_content)
+
+
+async def fetch_html(app: FastAPI, image_name: str):
+    url = f"/image/{image_name}"
+    # 同一镜像的并发请求共享同一次上游抓取
+    return await app.state.single_flight.do(
+        f"{XUANYUAN_DOCKERS}{url}", lambda: _fetch_html(app, url))
+
+
+async def _fetch_html(app: FastAPI, url: str):
+    async def parse(response: httpx.Response) -> str:
+        return response.text
 
     try:
-        driver.get(url)
-        # 等待页面加载完成
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (By.XPATH, "//button[contains(text(),'详细说明')]"))
-        )
-        # 点击"详细说明"Tab
-        driver.find_element(
-            By.XPATH, "//button[contains(text(),'详细说明')]").click()
-        # 等待内容加载
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "prose"))
-        )
-        # 获取渲染后的HTML
-        return driver.page_source
-    finally:
-        driver.quit()
-
-
-async def fetch_html(image_name: str):
-    url = f"https://dockers.xuanyuan.me/image/{image_name}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        # 上游支持条件请求时，页面未变化（304）直接复用上次下载的内容
+        return await app.state.upstream_validators.get(get_client(app, XUANYUAN_DOCKERS), url, parse)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=404, detail=f"Image not found: {e}")
+
+
+def is_tag_badge(value) -> bool:
+    """镜像类型标签的 class，类名按子串匹配（border 也匹配 border-input 等）"""
+    return bool(value) and all(name in value for name in TAG_BADGE_CLASSES)
+
+
+def parse_search_html(html_content: str, page: int):
+    soup = make_soup(html_content, SEARCH_REGIONS)
+
+    # 提取总页码
+    pagination = soup.find('nav', {'aria-label': 'pagination'})
+    total_pages = page  # 默认为当前页码
+
+    if pagination:
+        page_links = pagination.find_all('a')
+        page_numbers = []
+
+        for link in page_links:
+            if link.text.isdigit():
+                page_numbers.append(int(link.text))
+
+        if page_numbers:
+            total_pages = max(page_numbers)
+        else:
+            # 如果没有找到页码链接，可能是只有一页
+            total_pages = 1
+    else:
+        total_pages = 1
+
+    # 提取镜像信息
+    images = []
+    image_cards = soup.select('.grid.gap-4 a.block')
+
+    for card in image_cards:
+        # 镜像链接
+        image_link = card['href'] if 'href' in card.attrs else ""
+
+        # 镜像名称和作者
+        name = card.select_one(
+            'h3.font-semibold.text-primary').text.strip()
+        author = card.select_one(
+            'p.text-sm.text-muted-foreground').text.strip()
+
+        # 图标链接
+        img_tag = card.select_one('img.rounded-full')
+        icon_url = img_tag['src'] if img_tag and 'src' in img_tag.attrs else ""
+
+        # 镜像介绍
+        description_tag = card.select_one('p.text-sm.mb-4.line-clamp-2')
+        description = description_tag.text.strip() if description_tag else ""
+
+        # star数量
+        star_tag = card.select_one('div.flex.items-center.text-sm')
+        stars = star_tag.text.strip() if star_tag else "0"
+        stars = NON_DIGITS.sub('', stars)  # 提取纯数字
+
+        # 拉取数量
+        pulls_tag = card.select_one('div.text-sm.text-muted-foreground')
+        pulls = pulls_tag.text.strip() if pulls_tag else "0"
+
+        # 镜像标签
+        tag = "none"
+        tag_div = card.find('div', class_=is_tag_badge)
+        if tag_div:
+            text = tag_div.text
+            if "Official" in text:
+                tag = "Official"
+            elif "Verified" in text:
+                tag = "Verified"
+            elif "open_source" in text:
+                tag = "open_source"
+
+        images.append({
+            "name": name,
+            "author": author,
+            "image_link": image_link,
+            "icon_url": icon_url,
+            "description": description,
+            "stars": int(stars) if stars else 0,
+            "pulls": pulls,
+            "tag": tag
+        })
+
+    return {
+        "current_page": page,
+        "total_pages": total_pages,
+        "images": images
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            return response.text
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=404, detail=f"Image not found: {e}")
 
 
 def parse_html(html_content: str):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content, IMAGE_CARD)
 
     # result = {
     #     "image_src": None,
@@ -107,10 +237,11 @@ def parse_html(html_content: str):
                 'div', class_=lambda x: x and 'inline-flex' in x and 'rounded-md' in x)
         result["tags"] = [tag.get_text(strip=True) for tag in tags]
 
-        # doc_panel = soup.find('div', {'data-state': 'active'})
-        # doc_content = ""
-        # if doc_panel:
-        #     doc_content = doc_panel.get_text(strip=True)
-        # result["documentation"] = doc_content
+    return result
+
 
-    return result
\ No newline at end of file
+def parse_documentation(html_content: str):
+    """浏览器渲染后的页面中"详细说明"的文本"""
+    soup = make_soup(html_content, DOCUMENTATION)
+    doc_panel = soup.find('div', class_='prose')
+    return doc_panel.get_text("\n", strip=True) if doc_panel else None
\ No newline at end of file
@@ -0,0 +1,304 @@
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from util.json_response import loads
+
+logger = logging.getLogger(__name__)
+
+# 持久化存储文件路径（相对于服务目录），设为空字符串关闭
+STORE_PATH = os.getenv("SPIDER_STORE_PATH", "data/response_store.sqlite3")
+STORE_MAX_BYTES = int(os.getenv("SPIDER_STORE_MAX_BYTES", 256 * 1024 * 1024))
+# 写入先在内存中攒批，间隔多久落盘一次（秒）
+STORE_FLUSH_INTERVAL = float(os.getenv("SPIDER_STORE_FLUSH_INTERVAL", 1.0))
+# 后台清理过期数据和回收空间的间隔（秒）
+STORE_COMPACT_INTERVAL = float(os.getenv("SPIDER_STORE_COMPACT_INTERVAL", 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    changed_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    error_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+# 内容未变化时保留原来的 changed_at，便于判断数据最后一次实际变化的时间
+UPSERT = """
+INSERT INTO responses (key, value, content_hash, size, fetched_at, changed_at, expires_at, stale_until, accessed_at,
+                       error_until)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    changed_at = CASE WHEN responses.content_hash = excluded.content_hash
+                      THEN responses.changed_at ELSE excluded.changed_at END,
+    content_hash = excluded.content_hash,
+    size = excluded.size,
+    fetched_at = excluded.fetched_at,
+    expires_at = excluded.expires_at,
+    stale_until = excluded.stale_until,
+    accessed_at = excluded.accessed_at,
+    error_until = excluded.error_until
+"""
+
+
+@dataclass
+class StoredRecord:
+    """持久化的响应，时间均为 Unix 时间戳；payload 为序列化后的 JSON，读取 value 时才解码"""
+    payload: bytes
+    size: int
+    content_hash: str
+    fetched_at: float
+    changed_at: float
+    expires_at: float
+    stale_until: float
+
+    @property
+    def value(self) -> Any:
+        return loads(self.payload)
+
+
+def content_hash(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class PersistentStore:
+    """
+    基于 SQLite 的响应持久化存储，作为 ResponseCache 的二级缓存，进程重启后仍可直接命中。
+
+    - 数据库在第一次访问时才打开，启动时不预加载
+    - 读取在事件循环中按主键查询（亚毫秒级）；写入和访问时间更新先在内存中攒批，
+      由后台线程批量落盘，读写使用各自的连接（WAL 模式下互不阻塞）
+    - 超过容量上限时按最近访问时间淘汰，后台定期清理过期数据并回收空间
+    """
+
+    def __init__(self, path: str, max_bytes: int = STORE_MAX_BYTES,
+                 flush_interval: float = STORE_FLUSH_INTERVAL,
+                 compact_interval: float = STORE_COMPACT_INTERVAL):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        # 待落盘的写入（key -> 行）和访问时间更新（key -> accessed_at）
+        self._pending: Dict[str, Tuple] = {}
+        # 正在落盘的写入，提交前读取仍从这里返回
+        self._writing: Dict[str, Tuple] = {}
+        self._touched: Dict[str, float] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._compact_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "expired": 0,
+            "compactions": 0,
+            "errors": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> Optional["PersistentStore"]:
+        if not STORE_PATH:
+            return None
+        return cls(STORE_PATH)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # auto_vacuum 只能在建表前设置，已有数据库保持原设置
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.executescript(SCHEMA)
+        # 旧版本创建的数据库没有 error_until 列，补上并按 stale_until 填充
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(responses)")}
+        if "error_until" not in columns:
+            try:
+                connection.execute("ALTER TABLE responses ADD COLUMN error_until REAL NOT NULL DEFAULT 0")
+                connection.execute("UPDATE responses SET error_until = stale_until")
+            except sqlite3.OperationalError:
+                # 另一个连接已经添加
+                pass
+        return connection
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader = self._connect()
+            logger.info(f"Opened persistent store {self.path}")
+        return self._reader
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        # 只在持有 _write_lock 的后台线程中使用
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    def start(self):
+        """启动后台清理任务，需要在事件循环中调用"""
+        if self._compact_task is None:
+            self._compact_task = asyncio.create_task(self._compact_loop())
+
+    def get(self, key: str) -> Optional[StoredRecord]:
+        pending = self._pending.get(key) or self._writing.get(key)
+        if pending is not None:
+            row = pending[1:8]
+        else:
+            try:
+                row = self._reader_connection().execute(
+                    "SELECT value, content_hash, size, fetched_at, changed_at, expires_at, stale_until "
+                    "FROM responses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Persistent store read failed for {key}: {e}")
+                return None
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+        self.stats["hits"] += 1
+        self._touched[key] = time.time()
+        self._schedule_flush()
+        value, hash_, size, fetched_at, changed_at, expires_at, stale_until = row
+        return StoredRecord(value, size, hash_, fetched_at, changed_at, expires_at, stale_until)
+
+    async def scan_prefix(self, prefix: str) -> List[Tuple[str, StoredRecord]]:
+        """读取所有键以 prefix 开头的记录（在后台线程中执行），用于启动后预热"""
+        await self.flush()
+
+        def scan():
+            # 使用独立的连接，不与事件循环中的读取共用
+            connection = self._connect()
+            try:
+                rows = connection.execute(
+                    "SELECT key, value, size, content_hash, fetched_at, changed_at, expires_at, stale_until "
+                    "FROM responses WHERE key >= ? AND key < ?", (prefix, prefix + "\U0010ffff")).fetchall()
+            finally:
+                connection.close()
+            return [(key, StoredRecord(value, *rest)) for key, value, *rest in rows]
+
+        return await asyncio.to_thread(scan)
+
+    def put(self, key: str, payload: bytes, ttl: float, stale_ttl: float, error_ttl: float = 0.0):
+        """
+        payload 为序列化后的 JSON。error_ttl 为 stale 期限之后仍可在上游失败时返回的时长，
+        在此之前清理时不删除
+        """
+        now = time.time()
+        stale_until = now + ttl + stale_ttl
+        self._pending[key] = (key, payload, content_hash(payload), len(payload),
+                              now, now, now + ttl, stale_until, now, stale_until + error_ttl)
+        self._touched.pop(key, None)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending and not self._touched:
+            return
+        async with self._write_lock:
+            self._writing, self._pending = self._pending, {}
+            touched, self._touched = [(at, key) for key, at in self._touched.items()], {}
+            rows = list(self._writing.values())
+            try:
+                evicted = await asyncio.to_thread(self._write, rows, touched)
+                self.stats["writes"] += len(rows)
+                self.stats["evictions"] += evicted
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Persistent store write failed, dropped {len(rows)} rows: {e}")
+            finally:
+                self._writing = {}
+
+    def _write(self, rows: List[Tuple], touched: List[Tuple[float, str]]) -> int:
+        connection = self._writer_connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(UPSERT, rows)
+            connection.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?", touched)
+        return self._evict_over_capacity(connection)
+
+    def _evict_over_capacity(self, connection: sqlite3.Connection) -> int:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        # 淘汰到容量的 90%，避免每次写入都触发淘汰
+        target = total - self.max_bytes * 0.9
+        keys = []
+        freed = 0
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            keys.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        return len(keys)
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Persistent store compaction failed: {e}")
+
+    async def compact(self):
+        """删除已超过 stale 期限（含上游失败时仍可返回的期限）的数据，执行容量淘汰并回收文件空间"""
+        async with self._write_lock:
+            expired, evicted = await asyncio.to_thread(self._compact)
+        self.stats["expired"] += expired
+        self.stats["evictions"] += evicted
+        self.stats["compactions"] += 1
+
+    def _compact(self) -> Tuple[int, int]:
+        connection = self._writer_connection()
+        with connection:
+            connection.execute("BEGIN")
+            expired = connection.execute(
+                "DELETE FROM responses WHERE error_until < ?", (time.time(),)).rowcount
+        evicted = self._evict_over_capacity(connection)
+        connection.execute("PRAGMA incremental_vacuum")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return expired, evicted
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "path": str(self.path),
+            "max_bytes": self.max_bytes,
+            "pending_writes": len(self._pending),
+        }
+
+    async def aclose(self):
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = None
@@ -0,0 +1,99 @@
+import time
+import functools
+from typing import Callable
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util import metrics, stage_timer
+
+
+class ServerTimingMiddleware:
+    """为每个请求初始化阶段计时，并通过 Server-Timing 响应头返回各阶段耗时"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = stage_timer.begin()
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stage_timer.server_timing(
+                    {**stages, "total": time.perf_counter() - start}))
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+class TimedRoute(APIRoute):
+    """
+    记录路由函数本身的耗时（handler），其余的响应模型校验和序列化耗时记为 serialize，
+    并按路由模板上报请求耗时、各阶段耗时和并发数指标
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                stage_timer.record("handler", time.perf_counter() - start)
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    def route_label(self, request: Request) -> str:
+        """
+        带路由前缀的路由模板。较新的 FastAPI 对 include_router 不再复制路由，
+        self.path 不含前缀，这里按实际请求路径补上
+        """
+        try:
+            concrete = self.path_format.format(**request.path_params)
+        except (KeyError, IndexError, ValueError):
+            return self.path
+        path = request.scope["path"]
+        if path.endswith(concrete):
+            return path[:len(path) - len(concrete)] + self.path
+        return self.path
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def timed_route_handler(request: Request):
+            route = self.route_label(request)
+            metrics.current_route.set(route)
+            in_flight = metrics.REQUESTS_IN_FLIGHT.labels(route)
+            in_flight.inc()
+            stages = stage_timer.current()
+            handler_before = stages.get("handler", 0.0) if stages is not None else 0.0
+            status = 500
+            start = time.perf_counter()
+            try:
+                response = await route_handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                in_flight.dec()
+                if stages is not None:
+                    stage_timer.record("serialize", elapsed - (stages.get("handler", 0.0) - handler_before))
+                metrics.observe_request(route, request.method, status, elapsed, stages)
+
+        return timed_route_handler
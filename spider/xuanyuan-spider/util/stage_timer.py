@@ -0,0 +1,58 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# 当前请求各阶段（fetch / parse / extract / validate / serialize）的累计耗时，单位秒
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("stages", default=None)
+
+
+def begin() -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    _stages.set(stages)
+    return stages
+
+
+def current() -> Optional[Dict[str, float]]:
+    return _stages.get()
+
+
+def record(name: str, seconds: float):
+    stages = _stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+def merge(stages: Dict[str, float]):
+    for name, seconds in stages.items():
+        record(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def collect(func, *args, **kwargs):
+    """
+    在执行池中运行 func 并收集其内部记录的阶段耗时，返回 (结果, 阶段耗时)。
+    未被其他阶段覆盖的剩余耗时记为 extract。
+    """
+    stages: Dict[str, float] = {}
+    token = _stages.set(stages)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _stages.reset(token)
+    stages["extract"] = time.perf_counter() - start - sum(stages.values())
+    return result, stages
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    """格式化为 Server-Timing 响应头，单位毫秒"""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items())
@@ -0,0 +1,91 @@
+import os
+import json
+import math
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+# 同时预取的上游分页数，以及请求可设置的上限
+TAG_STREAM_WINDOW = int(os.getenv("XUANYUAN_TAG_STREAM_WINDOW", 4))
+TAG_STREAM_MAX_WINDOW = int(os.getenv("XUANYUAN_TAG_STREAM_MAX_WINDOW", 16))
+# Docker Hub 单页最多 100 条
+TAG_PAGE_SIZE_MAX = 100
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+async def iter_tag_pages(first_page: Dict[str, Any], fetch_page: Callable[[int], Awaitable[Dict[str, Any]]],
+                         page_size: int, window: int,
+                         max_pages: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    按页码顺序产出 (页码, 分页数据)，后续分页在窗口内并发预取。
+
+    内存中最多同时保留 window 个未消费的分页，与标签总数无关；
+    消费方提前结束（break / aclose）时取消仍在进行的预取。
+    """
+    yield 1, first_page
+    total_pages = math.ceil((first_page.get("count") or 0) / page_size)
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+
+    pending: Deque[Tuple[int, asyncio.Task]] = deque()
+    next_page = 2
+
+    def schedule():
+        nonlocal next_page
+        while next_page <= total_pages and len(pending) < window:
+            pending.append((next_page, asyncio.create_task(fetch_page(next_page))))
+            next_page += 1
+
+    try:
+        schedule()
+        while pending:
+            page, task = pending.popleft()
+            data = await task
+            # 先补满窗口再交给消费方，处理当前页时后续分页仍在下载
+            schedule()
+            yield page, data
+            if not data.get("results"):
+                break
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def encode_event(event: str, data: Dict[str, Any], format: str) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    if format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f'{{"type": "{event}", "data": {payload}}}\n'
+
+
+async def stream_tags(pages: AsyncIterator[Tuple[int, Dict[str, Any]]], match: Optional[str],
+                      format: str) -> AsyncIterator[str]:
+    """
+    逐条输出标签事件（tag），结束时输出汇总（done），中途出错时输出 error。
+
+    指定 match 时在找到同名标签后立即结束，不再请求后续分页。
+    """
+    pages_read = 0
+    tags = 0
+    matched = False
+    try:
+        async for page, data in pages:
+            pages_read += 1
+            for tag in data.get("results") or []:
+                tags += 1
+                yield encode_event("tag", tag, format)
+                if match is not None and tag.get("name") == match:
+                    matched = True
+                    break
+            if matched:
+                break
+    except Exception as e:
+        yield encode_event("error", {"error": str(e), "pages": pages_read, "tags": tags}, format)
+        return
+    finally:
+        await pages.aclose()
+    yield encode_event("done", {"pages": pages_read, "tags": tags, "matched": matched}, format)
@@ -0,0 +1,396 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# 设为 0 关闭上游限流和熔断
+GOVERNOR_ENABLED = os.getenv("SPIDER_GOVERNOR", "1").lower() not in ("0", "false", "no", "off")
+# 保留最近多少条限流 / 熔断决策，供运维查看
+DECISION_LOG_SIZE = 50
+
+# 上游返回这些状态码表示过载：计入熔断失败，同时收缩并发上限
+OVERLOAD_STATUSES = {429, 503}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class GovernorSettings:
+    """
+    单个上游站点的限流配置。
+
+    SPIDER_GOVERNOR_<KEY> 对所有上游生效，SPIDER_GOVERNOR_<HOST>_<KEY> 覆盖单个上游，
+    HOST 为站点名称大写、非字母数字替换为下划线，如 SPIDER_GOVERNOR_DOCKER_AITYP_COM_RATE
+    """
+    # 令牌桶：每秒放行的请求数和桶容量
+    rate: float = 20.0
+    burst: int = 40
+    # 并发上限按 AIMD 调整：正常时每轮 +1，变慢或过载时乘以 backoff
+    initial_limit: int = 16
+    min_limit: int = 1
+    max_limit: int = 64
+    backoff: float = 0.5
+    # 到收到响应头的耗时超过该值视为上游变慢（秒）
+    latency_target: float = 3.0
+    # 排队等待令牌和并发名额的最长时间，超过后直接拒绝（秒）
+    acquire_timeout: float = 10.0
+    # 连续失败多少次后熔断，熔断多久后放行一个探测请求（秒）
+    failure_threshold: int = 5
+    open_seconds: float = 30.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "GovernorSettings":
+        host = re.sub(r"\W", "_", name).upper()
+        values = {}
+        for field in fields(cls):
+            key = field.name.upper()
+            value = os.getenv(f"SPIDER_GOVERNOR_{host}_{key}") or os.getenv(f"SPIDER_GOVERNOR_{key}")
+            if value:
+                values[field.name] = type(field.default)(value)
+        return cls(**values)
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """上游处于熔断状态或排队超时，请求没有发出"""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float,
+                 request: Optional[httpx.Request] = None):
+        super().__init__(f"{upstream} unavailable: {reason}, retry after {retry_after:.0f}s", request=request)
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def unavailable_error(e: UpstreamUnavailable) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"上游暂不可用: {str(e)}",
+                         headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    """上游不可用、连接失败、超时或返回 429 / 5xx，此时可以用旧数据兜底"""
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status in OVERLOAD_STATUSES or status >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+class TokenBucket:
+    """令牌可以预支：取令牌时返回需要等待的时间，等待方按到达顺序依次放行"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    @property
+    def tokens(self) -> float:
+        return min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+        self._updated = now
+        return max(0.0, -self._tokens / self.rate, self._paused_until - now)
+
+    def cancel(self):
+        self._tokens += 1
+
+    def pause(self, seconds: float):
+        """上游要求稍后重试（Retry-After）时暂停放行"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimit:
+    """并发上限按 AIMD 调整，超过上限的请求按到达顺序排队"""
+
+    def __init__(self, settings: GovernorSettings):
+        self.settings = settings
+        self.limit = float(settings.initial_limit)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经分配给本请求，转交给下一个等待方
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def increase(self):
+        # 并发没有用满时不增加上限，避免空闲时上限一直增长
+        if self.in_flight + 1 >= int(self.limit):
+            self.limit = min(self.settings.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def decrease(self) -> bool:
+        """同一个延迟周期内的多次失败只收缩一次，返回是否实际收缩"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.settings.latency_target:
+            return False
+        self._last_decrease = now
+        limit = max(self.settings.min_limit, self.limit * self.settings.backoff)
+        changed = int(limit) != int(self.limit)
+        self.limit = limit
+        return changed
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断；熔断期满后放行一个探测请求，成功则恢复，失败则继续熔断"""
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state == CLOSED:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def abandon(self):
+        """请求没有得到结果（被取消、排队超时），探测名额留给下一个请求"""
+        self._probing = False
+
+    def on_success(self):
+        self.failures = 0
+        self.state = CLOSED
+        self._probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class HostGovernor:
+    """
+    单个上游站点的请求调度：熔断检查 -> 令牌桶限速 -> 自适应并发上限。
+
+    熔断时直接抛出 UpstreamUnavailable，不再请求上游；状态变化和限流决策记录在 decisions 中
+    """
+
+    def __init__(self, name: str, settings: GovernorSettings):
+        self.name = name
+        self.settings = settings
+        self.bucket = TokenBucket(settings.rate, settings.burst)
+        self.limiter = AdaptiveLimit(settings)
+        self.breaker = CircuitBreaker(settings.failure_threshold, settings.open_seconds)
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=DECISION_LOG_SIZE)
+        self.stats = {
+            "admitted": 0,
+            "throttled": 0,
+            "throttle_wait_seconds": 0.0,
+            "shed": 0,
+            "rejected_open": 0,
+            "successes": 0,
+            "failures": 0,
+            "overloads": 0,
+        }
+
+    def _record(self, event: str, **detail):
+        self.decisions.append({"at": round(time.time(), 3), "event": event, **detail})
+
+    async def acquire(self, request: Optional[httpx.Request] = None):
+        state = self.breaker.state
+        if not self.breaker.allow():
+            self.stats["rejected_open"] += 1
+            raise UpstreamUnavailable(self.name, "circuit open", self.breaker.retry_after(), request)
+        if self.breaker.state != state:
+            self._record("half_open")
+            logger.info(f"Circuit for {self.name} half-open, sending probe request")
+        try:
+            wait = self.bucket.reserve()
+            if wait > self.settings.acquire_timeout:
+                self.bucket.cancel()
+                self.stats["shed"] += 1
+                raise UpstreamUnavailable(self.name, "rate limited", wait, request)
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["throttle_wait_seconds"] += wait
+                await asyncio.sleep(wait)
+            try:
+                await self.limiter.acquire(self.settings.acquire_timeout - wait)
+            except asyncio.TimeoutError:
+                self.stats["shed"] += 1
+                raise UpstreamUnavailable(self.name, "concurrency limit", self.settings.latency_target, request)
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self):
+        self.limiter.release()
+
+    def abandon(self):
+        self.breaker.abandon()
+        self.limiter.release()
+
+    def on_response(self, status: int, latency: float, retry_after: Optional[str] = None):
+        if status in OVERLOAD_STATUSES:
+            self.stats["overloads"] += 1
+            self._decrease(f"status {status}")
+            if retry_after and retry_after.isdigit():
+                seconds = min(float(retry_after), self.settings.open_seconds)
+                self.bucket.pause(seconds)
+                self._record("pause", seconds=seconds)
+            self._on_failure(f"status {status}")
+        elif status >= 500:
+            self._on_failure(f"status {status}")
+        else:
+            self._on_success(latency)
+
+    def on_error(self, e: Exception):
+        if isinstance(e, httpx.TimeoutException):
+            self.stats["overloads"] += 1
+            self._decrease(type(e).__name__)
+        self._on_failure(type(e).__name__)
+
+    def _on_success(self, latency: float):
+        self.stats["successes"] += 1
+        if self.breaker.state != CLOSED:
+            self._record("close")
+            logger.info(f"Circuit for {self.name} closed")
+        self.breaker.on_success()
+        if latency > self.settings.latency_target:
+            self._decrease(f"latency {latency:.2f}s")
+        else:
+            self.limiter.increase()
+
+    def _on_failure(self, reason: str):
+        self.stats["failures"] += 1
+        state = self.breaker.state
+        self.breaker.on_failure()
+        if self.breaker.state == OPEN and state != OPEN:
+            self._record("open", reason=reason, failures=self.breaker.failures)
+            logger.warning(f"Circuit for {self.name} opened after {self.breaker.failures} failures ({reason})")
+
+    def _decrease(self, reason: str):
+        previous = self.limiter.limit
+        if self.limiter.decrease():
+            self._record("limit_decrease", reason=reason,
+                         limit=int(self.limiter.limit), previous=int(previous))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_after": round(self.breaker.retry_after(), 1),
+            "limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "tokens": round(self.bucket.tokens, 2),
+            **self.stats,
+            "throttle_wait_seconds": round(self.stats["throttle_wait_seconds"], 3),
+            "settings": asdict(self.settings),
+            "decisions": list(self.decisions),
+        }
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """响应体读完或关闭时才归还并发名额"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    """包装底层传输，所有发往该上游的请求都经过 HostGovernor 调度"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, governor: HostGovernor):
+        self._transport = transport
+        self.governor = governor
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        governor = self.governor
+        await governor.acquire(request)
+        start = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            governor.on_error(e)
+            governor.release()
+            raise
+        except BaseException:
+            governor.abandon()
+            raise
+        governor.on_response(response.status_code, time.monotonic() - start, response.headers.get("Retry-After"))
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, governor.release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,90 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from util.stage_timer import stage
+
+T = TypeVar("T")
+
+# 保存上游 ETag / Last-Modified 及对应解析结果的内存上限（按上游响应体字节数估算）
+VALIDATOR_CACHE_MAX_BYTES = int(os.getenv("SPIDER_VALIDATOR_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+@dataclass
+class Validated:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    value: Any
+    size: int
+
+
+class ValidatorCache:
+    """
+    上游条件请求：按 URL 记录上游返回的 ETag / Last-Modified 和解析结果，
+    再次抓取时带上 If-None-Match / If-Modified-Since，上游返回 304 时直接复用上次的解析结果，
+    不重新下载和解析。上游没有返回这两个头时不做记录
+    """
+
+    def __init__(self, max_bytes: int = VALIDATOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Validated]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"conditional": 0, "not_modified": 0, "modified": 0}
+
+    async def get(self, client: httpx.AsyncClient, url: str,
+                  parse: Callable[[httpx.Response], Awaitable[T]],
+                  params: Optional[Dict[str, Any]] = None,
+                  not_modified: Optional[Callable[[T], Any]] = None) -> T:
+        """
+        GET url 并用 parse 解析响应，非 2xx（304 除外）时抛出 HTTPStatusError。
+        上游返回 304 时不调用 parse，而是以上次的解析结果调用 not_modified（如更新抓取时间）
+        """
+        key = str(client.build_request("GET", url, params=params).url)
+        cached = self._entries.get(key)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+            self.stats["conditional"] += 1
+        with stage("fetch"):
+            response = await client.get(url, params=params, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                self.stats["not_modified"] += 1
+                self._entries.move_to_end(key)
+                if not_modified is not None:
+                    not_modified(cached.value)
+                return cached.value
+            response.raise_for_status()
+        if cached is not None:
+            self.stats["modified"] += 1
+        value = await parse(response)
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if etag or last_modified:
+            self._store(key, Validated(etag, last_modified, value, len(response.content)))
+        else:
+            self._discard(key)
+        return value
+
+    def _store(self, key: str, entry: Validated):
+        self._discard(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}